@@ -13,6 +13,10 @@ def create_app():
     app.config.from_object(Config())
     os.makedirs(app.instance_path, exist_ok=True)
     db.init_app(app)
+    from .sqlite_profile import apply_sqlite_profile
+    apply_sqlite_profile(app, db)
+    from .metrics import init_metrics
+    init_metrics(app, db)
     login_manager.init_app(app)
     from .auth import auth_bp
     from .routes import main_bp
@@ -1,39 +1,354 @@
-import json, os, secrets
+"""
+Assignment details (title, description, starter code, mark scheme, ...).
+
+The Assignment table only indexes assignments; their details live in an
+AssignmentStore picked by ASSIGNMENT_STORE:
+
+  json  one assignment_<id>.json per assignment in ASSIGNMENTS_DIR (default)
+  sql   AssignmentDocument rows in the main database, indexed by owner
+
+Code should use the module functions (load_assignment, save_assignment,
+delete_assignment, get_store) rather than a backend directly. save_assignment
+also renders the description HTML and drops cached grades for a replaced
+mark scheme, whichever backend is in use.
+
+Like other model changes, saves and deletes join the caller's transaction:
+the sql backend only flushes, and the caller commits.
+"""
+import fcntl, json, os, tempfile, threading, time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
 from datetime import datetime, timezone
 from flask import current_app
+from .metrics import timed
+from .markup import description_key, render_description
+
+
+class AssignmentStore(ABC):
+    """Interface shared by the backends. Returned dicts are shared: treat them as read-only."""
+
+    @abstractmethod
+    def get(self, aid: int) -> dict | None:
+        """aid's details, or None."""
+
+    @abstractmethod
+    def get_many(self, ids) -> dict:
+        """Return {aid: data} for the ids that exist."""
+
+    @abstractmethod
+    def list_by_owner(self, owner_id: int) -> list[dict]:
+        """Assignments owned by owner_id, newest id first."""
+
+    @abstractmethod
+    def save(self, aid: int, data: dict) -> None:
+        """Create or replace aid's details as part of the caller's transaction."""
+
+    @abstractmethod
+    def delete(self, aid: int) -> None:
+        """Remove aid's details as part of the caller's transaction."""
+
+    @abstractmethod
+    def ids(self) -> list[int]:
+        """Every stored id, ascending."""
+
+    @abstractmethod
+    def location(self, aid: int) -> str:
+        """Where aid is kept, for log messages."""
+
+    def save_now(self, aid: int, data: dict) -> None:
+        """Save outside the caller's transaction, for write-backs made while serving a read."""
+        self.save(aid, data)
+
 
 def assignments_dir() -> str:
-    d = os.path.join(current_app.root_path, "assignments")
+    d = current_app.config.get("ASSIGNMENTS_DIR") or os.path.join(current_app.root_path, "assignments")
     os.makedirs(d, exist_ok=True)
     return d
 
 def assignment_path(aid: int) -> str:
     return os.path.join(assignments_dir(), f"assignment_{aid}.json")
 
+
+class JsonDirectoryStore(AssignmentStore):
+    """
+    One JSON file per assignment, indexed by id and owner per process.
+
+    Writes go to a temp file that is renamed over the old one while holding
+    an flock on the directory's lock file, so readers never see a torn file
+    and concurrent saves from several workers are serialised.
+
+    get() stats the one file it needs, so it always sees the latest save.
+    get_many()/list_by_owner() use the index, which re-reads only files
+    whose mtime or size changed. It is refreshed when the change marker
+    (touched by every save/delete in any process) moves, or at least every
+    rescan_seconds to catch files copied in by hand.
+    """
+
+    MARKER = ".catalogue_version"
+    LOCK = ".lock"
+
+    def __init__(self, directory: str, rescan_seconds: float = 30.0):
+        self.directory = directory
+        self.rescan_seconds = rescan_seconds
+        self._lock = threading.Lock()
+        self._by_id = {}       # aid -> (mtime_ns, size, data)
+        self._by_owner = {}    # owner_id -> [aid, ...] newest first
+        self._marker = None
+        self._scanned_at = 0.0
+
+    def path(self, aid: int) -> str:
+        return os.path.join(self.directory, f"assignment_{aid}.json")
+
+    def location(self, aid: int) -> str:
+        return self.path(aid)
+
+    @contextmanager
+    def _write_lock(self):
+        with open(os.path.join(self.directory, self.LOCK), "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _bump(self) -> None:
+        """Tell every process's index that the directory changed."""
+        marker = os.path.join(self.directory, self.MARKER)
+        with open(marker, "a", encoding="utf-8"):
+            pass
+        os.utime(marker)
+
+    def save(self, aid: int, data: dict) -> None:
+        with self._write_lock():
+            fd, tmp = tempfile.mkstemp(dir=self.directory, prefix=".assignment_", suffix=".tmp")
+            try:
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    json.dump(data, f, indent=2, ensure_ascii=False)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp, self.path(aid))
+            except BaseException:
+                if os.path.exists(tmp):
+                    os.remove(tmp)
+                raise
+            self._bump()
+
+    def delete(self, aid: int) -> None:
+        with self._write_lock():
+            try:
+                os.remove(self.path(aid))
+            except FileNotFoundError:
+                pass
+            self._bump()
+
+    def _marker_stamp(self):
+        try:
+            return os.stat(os.path.join(self.directory, self.MARKER)).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def refresh(self, force: bool = False) -> None:
+        with self._lock:
+            marker = self._marker_stamp()
+            if not force and marker == self._marker and time.monotonic() - self._scanned_at < self.rescan_seconds:
+                return
+            seen = {}
+            for entry in os.scandir(self.directory):
+                name = entry.name
+                if not (name.startswith("assignment_") and name.endswith(".json")):
+                    continue
+                try:
+                    aid = int(name[len("assignment_"):-len(".json")])
+                    st = entry.stat()
+                except (ValueError, OSError):
+                    continue
+                cached = self._by_id.get(aid)
+                if cached and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+                    seen[aid] = cached
+                    continue
+                try:
+                    with open(entry.path, "r", encoding="utf-8") as f:
+                        seen[aid] = (st.st_mtime_ns, st.st_size, json.load(f))
+                except (OSError, ValueError):
+                    continue
+            by_owner = {}
+            for aid in sorted(seen, reverse=True):
+                by_owner.setdefault(seen[aid][2].get("owner_id"), []).append(aid)
+            self._by_id, self._by_owner = seen, by_owner
+            self._marker = marker
+            self._scanned_at = time.monotonic()
+
+    def get(self, aid: int) -> dict | None:
+        p = self.path(aid)
+        try:
+            st = os.stat(p)
+        except FileNotFoundError:
+            return None
+        cached = self._by_id.get(aid)
+        if cached and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+            return cached[2]
+        try:
+            with open(p, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def get_many(self, ids) -> dict:
+        self.refresh()
+        by_id = self._by_id
+        return {aid: by_id[aid][2] for aid in ids if aid in by_id}
+
+    def list_by_owner(self, owner_id: int) -> list[dict]:
+        self.refresh()
+        by_id = self._by_id
+        return [by_id[aid][2] for aid in self._by_owner.get(owner_id, []) if aid in by_id]
+
+    def ids(self) -> list[int]:
+        self.refresh(force=True)
+        return sorted(self._by_id)
+
+
+class SqlAssignmentStore(AssignmentStore):
+    """AssignmentDocument rows in the main database; save/delete flush, the caller commits."""
+
+    def location(self, aid: int) -> str:
+        return f"assignment_document id={aid}"
+
+    def get(self, aid: int) -> dict | None:
+        from .models import db, AssignmentDocument
+        row = db.session.query(AssignmentDocument.data).filter_by(id=aid).first()
+        return json.loads(row.data) if row else None
+
+    def get_many(self, ids) -> dict:
+        from .models import db, AssignmentDocument
+        ids = list(ids)
+        if not ids:
+            return {}
+        rows = db.session.query(AssignmentDocument.id, AssignmentDocument.data).filter(AssignmentDocument.id.in_(ids))
+        return {aid: json.loads(data) for aid, data in rows}
+
+    def list_by_owner(self, owner_id: int) -> list[dict]:
+        from .models import db, AssignmentDocument
+        rows = (db.session.query(AssignmentDocument.data)
+                .filter_by(owner_id=owner_id)
+                .order_by(AssignmentDocument.id.desc()))
+        return [json.loads(data) for (data,) in rows]
+
+    def save(self, aid: int, data: dict) -> None:
+        from .models import db, AssignmentDocument
+        doc = db.session.get(AssignmentDocument, aid) or AssignmentDocument(id=aid)
+        doc.owner_id = data.get("owner_id")
+        doc.title = (data.get("title") or "")[:255]
+        doc.data = json.dumps(data, ensure_ascii=False)
+        db.session.add(doc)
+        db.session.flush()
+
+    def save_now(self, aid: int, data: dict) -> None:
+        from .models import db, AssignmentDocument
+        table = AssignmentDocument.__table__
+        with db.engine.begin() as conn:
+            conn.execute(table.update().where(table.c.id == aid).values(
+                data=json.dumps(data, ensure_ascii=False), updated_at=datetime.utcnow()))
+
+    def delete(self, aid: int) -> None:
+        from .models import db, AssignmentDocument
+        AssignmentDocument.query.filter_by(id=aid).delete(synchronize_session=False)
+        db.session.flush()
+
+    def ids(self) -> list[int]:
+        from .models import db, AssignmentDocument
+        return [aid for (aid,) in db.session.query(AssignmentDocument.id).order_by(AssignmentDocument.id)]
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def json_store(directory: str | None = None) -> JsonDirectoryStore:
+    d = directory or assignments_dir()
+    with _stores_lock:
+        store = _stores.get(("json", d))
+        if store is None:
+            store = JsonDirectoryStore(d, float(current_app.config.get("CATALOGUE_RESCAN_SECONDS", 30)))
+            _stores[("json", d)] = store
+    return store
+
+
+def get_store() -> AssignmentStore:
+    kind = current_app.config.get("ASSIGNMENT_STORE", "json")
+    if kind == "json":
+        return json_store()
+    if kind == "sql":
+        return SqlAssignmentStore()
+    raise ValueError(f"Unknown ASSIGNMENT_STORE {kind!r} (expected 'json' or 'sql')")
+
+
+@timed("load_assignment")
 def load_assignment(aid: int) -> dict | None:
-    p = assignment_path(aid)
-    if not os.path.exists(p):
-        return None
-    with open(p, "r", encoding="utf-8") as f:
-        return json.load(f)
+    return get_store().get(aid)
 
 def save_assignment(aid: int, data: dict) -> None:
-    p = assignment_path(aid)
-    with open(p, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=2, ensure_ascii=False)
+    store = get_store()
+    old = store.get(aid)
+    key = description_key(data.get("description"))
+    if data.get("description_key") != key or "description_html" not in data:
+        data = {**data, "description_html": render_description(data.get("description")), "description_key": key}
+    store.save(aid, data)
+    if old and (old.get("mark_scheme") or {"cases": []}) != (data.get("mark_scheme") or {"cases": []}):
+        from .grade_cache import invalidate_scheme
+        invalidate_scheme(old.get("mark_scheme") or {"cases": []})
+
+def description_html(aid: int, data: dict) -> str:
+    """
+    Stored sanitized HTML for data's description. Assignments saved before
+    the HTML was stored, by an older renderer, or edited by hand are
+    rendered now and written back so the next view is free.
+    """
+    key = description_key(data.get("description"))
+    if data.get("description_key") == key and "description_html" in data:
+        return data["description_html"]
+    fresh = {**data, "description_html": render_description(data.get("description")), "description_key": key}
+    store = get_store()
+    if store.get(aid) is not None:
+        store.save_now(aid, fresh)  # usually on a GET: don't commit the request's session
+    return fresh["description_html"]
 
 def delete_assignment(aid: int) -> None:
-    p = assignment_path(aid)
-    if os.path.exists(p):
-        os.remove(p)
+    get_store().delete(aid)
+
+
+def import_json_directory(directory: str | None = None, overwrite: bool = False, log=print) -> dict:
+    """
+    Copy assignment_<id>.json files into the sql store. Existing rows are
+    kept unless overwrite is set. Call from an app context.
+    """
+    from .models import db
+    source = json_store(directory)
+    target = SqlAssignmentStore()
+    existing = set(target.ids())
+    stats = {"imported": 0, "skipped": 0}
+    for aid in source.ids():
+        if aid in existing and not overwrite:
+            stats["skipped"] += 1
+            continue
+        data = source.get(aid)
+        if data is None:
+            continue
+        target.save(aid, data)
+        stats["imported"] += 1
+        log(f"[assignments] {source.location(aid)} -> {target.location(aid)}")
+    db.session.commit()
+    return stats
+
 
 def now_iso() -> str:
     return datetime.now(timezone.utc).isoformat()
 
 def ensure_assignment_json(aid: int, owner_id: int | None = None) -> dict:
     """
-    Ensure there is a JSON file for this assignment.
+    Ensure the store has details for this assignment.
     If missing, create a placeholder so templates/routes don't crash.
+    The caller commits.
     """
     data = load_assignment(aid)
     if data:
@@ -50,4 +365,4 @@ def ensure_assignment_json(aid: int, owner_id: int | None = None) -> dict:
         "mark_scheme": {"cases": []},
     }
     save_assignment(aid, data)
-    return data
\ No newline at end of file
+    return data
@@ -1,6 +1,8 @@
 from flask import Blueprint, render_template, redirect, url_for, request, flash
 from flask_login import login_user, logout_user, login_required
 from .models import db, User, Role, Class, Enrollment
+from .gradebook_table import rebuild_gradebook
+from .passwords import verify_password, PasswordCheckRejected
 import os
 
 auth_bp = Blueprint('auth', __name__)
@@ -12,7 +14,12 @@ def login():
         password = request.form.get('password', '')
         # allow username or email
         user = User.query.filter((User.email==email_or_username)|(User.username==email_or_username)).first()
-        if not user or not user.check_password(password):
+        try:
+            ok = user is not None and verify_password(user.password_hash, password)
+        except PasswordCheckRejected:
+            flash('Lots of people are signing in right now. Please try again in a few seconds.', 'warning')
+            return render_template('login.html'), 503, {'Retry-After': '5'}
+        if not ok:
             flash('Invalid credentials', 'danger')
         else:
             login_user(user)
@@ -40,6 +47,8 @@ def register():
             klass = Class.query.filter_by(code=join_code).first()
             if klass:
                 db.session.add(Enrollment(class_id=klass.id, student_id=u.id))
+                db.session.flush()
+                rebuild_gradebook(class_id=klass.id, student_ids=[u.id])
                 db.session.commit()
                 flash(f"Joined class: {klass.name}", 'info')
             else:
@@ -0,0 +1,168 @@
+"""
+Per-case grading outcomes, kept for analytics.
+
+Each graded submission gets one SubmissionCaseResult row. Its outcomes
+column packs one status byte per case, in case order, together with the
+hash of the scheme those cases came from, so 10k submissions of a 20-case
+assignment cost about 200 KB. Rows graded against an older scheme are
+skipped by the analytics until the submission is regraded.
+
+assignment_analytics() concatenates the byte strings into one
+submissions x cases matrix and aggregates whole columns at once: with
+NumPy via array operations, without it via strided bytes slices whose
+count() runs in C.
+"""
+import bisect, math
+
+from sqlalchemy import func, insert
+
+from .models import db, Submission, SubmissionCaseResult
+
+try:
+    import numpy as np
+except ImportError:  # optional: the pure-Python path gives the same numbers
+    np = None
+
+STATUSES = ("passed", "failed", "error", "timed out", "memory exceeded", "skipped")
+STATUS_CODE = {s: i for i, s in enumerate(STATUSES)}
+PASSED = STATUS_CODE["passed"]
+SCORE_BINS = 10
+PERCENTILES = (10, 25, 50, 75, 90)
+
+
+def pack_outcomes(rows) -> bytes:
+    return bytes(STATUS_CODE.get(r.get("status"), STATUS_CODE["error"]) for r in rows)
+
+
+def record_case_results(results, scheme_hash: str) -> None:
+    """
+    results: (submission_id, rows) pairs graded against the scheme with
+    scheme_hash. Replaces earlier outcomes; the caller commits.
+    """
+    values = [{"submission_id": sid, "scheme_hash": scheme_hash, "outcomes": pack_outcomes(rows)}
+              for sid, rows in results if sid is not None]
+    if not values:
+        return
+    ids = [v["submission_id"] for v in values]
+    for i in range(0, len(ids), 500):
+        (SubmissionCaseResult.query
+         .filter(SubmissionCaseResult.submission_id.in_(ids[i:i + 500]))
+         .delete(synchronize_session=False))
+    db.session.execute(insert(SubmissionCaseResult), values)
+
+
+def _percentile(sorted_values, p):
+    """Linear interpolation, as numpy.percentile's default."""
+    if not sorted_values:
+        return None
+    k = (len(sorted_values) - 1) * p / 100
+    lo, hi = math.floor(k), math.ceil(k)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+def _matrix_stats(blob: bytes, n_subs: int, n_cases: int) -> list[list[int]]:
+    """counts[case][status] over an n_subs x n_cases matrix of status bytes."""
+    if np is not None:
+        m = np.frombuffer(blob, dtype=np.uint8).reshape(n_subs, n_cases)
+        return [np.bincount(m[:, c], minlength=len(STATUSES)).tolist() for c in range(n_cases)]
+    counts = []
+    for c in range(n_cases):
+        column = blob[c::n_cases]
+        counts.append([column.count(code) for code in range(len(STATUSES))])
+    return counts
+
+
+def _score_stats(percents: list[float]) -> dict:
+    if not percents:
+        return {"histogram": [0] * SCORE_BINS, "percentiles": {}, "mean": None}
+    if np is not None:
+        a = np.asarray(percents, dtype=float)
+        hist, _ = np.histogram(a, bins=SCORE_BINS, range=(0, 100))
+        return {"histogram": hist.tolist(),
+                "percentiles": {p: float(v) for p, v in zip(PERCENTILES, np.percentile(a, PERCENTILES))},
+                "mean": float(a.mean())}
+    s = sorted(percents)
+    edges = [100 * i / SCORE_BINS for i in range(1, SCORE_BINS)]
+    hist, prev = [], 0
+    for e in edges:
+        i = bisect.bisect_left(s, e)
+        hist.append(i - prev)
+        prev = i
+    hist.append(len(s) - prev)
+    return {"histogram": hist,
+            "percentiles": {p: _percentile(s, p) for p in PERCENTILES},
+            "mean": sum(s) / len(s)}
+
+
+def assignment_analytics(aid: int, scheme, latest_only: bool = True) -> dict:
+    """
+    Pass rates per case and the auto-score distribution for aid's
+    non-draft submissions (each student's latest one by default) graded
+    against scheme, a CompiledScheme.
+    """
+    subs = (db.session.query(Submission.id.label("id"), Submission.auto_score.label("auto_score"),
+                             Submission.auto_max.label("auto_max"))
+            .filter(Submission.assignment_id == aid, Submission.is_draft.is_(False)))
+    if latest_only:
+        ranked = (db.session.query(
+                      Submission.id.label("id"),
+                      func.row_number().over(partition_by=Submission.student_id,
+                                             order_by=(Submission.created_at.desc(), Submission.id.desc())).label("rn"))
+                  .filter(Submission.assignment_id == aid, Submission.is_draft.is_(False))
+                  .subquery())
+        subs = subs.join(ranked, ranked.c.id == Submission.id).filter(ranked.c.rn == 1)
+    subs = subs.subquery()
+
+    rows = (db.session.query(subs.c.auto_score, subs.c.auto_max, SubmissionCaseResult.outcomes)
+            .select_from(subs)
+            .outerjoin(SubmissionCaseResult, (SubmissionCaseResult.submission_id == subs.c.id)
+                       & (SubmissionCaseResult.scheme_hash == scheme.hash))
+            .all())
+
+    percents, blobs = [], []
+    for auto_score, auto_max, outcomes in rows:
+        if auto_max:
+            percents.append(min(100.0, max(0.0, 100.0 * (auto_score or 0.0) / auto_max)))
+        if outcomes is not None:
+            blobs.append(outcomes)
+
+    labels = case_labels(scheme)
+    n_cases = len(labels)
+    blobs = [b for b in blobs if len(b) == n_cases]
+    counts = _matrix_stats(b"".join(blobs), len(blobs), n_cases) if blobs and n_cases else [[0] * len(STATUSES)] * n_cases
+
+    cases = []
+    for label, c in zip(labels, counts):
+        total = sum(c)
+        cases.append({
+            "label": label,
+            "pass_rate": c[PASSED] / total if total else None,
+            "counts": dict(zip(STATUSES, c)),
+        })
+    return {
+        "submissions": len(rows),
+        "with_case_results": len(blobs),
+        "cases": cases,
+        "scores": _score_stats(percents),
+        "score_bins": SCORE_BINS,
+        "vectorized": "numpy" if np is not None else "bytes",
+    }
+
+
+def case_labels(scheme) -> list[str]:
+    """One display label per case of a CompiledScheme, in the order outcomes are packed."""
+    if scheme.kind == "cases":
+        labels = []
+        for case in scheme.cases:
+            args = ", ".join(repr(a) for a in case["args"])
+            kwargs = ", ".join(f"{k}={v!r}" for k, v in case["kwargs"].items())
+            labels.append(f"{case['function']}({', '.join(x for x in (args, kwargs) if x)})")
+        return labels
+    if scheme.kind == "pytest" and not scheme.pytest.get("error"):
+        from .pytest_grading import collect_test_names
+        try:
+            with open(scheme.pytest["path"], "r", encoding="utf-8") as f:
+                return collect_test_names(f.read())
+        except (OSError, SyntaxError):
+            return []
+    return []
@@ -7,8 +7,61 @@ class Config:
         self.SECRET_KEY = os.getenv("SECRET_KEY", "dev")
         self.SQLALCHEMY_DATABASE_URI = os.getenv("DATABASE_URL", "sqlite:///instance/classroom.db")
         self.SQLALCHEMY_TRACK_MODIFICATIONS = False
+        # SQLite connection profile (see app/sqlite_profile.py)
+        self.SQLITE_PROFILE = os.getenv("SQLITE_PROFILE", "true").lower() == "true"
+        self.SQLITE_WAL = os.getenv("SQLITE_WAL", "true").lower() == "true"
+        self.SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+        self.SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+        self.SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", "20000"))
+        self.SQLITE_MMAP_SIZE_MB = int(os.getenv("SQLITE_MMAP_SIZE_MB", "128"))
         self.WTF_CSRF_ENABLED = os.getenv("WTF_CSRF_ENABLED", "true").lower() == "true"
         # Uploads
         self.UPLOAD_FOLDER = os.getenv("UPLOAD_FOLDER", "/app/instance/uploads")
         self.MAX_CONTENT_LENGTH = int(os.getenv("MAX_UPLOAD_MB", "10")) * 1024 * 1024
         self.ALLOWED_IMAGE_EXTENSIONS = {"png", "jpg", "jpeg", "gif", "webp"}
+        # Larger images also get a WebP rendition this size (needs Pillow; 0 = keep originals only)
+        self.UPLOAD_MAX_DIMENSION = int(os.getenv("UPLOAD_MAX_DIMENSION", "1600"))
+        self.UPLOAD_WEBP_QUALITY = int(os.getenv("UPLOAD_WEBP_QUALITY", "80"))
+        # Assignment details: "json" files in ASSIGNMENTS_DIR (default: app/assignments) or "sql" table
+        self.ASSIGNMENT_STORE = os.getenv("ASSIGNMENT_STORE", "json").lower()
+        self.ASSIGNMENTS_DIR = os.getenv("ASSIGNMENTS_DIR") or None
+        # /metrics and Server-Timing; METRICS_TOKEN allows scraping with a bearer token
+        self.METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+        self.METRICS_TOKEN = os.getenv("METRICS_TOKEN") or None
+        # Per-process cache for flask-login's user loader (0 = query every request)
+        self.USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "60"))
+        self.USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "2048"))
+        # /run_code sandbox pool (0 = fresh interpreter per run)
+        self.RUN_POOL_SIZE = int(os.getenv("RUN_POOL_SIZE", "2"))
+        self.RUN_POOL_MAX_JOBS = int(os.getenv("RUN_POOL_MAX_JOBS", "100"))
+        # Bytes of stdout+stderr a run may produce before it is stopped (0 = no cap)
+        self.RUN_OUTPUT_LIMIT = int(os.getenv("RUN_OUTPUT_LIMIT", "65536"))
+        # Grade submissions in `python manage.py grading-worker` instead of the request
+        self.GRADING_QUEUE = os.getenv("GRADING_QUEUE", "false").lower() == "true"
+        # Limits for each graded case (a case may set its own "timeout" in the mark scheme)
+        self.GRADING_CASE_TIMEOUT = float(os.getenv("GRADING_CASE_TIMEOUT", "2"))
+        self.GRADING_IMPORT_TIMEOUT = float(os.getenv("GRADING_IMPORT_TIMEOUT", "5"))
+        self.GRADING_MEMORY_MB = int(os.getenv("GRADING_MEMORY_MB", "256"))
+        # tests_path is resolved under this directory (default: the project root)
+        self.GRADING_TESTS_ROOT = os.getenv("GRADING_TESTS_ROOT") or None
+        # pytest suites graded at once by grade_batch in each process (0 = CPU count)
+        self.GRADING_PYTEST_WORKERS = int(os.getenv("GRADING_PYTEST_WORKERS", "0"))
+        self.GRADE_CACHE_SIZE = int(os.getenv("GRADE_CACHE_SIZE", "512"))
+        # Longest the JSON assignment store trusts its index without rescanning file mtimes
+        self.CATALOGUE_RESCAN_SECONDS = float(os.getenv("CATALOGUE_RESCAN_SECONDS", "30"))
+        self.SUBMISSIONS_PAGE_SIZE = int(os.getenv("SUBMISSIONS_PAGE_SIZE", "50"))
+        # Draft autosave store
+        self.DRAFT_COMPRESS = os.getenv("DRAFT_COMPRESS", "true").lower() == "true"
+        self.DRAFT_COMPRESS_MIN = int(os.getenv("DRAFT_COMPRESS_MIN", "512"))
+        self.DRAFT_HISTORY_SIZE = int(os.getenv("DRAFT_HISTORY_SIZE", "0"))
+        self.DRAFT_REVISION_INTERVAL = float(os.getenv("DRAFT_REVISION_INTERVAL", "300"))
+        # Autosaves within this many seconds of the last draft write are coalesced
+        self.DRAFT_MIN_INTERVAL = float(os.getenv("DRAFT_MIN_INTERVAL", "10"))
+        # Processes used to hash passwords for bulk imports/resets (0 = CPU count)
+        self.PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "0"))
+        # Login password checks run on a bounded thread pool (0 workers = CPU count); once
+        # workers + queue checks are in flight further logins get a 503 instead of piling up
+        self.LOGIN_VERIFY_OFFLOAD = os.getenv("LOGIN_VERIFY_OFFLOAD", "true").lower() == "true"
+        self.LOGIN_VERIFY_WORKERS = int(os.getenv("LOGIN_VERIFY_WORKERS", "0"))
+        self.LOGIN_VERIFY_QUEUE = int(os.getenv("LOGIN_VERIFY_QUEUE", "32"))
+        self.LOGIN_VERIFY_TIMEOUT = float(os.getenv("LOGIN_VERIFY_TIMEOUT", "10"))
@@ -0,0 +1,162 @@
+"""
+Whole-class credentials slips.
+
+start_credentials_job() records a CredentialsJob and hands it to a small
+in-process executor; the request returns straight away. The job generates
+temporary passwords for every student in the class, hashes them on a
+spawned process pool (see app/passwords.py), renders one PDF with several
+cut-out slips per page, and commits the new hashes together with the PDF, so a failed render leaves
+every password unchanged.
+
+The job row holds the PDF, so any worker process can serve the download.
+Finished jobs are purged after KEEP_FOR since the PDF contains passwords.
+Status changes are conditional UPDATEs, so a job that job_status() has
+given up on can no longer start, or finish, and change passwords.
+"""
+import secrets, traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from io import BytesIO
+
+from flask import current_app
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfgen import canvas
+
+from .models import db, User, Class, Enrollment, CredentialsJob
+from .passwords import hash_passwords
+
+KEEP_FOR = timedelta(hours=24)
+# A job still pending/running after this belongs to a process that went away.
+STALE_AFTER = timedelta(minutes=10)
+COLS, ROWS = 2, 5
+
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="credentials")
+
+
+def start_credentials_job(klass: Class, teacher_id: int) -> CredentialsJob:
+    purge_old_jobs()
+    job = CredentialsJob(class_id=klass.id, requested_by=teacher_id, status=CredentialsJob.PENDING)
+    db.session.add(job)
+    db.session.commit()
+    _executor.submit(_run_in_app, current_app._get_current_object(), job.id)
+    return job
+
+
+def job_status(job: CredentialsJob) -> str:
+    """The job's status, first failing it for good if it has been pending/running too long."""
+    cutoff = datetime.utcnow() - STALE_AFTER
+    if job.status in (CredentialsJob.PENDING, CredentialsJob.RUNNING) and job.created_at and job.created_at < cutoff:
+        (CredentialsJob.query
+         .filter(CredentialsJob.id == job.id,
+                 CredentialsJob.status.in_((CredentialsJob.PENDING, CredentialsJob.RUNNING)))
+         .update({"status": CredentialsJob.FAILED, "error": "Gave up waiting for the job to finish.",
+                  "finished_at": datetime.utcnow()}, synchronize_session=False))
+        db.session.commit()
+        db.session.refresh(job)
+    return job.status
+
+
+def purge_old_jobs() -> None:
+    (CredentialsJob.query
+     .filter(CredentialsJob.created_at < datetime.utcnow() - KEEP_FOR)
+     .delete(synchronize_session=False))
+    db.session.commit()
+
+
+def _run_in_app(app, job_id: int) -> None:
+    with app.app_context():
+        try:
+            run_credentials_job(job_id)
+        except Exception:
+            db.session.rollback()
+            (CredentialsJob.query
+             .filter(CredentialsJob.id == job_id,
+                     CredentialsJob.status.in_((CredentialsJob.PENDING, CredentialsJob.RUNNING)))
+             .update(
+                {"status": CredentialsJob.FAILED, "error": traceback.format_exc()[-2000:],
+                 "finished_at": datetime.utcnow()}, synchronize_session=False))
+            db.session.commit()
+        finally:
+            db.session.remove()
+
+
+def run_credentials_job(job_id: int) -> None:
+    claimed = (CredentialsJob.query
+               .filter_by(id=job_id, status=CredentialsJob.PENDING)
+               .update({"status": CredentialsJob.RUNNING}, synchronize_session=False))
+    db.session.commit()
+    if not claimed:
+        return  # given up on (or already run) before this thread got to it
+
+    klass = db.session.get(CredentialsJob, job_id).klass
+    students = (User.query
+                .join(Enrollment, Enrollment.student_id == User.id)
+                .filter(Enrollment.class_id == klass.id)
+                .order_by(User.last_name, User.first_name, User.name, User.id)
+                .all())
+    passwords = [secrets.token_urlsafe(8) for _ in students]
+    hashes = hash_passwords(passwords)
+    pdf = render_credentials_pdf(klass.name, list(zip(students, passwords)))
+
+    for u, h in zip(students, hashes):
+        u.password_hash = h
+    finished = (CredentialsJob.query
+                .filter_by(id=job_id, status=CredentialsJob.RUNNING)
+                .update({"pdf": pdf, "student_count": len(students), "status": CredentialsJob.DONE,
+                         "finished_at": datetime.utcnow()}, synchronize_session=False))
+    if not finished:
+        db.session.rollback()  # failed as stale meanwhile: keep the old passwords
+        return
+    db.session.commit()
+
+
+def render_credentials_pdf(class_name: str, entries) -> bytes:
+    """entries: (user, temporary password) pairs. COLS x ROWS slips per A4 page with dashed cut lines."""
+    buf = BytesIO()
+    c = canvas.Canvas(buf, pagesize=A4)
+    c.setTitle(f"Login details — {class_name}")
+    w, h = A4
+    margin = 36
+    slip_w = (w - 2 * margin) / COLS
+    slip_h = (h - 2 * margin) / ROWS
+    per_page = COLS * ROWS
+
+    if not entries:
+        c.setFont("Helvetica", 12)
+        c.drawString(margin, h - margin - 12, f"{class_name}: no students enrolled.")
+    for i, (u, password) in enumerate(entries):
+        slot = i % per_page
+        if slot == 0:
+            if i:
+                c.showPage()
+            _cut_lines(c, margin, slip_w, slip_h, w, h)
+        x = margin + (slot % COLS) * slip_w + 14
+        y = h - margin - (slot // COLS) * slip_h - 24
+        c.setFont("Helvetica-Bold", 12)
+        c.drawString(x, y, u.name)
+        c.setFont("Helvetica", 9)
+        c.drawString(x, y - 14, class_name)
+        c.setFont("Helvetica", 10)
+        c.drawString(x, y - 34, f"Username: {u.username or ''}")
+        c.drawString(x, y - 48, f"Email: {u.email}")
+        c.setFont("Courier-Bold", 11)
+        c.drawString(x, y - 66, f"Password: {password}")
+        c.setFont("Helvetica-Oblique", 8)
+        c.drawString(x, y - 86, "Sign in and change your password after login.")
+    c.showPage()
+    c.save()
+    return buf.getvalue()
+
+
+def _cut_lines(c, margin, slip_w, slip_h, w, h) -> None:
+    c.saveState()
+    c.setDash(4, 3)
+    c.setLineWidth(0.5)
+    c.setStrokeGray(0.5)
+    for col in range(COLS + 1):
+        x = margin + col * slip_w
+        c.line(x, margin, x, h - margin)
+    for row in range(ROWS + 1):
+        y = margin + row * slip_h
+        c.line(margin, y, w - margin, y)
+    c.restoreState()
@@ -0,0 +1,95 @@
+"""
+Autosaved drafts: one row per (student, assignment), updated in place.
+
+Saving identical code is a no-op, and the current row is written at most
+once per DRAFT_MIN_INTERVAL seconds: an autosave inside that window is
+not written, and the caller is told when to try again with the latest
+code (an explicit save always writes). Revision snapshots
+(DRAFT_HISTORY_SIZE, 0 = off) are taken at most once per
+DRAFT_REVISION_INTERVAL seconds. Code longer than
+DRAFT_COMPRESS_MIN bytes is zlib-compressed when DRAFT_COMPRESS is on.
+"""
+import hashlib, zlib
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
+
+from .models import db, Draft, DraftRevision
+
+
+def encode_code(code: str) -> tuple[bytes, bool]:
+    raw = code.encode("utf-8")
+    cfg = current_app.config
+    if cfg.get("DRAFT_COMPRESS") and len(raw) >= int(cfg.get("DRAFT_COMPRESS_MIN", 512)):
+        return zlib.compress(raw, 6), True
+    return raw, False
+
+
+def decode_code(blob: bytes, compressed: bool) -> str:
+    raw = zlib.decompress(blob) if compressed else blob
+    return raw.decode("utf-8")
+
+
+def code_hash(code: str) -> str:
+    return hashlib.sha256(code.encode("utf-8")).hexdigest()
+
+
+def load_draft(student_id: int, assignment_id: int) -> tuple[str, datetime] | None:
+    """Return (code, updated_at) for the student's draft, if any."""
+    d = Draft.query.filter_by(student_id=student_id, assignment_id=assignment_id).first()
+    return (decode_code(d.code_blob, d.compressed), d.updated_at) if d else None
+
+
+def _snapshot(d: Draft, now: datetime) -> None:
+    cfg = current_app.config
+    keep = int(cfg.get("DRAFT_HISTORY_SIZE", 0))
+    if keep <= 0:
+        return
+    interval = timedelta(seconds=float(cfg.get("DRAFT_REVISION_INTERVAL", 300)))
+    if d.revision_at and now - d.revision_at < interval:
+        return
+    db.session.add(DraftRevision(draft=d, code_blob=d.code_blob, compressed=d.compressed, created_at=now))
+    d.revision_at = now
+    db.session.flush()
+    stale = (db.session.query(DraftRevision.id)
+             .filter(DraftRevision.draft_id == d.id)
+             .order_by(DraftRevision.id.desc())
+             .offset(keep)
+             .all())
+    if stale:
+        DraftRevision.query.filter(DraftRevision.id.in_([r.id for r in stale])).delete(synchronize_session=False)
+
+
+def save_draft_code(student_id: int, assignment_id: int, code: str,
+                    force: bool = False) -> tuple[datetime | None, float]:
+    """
+    Upsert the draft. Returns (when its current content was saved, 0.0), or
+    (None, seconds to wait) for an autosave that came too soon after the
+    last write.
+    """
+    h = code_hash(code)
+    min_interval = float(current_app.config.get("DRAFT_MIN_INTERVAL", 0))
+    for attempt in range(2):
+        d = Draft.query.filter_by(student_id=student_id, assignment_id=assignment_id).first()
+        if d and d.code_hash == h:
+            return d.updated_at, 0.0
+        now = datetime.utcnow()
+        if d and not force and min_interval > 0:
+            wait = min_interval - (now - d.updated_at).total_seconds()
+            if wait > 0:
+                return None, wait
+        blob, compressed = encode_code(code)
+        if d is None:
+            d = Draft(student_id=student_id, assignment_id=assignment_id)
+            db.session.add(d)
+        d.code_blob, d.compressed, d.code_hash, d.updated_at = blob, compressed, h, now
+        try:
+            db.session.flush()
+            _snapshot(d, now)
+            db.session.commit()
+            return now, 0.0
+        except IntegrityError:
+            # Another request created the row first; update that one instead.
+            db.session.rollback()
+            if attempt:
+                raise
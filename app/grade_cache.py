@@ -0,0 +1,199 @@
+"""
+Grade results keyed by a hash of (submission code, canonical mark scheme).
+
+Lookups go to a per-process LRU first, then the grade_cache_entry table, and
+only then run the grader. Results with a timed-out case are not stored since
+they can depend on how busy the box was.
+"""
+import hashlib, json, threading
+from collections import OrderedDict
+from flask import current_app
+from sqlalchemy import event, select, delete
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from .models import db, GradeCacheEntry
+from .grading import grade_submission_detailed, grade_batch
+from .mark_scheme import CompiledScheme, compile_scheme
+
+_lru = OrderedDict()
+_lru_lock = threading.Lock()
+
+
+def canonical_scheme(mark_scheme) -> str:
+    if isinstance(mark_scheme, CompiledScheme):
+        return mark_scheme.canonical
+    if isinstance(mark_scheme, str):
+        mark_scheme = json.loads(mark_scheme) if mark_scheme else None
+    return json.dumps(mark_scheme, sort_keys=True, separators=(",", ":"))
+
+
+def scheme_hash(mark_scheme) -> str:
+    if isinstance(mark_scheme, CompiledScheme):
+        return mark_scheme.hash
+    return hashlib.sha256(canonical_scheme(mark_scheme).encode("utf-8")).hexdigest()
+
+
+def cache_key(code: str, mark_scheme) -> str:
+    h = hashlib.sha256()
+    h.update(scheme_hash(mark_scheme).encode("ascii"))
+    h.update(b"\0")
+    h.update((code or "").encode("utf-8"))
+    return h.hexdigest()
+
+
+def _lru_get(key):
+    with _lru_lock:
+        hit = _lru.get(key)
+        if hit is not None:
+            _lru.move_to_end(key)
+        return hit
+
+
+def _lru_put(key, value):
+    size = int(current_app.config.get("GRADE_CACHE_SIZE", 512))
+    with _lru_lock:
+        _lru[key] = value
+        _lru.move_to_end(key)
+        while len(_lru) > size:
+            _lru.popitem(last=False)
+
+
+def _stored(keys: list) -> dict:
+    """{key: (rows_json, total, max_total, passed)} for keys in grade_cache_entry."""
+    table = GradeCacheEntry.__table__
+    found = {}
+    with db.engine.connect() as conn:
+        for i in range(0, len(keys), 500):
+            for row in conn.execute(select(table.c.key, table.c.rows_json, table.c.total, table.c.max_total, table.c.passed)
+                                    .where(table.c.key.in_(keys[i:i + 500]))):
+                found[row.key] = (row.rows_json, row.total, row.max_total, bool(row.passed))
+    return found
+
+
+def grade_cached(code: str, scheme):
+    """Drop-in for grade_submission_detailed(code, scheme)."""
+    scheme = compile_scheme(scheme)
+    if scheme.kind in ("empty", "invalid"):
+        return grade_submission_detailed(code, scheme)
+    key = cache_key(code, scheme)
+
+    hit = _lru_get(key)
+    if hit is not None:
+        rows, total, max_total, passed, _ = hit
+        return json.loads(rows), total, max_total, passed
+
+    stored = _stored([key]).get(key)
+    if stored is not None:
+        _lru_put(key, stored + (scheme.hash,))
+        rows_json, total, max_total, passed = stored
+        return json.loads(rows_json), total, max_total, passed
+
+    result = grade_submission_detailed(code, scheme)
+    remember(code, scheme, result)
+    return result
+
+
+def grade_cached_many(codes: list[str], scheme, limits: dict | None = None) -> list:
+    """
+    grade_cached for a list of codes against one scheme: cache hits are
+    looked up together and the misses graded in one grade_batch call.
+    Returns one result per code, in order.
+    """
+    scheme = compile_scheme(scheme)
+    if scheme.kind in ("empty", "invalid"):
+        return [grade_submission_detailed(code, scheme) for code in codes]
+    keys = [cache_key(code, scheme) for code in codes]
+    results = {}
+    for key in set(keys):
+        hit = _lru_get(key)
+        if hit is not None:
+            results[key] = hit[:4]
+    missing = [k for k in set(keys) if k not in results]
+    if missing:
+        for key, stored in _stored(missing).items():
+            _lru_put(key, stored + (scheme.hash,))
+            results[key] = stored
+    to_grade = {}
+    for code, key in zip(codes, keys):
+        if key not in results:
+            to_grade.setdefault(key, code)
+    if to_grade:
+        for (key, code), result in zip(to_grade.items(), grade_batch(list(to_grade.values()), scheme, limits)):
+            remember(code, scheme, result)
+            rows, total, max_total, passed = result
+            results[key] = (json.dumps(rows), total, max_total, passed)
+    out = []
+    for key in keys:
+        rows_json, total, max_total, passed = results[key]
+        out.append((json.loads(rows_json), total, max_total, passed))
+    return out
+
+
+def remember(code: str, scheme, result) -> None:
+    """Store a result graded elsewhere (e.g. by a bulk regrade)."""
+    rows, total, max_total, passed = result
+    if any(r.get("status") == "timed out" for r in rows):
+        return
+    s_hash = scheme_hash(scheme)
+    key = cache_key(code, scheme)
+    rows_json = json.dumps(rows)
+    _lru_put(key, (rows_json, total, max_total, passed, s_hash))
+    insert = GradeCacheEntry.__table__.insert().values(
+        key=key, scheme_hash=s_hash, rows_json=rows_json,
+        total=total, max_total=max_total, passed=passed)
+    session = db.session()
+    if session.info.get("_grade_cache_wrote"):
+        # The request's transaction holds the write lock: a second connection
+        # would wait on it (SQLite: "database is locked"), so store after commit.
+        session.info.setdefault("_grade_cache_pending", []).append(insert)
+    else:
+        _store(insert)
+
+
+def _store(insert) -> None:
+    try:
+        with db.engine.begin() as conn:
+            conn.execute(insert)
+    except IntegrityError:
+        pass  # another worker stored the same result first
+
+
+def invalidate_scheme(mark_scheme) -> None:
+    """
+    Forget every cached result graded against this mark scheme. Keys already
+    include the scheme hash, so this only reclaims space; other processes'
+    LRUs simply stop hitting those entries.
+    """
+    s_hash = scheme_hash(mark_scheme)
+    with _lru_lock:
+        for k in [k for k, v in _lru.items() if v[4] == s_hash]:
+            del _lru[k]
+    # Through the session, so the delete commits with the edit that caused it.
+    db.session.execute(delete(GradeCacheEntry.__table__).where(GradeCacheEntry.__table__.c.scheme_hash == s_hash))
+
+
+@event.listens_for(Session, "after_flush")
+def _session_flushed(session, flush_context):
+    session.info["_grade_cache_wrote"] = True
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _session_executed(state):
+    if state.is_update or state.is_delete or state.is_insert:
+        state.session.info["_grade_cache_wrote"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _session_committed(session):
+    session.info.pop("_grade_cache_wrote", None)
+    for insert in session.info.pop("_grade_cache_pending", ()):
+        _store(insert)
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _session_transaction_ended(session, transaction):
+    if transaction.parent is not None:
+        return
+    session.info.pop("_grade_cache_wrote", None)
+    session.info.pop("_grade_cache_pending", None)
@@ -0,0 +1,223 @@
+"""
+Gradebook export: one row per (student, assigned assignment) with the
+student's latest non-draft submission, its auto/rubric/final scores and a
+column per rubric criterion.
+
+Rows are produced by iter_gradebook_rows() straight off a yield_per query,
+and stream_csv()/stream_xlsx() turn them into response chunks, so a whole
+year group exports in constant memory.
+"""
+import csv, io, re, zipfile
+from xml.sax.saxutils import escape
+
+from sqlalchemy import func, and_, select
+
+from .models import db, User, Class, Enrollment, ClassAssignment, Submission, RubricCriterion, RubricGrade
+from .assignment_store import get_store
+
+BATCH = 500
+
+BASE_COLUMNS = [
+    "class", "student", "username", "email", "assignment_id", "assignment",
+    "submission_id", "submitted_at", "auto_score", "auto_max",
+    "rubric_score", "rubric_max", "final_score", "final_max",
+]
+
+
+def _latest_submissions(pairs):
+    """
+    Subquery of each student's newest non-draft submission per assignment,
+    ranking only submissions to the exported assignments by students
+    enrolled in the exported classes.
+    """
+    students = select(Enrollment.student_id).where(Enrollment.class_id.in_(select(pairs.c.class_id)))
+    ranked = (db.session.query(
+                  Submission.id.label("id"),
+                  func.row_number().over(
+                      partition_by=(Submission.student_id, Submission.assignment_id),
+                      order_by=(Submission.created_at.desc(), Submission.id.desc())
+                  ).label("rn"))
+              .filter(Submission.is_draft.is_(False),
+                      Submission.assignment_id.in_(select(pairs.c.assignment_id)),
+                      Submission.student_id.in_(students))
+              .subquery())
+    return (db.session.query(Submission)
+            .join(ranked, and_(ranked.c.id == Submission.id, ranked.c.rn == 1))
+            .subquery())
+
+
+def iter_gradebook_rows(class_id: int | None = None, assignment_id: int | None = None,
+                        teacher_id: int | None = None):
+    """
+    Yield the header row, then one list per (student, assignment).
+    teacher_id limits the export to that teacher's classes (an assignment
+    can be assigned to other teachers' classes too).
+    """
+    pairs = (db.session.query(ClassAssignment.assignment_id, Class.id.label("class_id"), Class.name.label("class_name"))
+             .join(Class, Class.id == ClassAssignment.class_id))
+    if teacher_id is not None:
+        pairs = pairs.filter(Class.teacher_id == teacher_id)
+    if class_id is not None:
+        pairs = pairs.filter(ClassAssignment.class_id == class_id)
+    if assignment_id is not None:
+        pairs = pairs.filter(ClassAssignment.assignment_id == assignment_id)
+    pairs = pairs.distinct().subquery()
+
+    aids = sorted({aid for (aid,) in db.session.query(pairs.c.assignment_id)})
+    titles = {aid: (data.get("title") or f"Assignment {aid}") for aid, data in get_store().get_many(aids).items()}
+    criteria = (RubricCriterion.query
+                .filter(RubricCriterion.assignment_id.in_(aids))
+                .order_by(RubricCriterion.assignment_id, RubricCriterion.order_index, RubricCriterion.id)
+                .all())
+    crit_col = {c.id: i for i, c in enumerate(criteria)}
+    multi = len(aids) > 1
+
+    header = list(BASE_COLUMNS)
+    for c in criteria:
+        label = f"{c.label} (/{c.max_marks:g})"
+        header.append(f"{titles.get(c.assignment_id, c.assignment_id)}: {label}" if multi else label)
+    yield header
+
+    latest = _latest_submissions(pairs)
+    q = (db.session.query(
+            pairs.c.class_name, User.name, User.username, User.email, pairs.c.assignment_id,
+            latest.c.id, latest.c.created_at, latest.c.auto_score, latest.c.auto_max,
+            latest.c.rubric_score, latest.c.rubric_max, latest.c.final_score, latest.c.final_max)
+         .select_from(pairs)
+         .join(Enrollment, Enrollment.class_id == pairs.c.class_id)
+         .join(User, User.id == Enrollment.student_id)
+         .outerjoin(latest, and_(latest.c.student_id == User.id, latest.c.assignment_id == pairs.c.assignment_id))
+         .order_by(pairs.c.class_name, User.last_name, User.first_name, User.name, User.id, pairs.c.assignment_id)
+         .execution_options(yield_per=BATCH))
+
+    batch = []
+    for row in q:
+        batch.append(row)
+        if len(batch) >= BATCH:
+            yield from _with_rubric(batch, titles, crit_col, len(criteria))
+            batch = []
+    if batch:
+        yield from _with_rubric(batch, titles, crit_col, len(criteria))
+
+
+def _with_rubric(batch, titles, crit_col, n_criteria):
+    sub_ids = [r[5] for r in batch if r[5] is not None]
+    grades = {}
+    if sub_ids:
+        for g in (db.session.query(RubricGrade.submission_id, RubricGrade.criterion_id, RubricGrade.awarded)
+                  .filter(RubricGrade.submission_id.in_(sub_ids))):
+            grades.setdefault(g.submission_id, {})[g.criterion_id] = g.awarded
+    for (class_name, name, username, email, aid, sid, created_at,
+         auto, auto_max, rubric, rubric_max, final, final_max) in batch:
+        out = [class_name, name, username, email, aid, titles.get(aid, f"Assignment {aid}"),
+               sid, created_at.isoformat(sep=" ", timespec="minutes") if created_at else None,
+               auto, auto_max, rubric, rubric_max, final, final_max]
+        cells = [None] * n_criteria
+        for crit_id, awarded in grades.get(sid, {}).items():
+            if crit_id in crit_col:
+                cells[crit_col[crit_id]] = awarded
+        yield out + cells
+
+
+_FORMULA_START = ("=", "+", "-", "@", "\t", "\r")
+
+
+def _csv_cell(v):
+    if v is None:
+        return ""
+    if isinstance(v, str) and v.startswith(_FORMULA_START):
+        return "'" + v  # keep spreadsheets from running a student's name as a formula
+    return v
+
+
+def stream_csv(rows):
+    buf = io.StringIO()
+    w = csv.writer(buf)
+    buf.write("\ufeff")  # lets Excel pick up UTF-8
+    for i, row in enumerate(rows, start=1):
+        w.writerow([_csv_cell(v) for v in row])
+        if i % 200 == 0:
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+    yield buf.getvalue()
+
+
+class _Sink:
+    """Unseekable file object for zipfile; we drain it after each write batch."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, b):
+        self.chunks.append(bytes(b))
+        return len(b)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        out = b"".join(self.chunks)
+        self.chunks.clear()
+        return out
+
+
+_XLSX_STATIC = {
+    "[Content_Types].xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>'),
+    "_rels/.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>'
+        '</Relationships>'),
+    "xl/workbook.xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="Gradebook" sheetId="1" r:id="rId1"/></sheets></workbook>'),
+    "xl/_rels/workbook.xml.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.xml"/>'
+        '</Relationships>'),
+}
+
+_XML_BAD_CHARS = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+
+def _xlsx_cell(v) -> str:
+    if v is None:
+        return "<c/>"
+    if isinstance(v, bool):
+        return f'<c t="b"><v>{int(v)}</v></c>'
+    if isinstance(v, (int, float)):
+        return f"<c><v>{v!r}</v></c>"
+    text = _XML_BAD_CHARS.sub("", str(v))
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{escape(text)}</t></is></c>'
+
+
+def stream_xlsx(rows):
+    """
+    Minimal single-sheet XLSX written through zipfile in streaming mode,
+    so no spreadsheet library or in-memory workbook is needed.
+    """
+    sink = _Sink()
+    with zipfile.ZipFile(sink, "w", zipfile.ZIP_DEFLATED) as zf:
+        for name, body in _XLSX_STATIC.items():
+            zf.writestr(name, body)
+        yield sink.drain()
+        with zf.open("xl/worksheets/sheet1.xml", "w", force_zip64=True) as sheet:
+            sheet.write(b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                        b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>')
+            for i, row in enumerate(rows, start=1):
+                sheet.write(("<row>" + "".join(_xlsx_cell(v) for v in row) + "</row>").encode("utf-8"))
+                if i % 200 == 0:
+                    yield sink.drain()
+            sheet.write(b"</sheetData></worksheet>")
+    yield sink.drain()
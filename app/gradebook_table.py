@@ -0,0 +1,109 @@
+"""
+Materialized gradebook: one GradebookEntry per (class, assignment,
+student) with the student's latest non-draft submission, its scores, and
+submitted/late flags against ClassAssignment.due_at.
+
+Rows are kept current incrementally: refresh_gradebook_entry() after a
+submission is accepted, graded or marked, and rebuild_gradebook() for a
+scope (a class, an assignment, some students) when enrollments or
+assignments change, after a bulk regrade, or from
+`manage.py rebuild-gradebook` to backfill. Callers commit.
+"""
+from datetime import datetime
+
+from sqlalchemy import and_, case, func, insert, literal, select
+from sqlalchemy.orm import defer
+
+from .models import db, ClassAssignment, Enrollment, GradebookEntry, Submission
+
+SCORE_COLUMNS = ("auto_score", "auto_max", "rubric_score", "rubric_max", "final_score", "final_max")
+
+
+def _assigned_pairs():
+    """(class_id, assignment_id, due_at); an assignment given to a class twice counts once, latest due date."""
+    return (select(ClassAssignment.class_id.label("class_id"),
+                   ClassAssignment.assignment_id.label("assignment_id"),
+                   func.max(ClassAssignment.due_at).label("due_at"))
+            .group_by(ClassAssignment.class_id, ClassAssignment.assignment_id)
+            .subquery())
+
+
+def refresh_gradebook_entry(student_id: int, assignment_id: int) -> None:
+    """Recompute student_id's rows for assignment_id in every class that has both."""
+    pairs = _assigned_pairs()
+    classes = (db.session.query(pairs.c.class_id, pairs.c.due_at)
+               .join(Enrollment, and_(Enrollment.class_id == pairs.c.class_id, Enrollment.student_id == student_id))
+               .filter(pairs.c.assignment_id == assignment_id)
+               .all())
+    latest = (Submission.query
+              .options(defer(Submission.code))
+              .filter(Submission.student_id == student_id, Submission.assignment_id == assignment_id,
+                      Submission.is_draft.is_(False))
+              .order_by(Submission.created_at.desc(), Submission.id.desc())
+              .first())
+    existing = {e.class_id: e for e in GradebookEntry.query.filter_by(student_id=student_id, assignment_id=assignment_id)}
+
+    for class_id, due_at in classes:
+        entry = existing.pop(class_id, None)
+        if entry is None:
+            entry = GradebookEntry(class_id=class_id, assignment_id=assignment_id, student_id=student_id)
+            db.session.add(entry)
+        entry.due_at = due_at
+        entry.submission_id = latest.id if latest else None
+        entry.submitted_at = latest.created_at if latest else None
+        entry.submitted = latest is not None
+        entry.late = bool(latest and due_at and latest.created_at and latest.created_at > due_at)
+        for col in SCORE_COLUMNS:
+            setattr(entry, col, (getattr(latest, col) or 0.0) if latest else 0.0)
+        entry.updated_at = datetime.utcnow()
+    for stale in existing.values():  # no longer enrolled or no longer assigned
+        db.session.delete(stale)
+
+
+def rebuild_gradebook(class_id: int | None = None, assignment_id: int | None = None,
+                      student_ids: list[int] | None = None) -> int:
+    """Delete and recompute the rows in scope with one INSERT ... SELECT. Returns rows written."""
+    ranked = (select(Submission.id.label("id"), Submission.student_id.label("student_id"),
+                     Submission.assignment_id.label("assignment_id"), Submission.created_at.label("created_at"),
+                     *[getattr(Submission, col).label(col) for col in SCORE_COLUMNS],
+                     func.row_number().over(
+                         partition_by=(Submission.student_id, Submission.assignment_id),
+                         order_by=(Submission.created_at.desc(), Submission.id.desc())).label("rn"))
+              .where(Submission.is_draft.is_(False)))
+    if assignment_id is not None:
+        ranked = ranked.where(Submission.assignment_id == assignment_id)
+    if student_ids is not None:
+        ranked = ranked.where(Submission.student_id.in_(student_ids))
+    latest = ranked.subquery()
+    pairs = _assigned_pairs()
+
+    src = (select(pairs.c.class_id, pairs.c.assignment_id, Enrollment.student_id,
+                  latest.c.id, latest.c.created_at, pairs.c.due_at,
+                  case((latest.c.id.is_not(None), True), else_=False),
+                  case((and_(latest.c.id.is_not(None), pairs.c.due_at.is_not(None),
+                             latest.c.created_at > pairs.c.due_at), True), else_=False),
+                  *[func.coalesce(latest.c[col], 0.0) for col in SCORE_COLUMNS],
+                  literal(datetime.utcnow()))
+           .select_from(pairs)
+           .join(Enrollment, Enrollment.class_id == pairs.c.class_id)
+           .outerjoin(latest, and_(latest.c.student_id == Enrollment.student_id,
+                                   latest.c.assignment_id == pairs.c.assignment_id,
+                                   latest.c.rn == 1)))
+    doomed = GradebookEntry.query
+    if class_id is not None:
+        src = src.where(pairs.c.class_id == class_id)
+        doomed = doomed.filter(GradebookEntry.class_id == class_id)
+    if assignment_id is not None:
+        src = src.where(pairs.c.assignment_id == assignment_id)
+        doomed = doomed.filter(GradebookEntry.assignment_id == assignment_id)
+    if student_ids is not None:
+        src = src.where(Enrollment.student_id.in_(student_ids))
+        doomed = doomed.filter(GradebookEntry.student_id.in_(student_ids))
+
+    doomed.delete(synchronize_session=False)
+    result = db.session.execute(
+        insert(GradebookEntry).from_select(
+            ["class_id", "assignment_id", "student_id", "submission_id", "submitted_at", "due_at",
+             "submitted", "late", *SCORE_COLUMNS, "updated_at"],
+            src))
+    return result.rowcount
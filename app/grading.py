@@ -1,69 +1,200 @@
-import json
+import json, os, shutil, subprocess, sys, tempfile, threading
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app, has_app_context
+from .metrics import timed
+from .mark_scheme import CompiledScheme, compile_scheme
 
-def grade_submission_detailed(code: str, mark_scheme_json: str):
-    if not mark_scheme_json:
-        return [], 0.0, 0.0, False
+RUNNER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "grading_runner.py")
+
+DEFAULT_LIMITS = {
+    "case_timeout": 2.0,
+    "import_timeout": 5.0,
+    "memory_mb": 256,
+}
+
+
+_pytest_pool = None
+_pytest_pool_pid = None
+_pytest_pool_lock = threading.Lock()
+
+
+def _pytest_executor() -> ThreadPoolExecutor:
+    """
+    One pool per process bounds how many pytest children grade_batch runs
+    at once, however many callers (e.g. regrade's threads) share it.
+    """
+    global _pytest_pool, _pytest_pool_pid
+    with _pytest_pool_lock:
+        if _pytest_pool is None or _pytest_pool_pid != os.getpid():
+            n = current_app.config.get("GRADING_PYTEST_WORKERS") if has_app_context() else None
+            _pytest_pool = ThreadPoolExecutor(max_workers=max(1, int(n or os.cpu_count() or 1)),
+                                              thread_name_prefix="pytest-grade")
+            _pytest_pool_pid = os.getpid()
+        return _pytest_pool
+
+
+def grading_limits() -> dict:
+    if not has_app_context():
+        return dict(DEFAULT_LIMITS)
+    cfg = current_app.config
+    return {
+        "case_timeout": float(cfg.get("GRADING_CASE_TIMEOUT", DEFAULT_LIMITS["case_timeout"])),
+        "import_timeout": float(cfg.get("GRADING_IMPORT_TIMEOUT", DEFAULT_LIMITS["import_timeout"])),
+        "memory_mb": int(cfg.get("GRADING_MEMORY_MB", DEFAULT_LIMITS["memory_mb"])),
+    }
+
+
+def _run_in_child(code: str, cases: list, limits: dict | None = None) -> dict:
+    """
+    Import the student code and run each case in grading_runner.py.
+    Returns {"rows": [...]} with one outcome per case, or {"import_error", "status"}.
+    """
+    limits = limits or grading_limits()
+    budget = limits["import_timeout"] + sum(float(c.get("timeout") or limits["case_timeout"]) for c in cases) + 5
+    payload = json.dumps({"code": code or "", "cases": cases, "limits": limits})
+    workdir = tempfile.mkdtemp(prefix="grade_")
     try:
-        scheme = json.loads(mark_scheme_json)
-    except Exception as e:
-        return [{
-            "index": 1, "function": None, "args": [], "kwargs": {},
-            "expected": None, "got": None, "correct": False,
-            "marks_awarded": 0.0, "marks_available": 0.0,
-            "error": f"Invalid mark scheme JSON: {e}"
-        }], 0.0, 0.0, False
-
-    ns = {}
-    rows = []
+        proc = subprocess.Popen([sys.executable, RUNNER_SCRIPT], cwd=workdir, stdin=subprocess.PIPE,
+                                stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+        try:
+            out, _ = proc.communicate(payload, timeout=budget)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            proc.communicate()
+            return {"import_error": "grading timed out", "status": "timed out"}
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
     try:
-        exec(code, ns, ns)
-    except Exception as e:
-        cases = scheme.get("cases", [])
-        for i, case in enumerate(cases, start=1):
-            m = float(case.get("marks", 1))
+        return json.loads(out)
+    except ValueError:
+        return {"import_error": "grader process crashed (memory limit exceeded?)", "status": "memory exceeded"}
+
+
+def _run_batch_in_child(codes: list[str], cases: list, limits: dict) -> list[dict]:
+    """
+    Like _run_in_child for many codes at once; one result dict per code.
+    The runner writes a line per code as it goes; codes it never reported
+    (it crashed or ran out of time partway) are graded again on their own.
+    """
+    per_code = limits["import_timeout"] + sum(float(c.get("timeout") or limits["case_timeout"]) for c in cases) + 2
+    budget = per_code * len(codes) + 5
+    payload = json.dumps({"codes": [c or "" for c in codes], "cases": cases, "limits": limits})
+    workdir = tempfile.mkdtemp(prefix="grade_")
+    try:
+        proc = subprocess.Popen([sys.executable, RUNNER_SCRIPT], cwd=workdir, stdin=subprocess.PIPE,
+                                stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+        try:
+            out, _ = proc.communicate(payload, timeout=budget)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            out, _ = proc.communicate()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    results = []
+    for line in out.splitlines()[:len(codes)]:
+        try:
+            results.append(json.loads(line))
+        except ValueError:
+            break  # a line cut short by the runner dying
+    for code in codes[len(results):]:
+        results.append(_run_in_child(code, cases, limits))
+    return results
+
+
+def assignment_grading_json(data: dict) -> str:
+    """
+    What graders are handed for an assignment: its mark scheme, or a pytest
+    spec when tests_path is set (the mark scheme is then only used for
+    per-test marks).
+    """
+    if data.get("tests_path"):
+        from .pytest_grading import pytest_spec
+        return json.dumps(pytest_spec(data["tests_path"], data.get("mark_scheme")))
+    return json.dumps(data.get("mark_scheme") or {"cases": []})
+
+
+def assignment_scheme(data: dict) -> CompiledScheme:
+    """The compiled grading spec for an assignment's current version."""
+    return compile_scheme(assignment_grading_json(data))
+
+
+def _error_result(message: str):
+    return [{
+        "index": 1, "function": None, "args": [], "kwargs": {},
+        "expected": None, "got": None, "correct": False,
+        "marks_awarded": 0.0, "marks_available": 0.0, "status": "error",
+        "error": message
+    }], 0.0, 0.0, False
+
+
+def _rows_from_result(scheme: CompiledScheme, result: dict):
+    """Turn a grading_runner result for scheme's cases into (rows, total, max_total, passed)."""
+    rows = []
+    if "import_error" in result:
+        for i, case in enumerate(scheme.cases, start=1):
             rows.append({
-                "index": i, "function": case.get("function"), "args": case.get("args", []),
-                "kwargs": case.get("kwargs", {}), "expected": case.get("expected"),
-                "got": None, "correct": False, "marks_awarded": 0.0, "marks_available": m,
-                "error": f"Code raised on import: {e}"
+                "index": i, "function": case["function"], "args": case["args"],
+                "kwargs": case["kwargs"], "expected": case.get("expected"),
+                "got": None, "correct": False, "marks_awarded": 0.0, "marks_available": case["marks"],
+                "status": result["status"],
+                "error": f"Code raised on import: {result['import_error']}"
             })
-        max_total = sum(float(c.get("marks", 1)) for c in cases)
-        return rows, 0.0, max_total, False
+        return rows, 0.0, scheme.max_total, False
 
     total = 0.0
-    max_total = 0.0
-
-    for i, case in enumerate(scheme.get("cases", []), start=1):
-        func_name = case.get("function")
-        args = case.get("args", [])
-        kwargs = case.get("kwargs", {})
-        expected = case.get("expected")
-        marks_available = float(case.get("marks", 1))
-        max_total += marks_available
-
+    for i, (case, outcome) in enumerate(zip(scheme.cases, result["rows"]), start=1):
         row = {
-            "index": i, "function": func_name, "args": args, "kwargs": kwargs,
-            "expected": expected, "got": None, "correct": False,
-            "marks_awarded": 0.0, "marks_available": marks_available
+            "index": i, "function": case["function"], "args": case["args"],
+            "kwargs": case["kwargs"], "expected": case.get("expected"),
+            "got": outcome.get("got"), "correct": bool(outcome.get("correct")),
+            "marks_awarded": 0.0, "marks_available": case["marks"],
+            "status": outcome["status"]
         }
+        if outcome.get("error"):
+            row["error"] = outcome["error"]
+        if row["correct"]:
+            row["marks_awarded"] = case["marks"]
+            total += case["marks"]
+        rows.append(row)
 
-        try:
-            func = ns.get(func_name)
-            if not callable(func):
-                row["error"] = f"Function '{func_name}' not found"
-            else:
-                got = func(*args, **kwargs)
-                row["got"] = got
-                if got == expected:
-                    row["correct"] = True
-                    row["marks_awarded"] = marks_available
-                    total += marks_available
-        except Exception as e:
-            row["error"] = repr(e)
+    return rows, total, scheme.max_total, total == scheme.max_total
+
+
+@timed("grade")
+def grade_submission_detailed(code: str, scheme, limits: dict | None = None):
+    """scheme: a CompiledScheme or anything compile_scheme accepts (e.g. the mark scheme JSON)."""
+    scheme = compile_scheme(scheme)
+    if scheme.kind == "empty":
+        return [], 0.0, 0.0, False
+    if scheme.kind == "invalid":
+        return _error_result(scheme.error)
+    if scheme.kind == "pytest":
+        from .pytest_grading import grade_pytest
+        return grade_pytest(code, scheme.pytest, limits or grading_limits())
+    if not scheme.cases:
+        return [], 0.0, 0.0, True
+    return _rows_from_result(scheme, _run_in_child(code, scheme.cases, limits))
 
-        rows.append(row)
 
-    return rows, total, max_total, total == max_total
+@timed("grade_batch")
+def grade_batch(codes: list[str], scheme, limits: dict | None = None) -> list:
+    """
+    Grade several submissions against one scheme; returns one
+    grade_submission_detailed result per code, in order. Mark-scheme cases
+    run in a single grading_runner process that forks per submission, so
+    the interpreter start-up is paid once per batch instead of per code;
+    pytest suites run side by side on a bounded pool (GRADING_PYTEST_WORKERS).
+    """
+    scheme = compile_scheme(scheme)
+    limits = limits or grading_limits()
+    if scheme.kind == "pytest" and len(codes) > 1:
+        from .pytest_grading import grade_pytest
+        return list(_pytest_executor().map(lambda code: grade_pytest(code, scheme.pytest, limits), codes))
+    if scheme.kind != "cases" or not scheme.cases or len(codes) < 2:
+        return [grade_submission_detailed(code, scheme, limits) for code in codes]
+    return [_rows_from_result(scheme, result) for result in _run_batch_in_child(codes, scheme.cases, limits)]
 
 
 def grade_submission(code: str, mark_scheme_json: str):
@@ -0,0 +1,141 @@
+import os, time, traceback
+from datetime import datetime, timedelta
+
+from .models import db, GradingJob, Submission
+from .assignment_store import load_assignment
+from .grade_cache import grade_cached_many
+from .grading import assignment_scheme
+from .case_results import record_case_results
+from .gradebook_table import refresh_gradebook_entry
+
+# A job left "running" longer than this belongs to a worker that died.
+STALE_AFTER = timedelta(minutes=5)
+MAX_ATTEMPTS = 3
+
+
+def enqueue_grading(sub: Submission) -> GradingJob:
+    """Add a pending job for sub. The caller commits."""
+    job = GradingJob(submission=sub, status=GradingJob.PENDING)
+    db.session.add(job)
+    return job
+
+
+def latest_job(submission_id: int) -> GradingJob | None:
+    return (GradingJob.query
+            .filter_by(submission_id=submission_id)
+            .order_by(GradingJob.id.desc())
+            .first())
+
+
+def grading_status(submission_id: int) -> str:
+    job = latest_job(submission_id)
+    return job.status if job else GradingJob.DONE
+
+
+def requeue_stale_jobs() -> int:
+    """
+    Put jobs abandoned by a dead worker back in the queue, or fail them once
+    they have used MAX_ATTEMPTS (a submission that keeps killing its worker).
+    """
+    cutoff = datetime.utcnow() - STALE_AFTER
+    stale = (GradingJob.query
+             .filter(GradingJob.status == GradingJob.RUNNING, GradingJob.started_at < cutoff))
+    stale.filter(GradingJob.attempts >= MAX_ATTEMPTS).update(
+        {"status": GradingJob.FAILED, "error": "Worker died while grading; giving up after "
+                                               f"{MAX_ATTEMPTS} attempts.",
+         "finished_at": datetime.utcnow()}, synchronize_session=False)
+    n = (stale.filter(GradingJob.attempts < MAX_ATTEMPTS)
+         .update({"status": GradingJob.PENDING}, synchronize_session=False))
+    db.session.commit()
+    return n
+
+
+def claim_jobs(limit: int = 1) -> list[GradingJob]:
+    """
+    Atomically move up to limit of the oldest pending jobs to running.
+    The conditional UPDATE makes this safe with several worker processes.
+    """
+    while True:
+        candidates = [jid for (jid,) in (db.session.query(GradingJob.id)
+                                         .filter_by(status=GradingJob.PENDING)
+                                         .order_by(GradingJob.id)
+                                         .limit(limit))]
+        if not candidates:
+            return []
+        claimed = []
+        for jid in candidates:
+            n = (GradingJob.query
+                 .filter_by(id=jid, status=GradingJob.PENDING)
+                 .update({"status": GradingJob.RUNNING,
+                          "started_at": datetime.utcnow(),
+                          "attempts": GradingJob.attempts + 1},
+                         synchronize_session=False))
+            if n:
+                claimed.append(jid)
+        db.session.commit()
+        if claimed:
+            return GradingJob.query.filter(GradingJob.id.in_(claimed)).order_by(GradingJob.id).all()
+
+
+def _fail(jobs: list[GradingJob]) -> None:
+    db.session.rollback()
+    error = traceback.format_exc()
+    for job in jobs:
+        job.error = error
+        job.status = GradingJob.FAILED if job.attempts >= MAX_ATTEMPTS else GradingJob.PENDING
+        job.finished_at = datetime.utcnow()
+    db.session.commit()
+
+
+def _apply(job: GradingJob, result) -> None:
+    _, total, max_total, passed = result
+    sub = job.submission
+    sub.score = total
+    sub.max_score = max_total
+    sub.passed = passed
+    sub.auto_score = total
+    sub.auto_max = max_total
+    job.status = GradingJob.DONE
+    job.error = ""
+    job.finished_at = datetime.utcnow()
+
+
+def run_jobs(jobs: list[GradingJob]) -> None:
+    """Grade claimed jobs, one grade_cached_many call per assignment."""
+    by_assignment = {}
+    for job in jobs:
+        by_assignment.setdefault(job.submission.assignment_id, []).append(job)
+    for aid, group in by_assignment.items():
+        try:
+            scheme = assignment_scheme(load_assignment(aid) or {})
+            results = grade_cached_many([job.submission.code for job in group], scheme)
+        except Exception:
+            _fail(group)
+            continue
+        for job, result in zip(group, results):
+            _apply(job, result)
+        record_case_results([(job.submission_id, result[0]) for job, result in zip(group, results)], scheme.hash)
+        db.session.flush()
+        for student_id in {job.submission.student_id for job in group}:
+            refresh_gradebook_entry(student_id, aid)
+        db.session.commit()
+
+
+def run_worker(poll_interval: float = 1.0, once: bool = False, batch_size: int = 20) -> None:
+    """Grade queued submissions until interrupted. Call from an app context."""
+    print(f"[grader] worker pid={os.getpid()} started")
+    requeue_stale_jobs()
+    while True:
+        jobs = claim_jobs(batch_size)
+        if not jobs:
+            if once:
+                return
+            requeue_stale_jobs()
+            db.session.remove()
+            time.sleep(poll_interval)
+            continue
+        t0 = time.perf_counter()
+        run_jobs(jobs)
+        dt = time.perf_counter() - t0
+        for job in jobs:
+            print(f"[grader] job {job.id} submission {job.submission_id} -> {job.status} ({dt:.2f}s batch of {len(jobs)})")
@@ -0,0 +1,204 @@
+"""
+Child-process side of app.grading.
+
+Run as a script by grade_submission_detailed: reads {"code", "cases", "limits"}
+as JSON on stdin and, in a forked child, imports the student code under a
+wall-clock alarm and the address-space limit, then forks one child per case
+with its own CPU and wall-clock limits. Writes {"rows": [...]} or {"import_error": ...} as JSON
+to the original stdout; the student's own output goes to /dev/null.
+
+grade_batch sends {"codes": [...], ...} instead. The runner then forks one
+child per submission, which does the above, and writes one result per line
+in the same order as each finishes, so a batch pays for one interpreter
+start and a code that takes the runner down only loses the results not yet
+written.
+"""
+import json, os, resource, selectors, signal, sys, time
+
+# Exit status used when the student module does not finish importing in time.
+EXIT_IMPORT_TIMEOUT = 124
+
+
+def set_memory_limit(mb):
+    if mb:
+        limit = int(mb) * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+
+def set_cpu_limit(seconds):
+    # Soft limit delivers SIGXCPU (fatal by default); hard limit a second later is SIGKILL.
+    s = max(1, int(seconds + 0.999))
+    resource.setrlimit(resource.RLIMIT_CPU, (s, s + 1))
+
+
+def jsonable(value):
+    try:
+        if json.loads(json.dumps(value)) == value:
+            return value
+    except (TypeError, ValueError, RecursionError):
+        pass
+    return repr(value)
+
+
+def write_all(fd, data):
+    view = memoryview(data)
+    while view:
+        n = os.write(fd, view)
+        view = view[n:]
+
+
+def run_case_child(ns, case, cpu_seconds, w):
+    set_cpu_limit(cpu_seconds)
+    func_name = case.get("function")
+    out = {}
+    try:
+        func = ns.get(func_name)
+        if not callable(func):
+            out = {"status": "error", "error": f"Function '{func_name}' not found"}
+        else:
+            got = func(*case.get("args", []), **case.get("kwargs", {}))
+            correct = got == case.get("expected")
+            out = {"status": "passed" if correct else "failed", "got": jsonable(got), "correct": bool(correct)}
+    except MemoryError:
+        out = {"status": "memory exceeded", "error": "Memory limit exceeded"}
+    except BaseException as e:
+        out = {"status": "error", "error": repr(e)}
+    try:
+        data = json.dumps(out).encode("utf-8")
+    except MemoryError:
+        data = b'{"status": "memory exceeded", "error": "Memory limit exceeded"}'
+    write_all(w, data)
+    os._exit(0)
+
+
+def collect_child(pid, r, seconds):
+    """Read the child's result pipe until EOF or the deadline (then kill it); reap it."""
+    chunks = []
+    deadline = time.monotonic() + seconds
+    timed_out = False
+    with selectors.DefaultSelector() as sel:
+        sel.register(r, selectors.EVENT_READ)
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                timed_out = True
+                break
+            if not sel.select(remaining):
+                continue
+            data = os.read(r, 65536)
+            if not data:
+                break
+            chunks.append(data)
+    if timed_out:
+        os.kill(pid, signal.SIGKILL)
+    _, status = os.waitpid(pid, 0)
+    os.close(r)
+    return chunks, timed_out, status
+
+
+def run_case(ns, case, limits):
+    wall = float(case.get("timeout") or limits["case_timeout"])
+    r, w = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(r)
+        run_case_child(ns, case, wall, w)
+    os.close(w)
+
+    chunks, timed_out, status = collect_child(pid, r, wall)
+
+    if timed_out or (os.WIFSIGNALED(status) and os.WTERMSIG(status) in (signal.SIGXCPU, signal.SIGKILL)):
+        return {"status": "timed out", "error": f"Timed out after {wall:g}s"}
+    if not chunks:
+        if os.WIFSIGNALED(status):
+            return {"status": "memory exceeded", "error": "Case process died (memory limit exceeded?)"}
+        return {"status": "error", "error": "Case process exited without a result"}
+    try:
+        return json.loads(b"".join(chunks).decode("utf-8"))
+    except ValueError:
+        return {"status": "error", "error": "Case produced an unreadable result"}
+
+
+def grade_code(code, cases, limits):
+    """Import code and run the cases in this process; returns the result dict."""
+    def on_alarm(signum, frame):
+        os._exit(EXIT_IMPORT_TIMEOUT)
+
+    signal.signal(signal.SIGALRM, on_alarm)
+    signal.setitimer(signal.ITIMER_REAL, float(limits["import_timeout"]))
+    ns = {"__name__": "student"}
+    try:
+        exec(code, ns, ns)
+    except MemoryError:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        return {"import_error": "MemoryError()", "status": "memory exceeded"}
+    except BaseException as e:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        return {"import_error": str(e), "status": "error"}
+    signal.setitimer(signal.ITIMER_REAL, 0)
+    return {"rows": [run_case(ns, case, limits) for case in cases]}
+
+
+def grade_code_forked(code, cases, limits, close_fds=()):
+    """
+    grade_code in a child process, so each submission in a batch starts clean.
+    close_fds (the protocol channel) are closed in the child before any student code runs.
+    """
+    budget = float(limits["import_timeout"]) + sum(float(c.get("timeout") or limits["case_timeout"]) for c in cases) + 2
+    r, w = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(r)
+        for fd in close_fds:
+            os.close(fd)
+        set_memory_limit(limits.get("memory_mb"))
+        try:
+            data = json.dumps(grade_code(code, cases, limits)).encode("utf-8")
+        except MemoryError:
+            data = b'{"import_error": "MemoryError()", "status": "memory exceeded"}'
+        write_all(w, data)
+        os._exit(0)
+    os.close(w)
+
+    chunks, timed_out, status = collect_child(pid, r, budget)
+
+    if timed_out:
+        return {"import_error": "grading timed out", "status": "timed out"}
+    if os.WIFEXITED(status) and os.WEXITSTATUS(status) == EXIT_IMPORT_TIMEOUT:
+        return {"import_error": f"timed out after {float(limits['import_timeout']):g}s", "status": "timed out"}
+    try:
+        return json.loads(b"".join(chunks).decode("utf-8"))
+    except ValueError:
+        return {"import_error": "grader process crashed (memory limit exceeded?)", "status": "memory exceeded"}
+
+
+def main():
+    job = json.loads(sys.stdin.read())
+    limits = job["limits"]
+
+    # Keep the protocol channel for ourselves; student prints go nowhere.
+    proto = os.fdopen(os.dup(1), "w", encoding="utf-8")
+    devnull = os.open(os.devnull, os.O_RDWR)
+    for fd in (0, 1, 2):
+        os.dup2(devnull, fd)
+    sys.stdin = open(os.devnull, "r")
+    sys.stdout = sys.stderr = open(os.devnull, "w")
+    sys.path[0] = os.getcwd()
+
+    if "codes" in job:
+        for code in job["codes"]:
+            result = grade_code_forked(code or "", job["cases"], limits, close_fds=(proto.fileno(),))
+            proto.write(json.dumps(result) + "\n")
+            proto.flush()
+        os._exit(0)
+
+    # Forked even for one code: student code then never runs in a process
+    # holding the protocol channel, nor one whose parent is the web app.
+    result = grade_code_forked(job["code"], job["cases"], limits, close_fds=(proto.fileno(),))
+    proto.write(json.dumps(result))
+    proto.flush()
+    os._exit(0)
+
+
+if __name__ == "__main__":
+    main()
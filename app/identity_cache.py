@@ -0,0 +1,128 @@
+"""
+Per-process cache behind flask-login's user_loader.
+
+load_user runs on every authenticated request, so a class logging in at
+once turns into a stream of identical SELECTs for rows that hardly ever
+change. The cache keeps each user's column values (not ORM instances, which
+belong to one request's session) in an LRU for USER_CACHE_TTL seconds and
+re-attaches them with make_transient_to_detached, so current_user stays a
+normal persistent User and relationships such as enrollments still load.
+
+A flush that touches a User, or a bulk UPDATE/DELETE on the user table,
+drops the affected entries (again after commit, so a concurrent miss
+cannot re-cache the old row). Only this process hears about it: other
+workers pick up a change within the TTL.
+"""
+import threading, time
+from collections import OrderedDict
+
+from flask import current_app
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, make_transient_to_detached
+from sqlalchemy.orm.util import identity_key
+
+from .models import db, User
+from .metrics import USER_CACHE_TOTAL
+
+_COLUMNS = [attr.key for attr in inspect(User).column_attrs]
+
+
+class UserCache:
+    """Thread-safe LRU of user id -> (expires_at, column values)."""
+
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.generation = 0  # bumped on every invalidation
+
+    def get(self, uid: int) -> dict | None:
+        with self._lock:
+            entry = self._entries.get(uid)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self._entries[uid]
+                return None
+            self._entries.move_to_end(uid)
+            return entry[1]
+
+    def put(self, uid: int, values: dict, ttl: float, size: int, generation: int) -> None:
+        with self._lock:
+            if generation != self.generation:
+                return  # invalidated while the row was being read
+            self._entries[uid] = (time.monotonic() + ttl, values)
+            self._entries.move_to_end(uid)
+            while len(self._entries) > size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, uids) -> None:
+        with self._lock:
+            self.generation += 1
+            for uid in uids:
+                self._entries.pop(uid, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+user_cache = UserCache()
+
+
+def cached_user(user_id: int) -> User | None:
+    ttl = current_app.config["USER_CACHE_TTL"]
+    if ttl <= 0:
+        return db.session.get(User, user_id)
+    present = db.session.identity_map.get(identity_key(User, user_id))
+    if present is not None:
+        return present
+
+    values = user_cache.get(user_id)
+    if values is None:
+        USER_CACHE_TOTAL.inc(1, "miss")
+        generation = user_cache.generation
+        user = db.session.get(User, user_id)
+        if user is not None:
+            user_cache.put(user_id, {k: getattr(user, k) for k in _COLUMNS}, ttl,
+                           current_app.config["USER_CACHE_SIZE"], generation)
+        return user
+
+    USER_CACHE_TOTAL.inc(1, "hit")
+    user = User(**values)
+    make_transient_to_detached(user)
+    db.session.add(user)
+    return user
+
+
+@event.listens_for(Session, "after_flush")
+def _users_flushed(session, flush_context):
+    uids = {obj.id for obj in (*session.dirty, *session.deleted) if isinstance(obj, User) and obj.id is not None}
+    if uids:
+        user_cache.invalidate(uids)
+        session.info.setdefault("_changed_users", set()).update(uids)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _users_bulk_changed(state):
+    if (state.is_update or state.is_delete) and state.bind_mapper is not None and state.bind_mapper.class_ is User:
+        user_cache.clear()
+        state.session.info["_changed_all_users"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _users_committed(session):
+    if session.info.pop("_changed_all_users", False):
+        user_cache.clear()
+    uids = session.info.pop("_changed_users", None)
+    if uids:
+        user_cache.invalidate(uids)
+
+
+@event.listens_for(Session, "after_rollback")
+def _users_rolled_back(session):
+    session.info.pop("_changed_all_users", None)
+    session.info.pop("_changed_users", None)
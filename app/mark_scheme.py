@@ -0,0 +1,96 @@
+"""
+Compiled mark schemes.
+
+compile_scheme() turns a grading spec (the JSON from
+assignment_grading_json, or the parsed dict) into a CompiledScheme once:
+parsed, validated, with marks and timeouts normalised and the canonical
+JSON and its hash computed. Compiled schemes are cached by their JSON, so
+every later grade against the same version of an assignment skips all of
+that; a changed scheme is a different key.
+"""
+import hashlib, json, threading
+from collections import OrderedDict
+
+CACHE_SIZE = 256
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+class CompiledScheme:
+    """
+    kind is "cases", "pytest", "empty" (no scheme: nothing to grade) or
+    "invalid" (error says why). Treat instances as read-only; they are shared.
+    """
+    __slots__ = ("kind", "cases", "pytest", "canonical", "hash", "max_total", "error")
+
+    def __init__(self, kind, canonical, cases=(), pytest=None, error=None):
+        self.kind = kind
+        self.cases = list(cases)
+        self.pytest = pytest
+        self.canonical = canonical
+        self.hash = hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+        self.max_total = sum(c["marks"] for c in self.cases)
+        self.error = error
+
+
+def _validate_case(i, case) -> dict:
+    if not isinstance(case, dict):
+        raise ValueError(f"case {i} is not an object")
+    if not isinstance(case.get("function"), str) or not case["function"]:
+        raise ValueError(f"case {i} has no function name")
+    args, kwargs = case.get("args", []), case.get("kwargs", {})
+    if not isinstance(args, list):
+        raise ValueError(f"case {i}: args must be a list")
+    if not isinstance(kwargs, dict):
+        raise ValueError(f"case {i}: kwargs must be an object")
+    try:
+        marks = float(case.get("marks", 1))
+        timeout = float(case["timeout"]) if case.get("timeout") else None
+    except (TypeError, ValueError):
+        raise ValueError(f"case {i}: marks and timeout must be numbers")
+    if marks < 0 or (timeout is not None and timeout <= 0):
+        raise ValueError(f"case {i}: marks must be >= 0 and timeout > 0")
+    out = {**case, "args": args, "kwargs": kwargs, "marks": marks}
+    if timeout is not None:
+        out["timeout"] = timeout
+    return out
+
+
+def _compile(scheme) -> CompiledScheme:
+    canonical = json.dumps(scheme, sort_keys=True, separators=(",", ":"))
+    if not isinstance(scheme, dict):
+        return CompiledScheme("invalid", canonical, error="Invalid mark scheme: expected an object")
+    if "pytest" in scheme:
+        return CompiledScheme("pytest", canonical, pytest=scheme["pytest"])
+    try:
+        cases = [_validate_case(i, c) for i, c in enumerate(scheme.get("cases") or [], start=1)]
+    except ValueError as e:
+        return CompiledScheme("invalid", canonical, error=f"Invalid mark scheme: {e}")
+    return CompiledScheme("cases", canonical, cases=cases)
+
+
+def compile_scheme(spec) -> CompiledScheme:
+    """spec: a CompiledScheme (returned as is), a JSON string, a dict, or None/"" for no scheme."""
+    if isinstance(spec, CompiledScheme):
+        return spec
+    if not spec:
+        return CompiledScheme("empty", "null")
+    key = spec if isinstance(spec, str) else json.dumps(spec, sort_keys=True, separators=(",", ":"))
+    with _cache_lock:
+        hit = _cache.get(key)
+        if hit is not None:
+            _cache.move_to_end(key)
+            return hit
+    if isinstance(spec, str):
+        try:
+            compiled = _compile(json.loads(spec))
+        except ValueError as e:
+            compiled = CompiledScheme("invalid", spec, error=f"Invalid mark scheme JSON: {e}")
+    else:
+        compiled = _compile(spec)
+    with _cache_lock:
+        _cache[key] = compiled
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return compiled
@@ -0,0 +1,30 @@
+"""
+Assignment description rendering.
+
+Descriptions are markdown. The sanitized HTML is rendered once by
+save_assignment() and stored in the assignment JSON under
+"description_html", next to a "description_key" made of RENDERER_VERSION
+and a hash of the source. Bump RENDERER_VERSION whenever the markdown
+extras or the allow-lists change; stored HTML with a different key is
+re-rendered on first view (see assignment_store.description_html).
+"""
+import hashlib
+
+import bleach
+from markdown2 import markdown
+
+RENDERER_VERSION = "1"
+
+ALLOWED_TAGS = bleach.sanitizer.ALLOWED_TAGS.union({'p','img','h1','h2','h3','h4','h5','h6','pre','code','table','thead','tbody','tr','th','td'})
+ALLOWED_ATTRS = {**bleach.sanitizer.ALLOWED_ATTRIBUTES, 'img': ['src', 'alt', 'style']}
+# markdown2 also emits these for rules and hard line breaks
+RENDER_TAGS = ALLOWED_TAGS.union({'hr', 'br'})
+
+
+def description_key(description: str) -> str:
+    digest = hashlib.sha256((description or "").encode("utf-8")).hexdigest()[:16]
+    return f"{RENDERER_VERSION}:{digest}"
+
+
+def render_description(description: str) -> str:
+    return bleach.clean(markdown(description or ""), tags=RENDER_TAGS, attributes=ALLOWED_ATTRS)
@@ -0,0 +1,204 @@
+"""
+In-process request, SQL and section timing, exported in Prometheus text
+format on /metrics and summarised per response in a Server-Timing header.
+
+Metrics are per process: with several gunicorn workers each scrape sees the
+worker that answered it, so scrape each worker or sum them upstream.
+"""
+import functools, hmac, threading, time
+from collections import defaultdict
+from flask import Blueprint, Response, current_app, g, has_request_context, request, abort
+from flask_login import current_user
+from sqlalchemy import event
+
+metrics_bp = Blueprint('metrics', __name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200)
+
+
+class Histogram:
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        self.name, self.help_text, self.labels, self.buckets = name, help_text, labels, buckets
+        self._series = {}  # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            s = self._series.get(label_values)
+            if s is None:
+                s = self._series[label_values] = [0] * len(self.buckets) + [0.0, 0]
+            for i, b in enumerate(self.buckets):
+                if value <= b:
+                    s[i] += 1
+            s[-2] += value
+            s[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted(self._series.items())
+        for label_values, s in items:
+            base = _labels(self.labels, label_values)
+            for i, b in enumerate(self.buckets):
+                lines.append(f'{self.name}_bucket{_labels(self.labels, label_values, ("le", _num(b)))} {s[i]}')
+            lines.append(f'{self.name}_bucket{_labels(self.labels, label_values, ("le", "+Inf"))} {s[-1]}')
+            lines.append(f"{self.name}_sum{base} {_num(s[-2])}")
+            lines.append(f"{self.name}_count{base} {s[-1]}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name, help_text, labels=()):
+        self.name, self.help_text, self.labels = name, help_text, labels
+        self._series = defaultdict(float)
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, *label_values):
+        with self._lock:
+            self._series[label_values] += amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._series.items())
+        for label_values, v in items:
+            lines.append(f"{self.name}{_labels(self.labels, label_values)} {_num(v)}")
+        return lines
+
+
+class Gauge:
+    def __init__(self, name, help_text, labels=()):
+        self.name, self.help_text, self.labels = name, help_text, labels
+        self._series = defaultdict(float)
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, *label_values):
+        with self._lock:
+            self._series[label_values] += amount
+
+    def dec(self, amount=1, *label_values):
+        self.inc(-amount, *label_values)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} gauge"]
+        with self._lock:
+            items = sorted(self._series.items())
+        for label_values, v in items:
+            lines.append(f"{self.name}{_labels(self.labels, label_values)} {_num(v)}")
+        return lines
+
+
+def _num(v):
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+
+def _labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    esc = lambda v: str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return "{" + ",".join(f'{k}="{esc(v)}"' for k, v in pairs) + "}"
+
+
+REQUEST_SECONDS = Histogram("codebuddy_request_seconds", "Request latency by endpoint.", ("endpoint",))
+REQUESTS_TOTAL = Counter("codebuddy_requests_total", "Requests by endpoint and status.", ("endpoint", "status"))
+REQUEST_SQL = Histogram("codebuddy_request_sql_statements", "SQL statements per request.", ("endpoint",), COUNT_BUCKETS)
+SQL_SECONDS = Histogram("codebuddy_sql_seconds", "SQL statement execution time.")
+SECTION_SECONDS = Histogram("codebuddy_section_seconds",
+                            "Time in grading, assignment loading and code runs.", ("section",))
+USER_CACHE_TOTAL = Counter("codebuddy_user_cache_total", "load_user identity cache lookups by result.", ("result",))
+PASSWORD_CHECKS_TOTAL = Counter("codebuddy_password_checks_total",
+                                "Login password checks by outcome (ok, invalid, rejected, timeout).", ("outcome",))
+PASSWORD_QUEUE_DEPTH = Gauge("codebuddy_password_check_queue_depth", "Password checks admitted and not yet finished.")
+PASSWORD_WAIT_SECONDS = Histogram("codebuddy_password_check_wait_seconds", "Time a password check waited for a worker.")
+ALL_METRICS = [REQUEST_SECONDS, REQUESTS_TOTAL, REQUEST_SQL, SQL_SECONDS, SECTION_SECONDS,
+               USER_CACHE_TOTAL, PASSWORD_CHECKS_TOTAL, PASSWORD_QUEUE_DEPTH, PASSWORD_WAIT_SECONDS]
+
+
+def _add_to_request(key, seconds, count=0):
+    if has_request_context() and hasattr(g, "_timings"):
+        g._timings[key] += seconds
+        g._counts[key] += count
+
+
+def timed(section: str):
+    """Decorator: record the call's duration under section."""
+    def deco(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            t0 = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                dt = time.perf_counter() - t0
+                SECTION_SECONDS.observe(dt, section)
+                _add_to_request(section, dt)
+        return wrapper
+    return deco
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("_query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get("_query_start")
+    if not starts:
+        return
+    dt = time.perf_counter() - starts.pop()
+    SQL_SECONDS.observe(dt)
+    _add_to_request("sql", dt, 1)
+
+
+def _before_request():
+    g._t0 = time.perf_counter()
+    g._timings = defaultdict(float)
+    g._counts = defaultdict(int)
+
+
+def _after_request(response):
+    t0 = getattr(g, "_t0", None)
+    if t0 is None:
+        return response
+    total = time.perf_counter() - t0
+    endpoint = request.endpoint or "unmatched"
+    REQUEST_SECONDS.observe(total, endpoint)
+    REQUESTS_TOTAL.inc(1, endpoint, str(response.status_code))
+    REQUEST_SQL.observe(g._counts.get("sql", 0), endpoint)
+
+    parts = [f"total;dur={total * 1000:.1f}"]
+    for key, seconds in g._timings.items():
+        desc = f';desc="{g._counts[key]} queries"' if key == "sql" else ""
+        parts.append(f"{key}{desc};dur={seconds * 1000:.1f}")
+    response.headers.add("Server-Timing", ", ".join(parts))
+    return response
+
+
+def init_metrics(app, db) -> None:
+    if not app.config.get("METRICS_ENABLED", True):
+        return
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.register_blueprint(metrics_bp)
+
+
+@metrics_bp.route('/metrics')
+def metrics():
+    from .models import Role
+    token = current_app.config.get("METRICS_TOKEN")
+    auth = request.headers.get("Authorization", "")
+    if token and hmac.compare_digest(auth, f"Bearer {token}"):
+        pass
+    elif not (current_user.is_authenticated and current_user.role == Role.TEACHER):
+        abort(403)
+    lines = []
+    for m in ALL_METRICS:
+        lines.extend(m.render())
+    return Response("\n".join(lines) + "\n", mimetype="text/plain; version=0.0.4")
@@ -0,0 +1,115 @@
+"""
+Versioned schema migrations for databases created before a model change.
+
+db.create_all() only creates missing tables, so anything that alters an
+existing table goes here. Each migration runs once, in order, and its
+version is recorded in schema_migrations. Statements use IF NOT EXISTS so a
+migration is a no-op on a fresh database where create_all already built
+the same index from the model.
+"""
+from datetime import datetime
+from sqlalchemy import inspect, text
+
+from . import db
+
+
+def _dedupe(conn, table, columns):
+    cols = ", ".join(columns)
+    conn.execute(text(
+        f"DELETE FROM {table} WHERE id NOT IN (SELECT MIN(id) FROM {table} GROUP BY {cols})"
+    ))
+
+
+def m001_hot_path_indexes(conn):
+    _dedupe(conn, "enrollment", ["student_id", "class_id"])
+    _dedupe(conn, "rubric_grade", ["submission_id", "criterion_id"])
+    for stmt in (
+        "CREATE INDEX IF NOT EXISTS ix_submission_assignment_student_created "
+        "ON submission (assignment_id, student_id, created_at)",
+        "CREATE UNIQUE INDEX IF NOT EXISTS uq_enrollment_student_class "
+        "ON enrollment (student_id, class_id)",
+        "CREATE INDEX IF NOT EXISTS ix_class_assignment_assignment_class "
+        "ON class_assignment (assignment_id, class_id)",
+        "CREATE UNIQUE INDEX IF NOT EXISTS uq_rubric_grade_submission_criterion "
+        "ON rubric_grade (submission_id, criterion_id)",
+        "CREATE INDEX IF NOT EXISTS ix_rubric_criterion_assignment_order "
+        "ON rubric_criterion (assignment_id, order_index)",
+    ):
+        conn.execute(text(stmt))
+
+
+def m002_move_drafts_out_of_submissions(conn):
+    """Keep each student's newest draft submission as a Draft row, then drop draft submissions."""
+    import hashlib
+    rows = conn.execute(text(
+        "SELECT s.student_id, s.assignment_id, s.code, s.created_at FROM submission s "
+        "JOIN (SELECT MAX(id) AS id FROM submission WHERE is_draft = 1 "
+        "      GROUP BY student_id, assignment_id) latest ON latest.id = s.id"
+    )).all()
+    for student_id, assignment_id, code, created_at in rows:
+        if student_id is None or assignment_id is None:
+            continue
+        exists = conn.execute(text(
+            "SELECT 1 FROM draft WHERE student_id = :s AND assignment_id = :a"
+        ), {"s": student_id, "a": assignment_id}).first()
+        if exists:
+            continue
+        code = code or ""
+        conn.execute(text(
+            "INSERT INTO draft (student_id, assignment_id, code_blob, compressed, code_hash, updated_at) "
+            "VALUES (:s, :a, :blob, 0, :h, :t)"
+        ), {"s": student_id, "a": assignment_id, "blob": code.encode("utf-8"),
+            "h": hashlib.sha256(code.encode("utf-8")).hexdigest(), "t": created_at})
+    # Nothing may keep pointing at the draft submissions once they are gone.
+    existing = set(inspect(conn).get_table_names())
+    for table in ("grading_job", "rubric_grade", "submission_case_result"):
+        if table in existing:
+            conn.execute(text(
+                f"DELETE FROM {table} WHERE submission_id IN (SELECT id FROM submission WHERE is_draft = 1)"
+            ))
+    if "gradebook_entry" in existing:
+        conn.execute(text(
+            "UPDATE gradebook_entry SET submission_id = NULL "
+            "WHERE submission_id IN (SELECT id FROM submission WHERE is_draft = 1)"
+        ))
+    conn.execute(text("DELETE FROM submission WHERE is_draft = 1"))
+
+
+MIGRATIONS = [
+    (1, "hot path indexes", m001_hot_path_indexes),
+    (2, "move drafts out of submissions", m002_move_drafts_out_of_submissions),
+]
+
+
+def _ensure_table(conn):
+    conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS schema_migrations ("
+        "version INTEGER PRIMARY KEY, name VARCHAR(255) NOT NULL, applied_at VARCHAR(32) NOT NULL)"
+    ))
+
+
+def applied_versions() -> set[int]:
+    with db.engine.begin() as conn:
+        _ensure_table(conn)
+        return {row[0] for row in conn.execute(text("SELECT version FROM schema_migrations"))}
+
+
+def pending_migrations() -> list:
+    done = applied_versions()
+    return [m for m in MIGRATIONS if m[0] not in done]
+
+
+def migrate(verbose: bool = True) -> int:
+    """Apply pending migrations, each in its own transaction. Returns how many ran."""
+    ran = 0
+    for version, name, fn in pending_migrations():
+        with db.engine.begin() as conn:
+            fn(conn)
+            conn.execute(
+                text("INSERT INTO schema_migrations (version, name, applied_at) VALUES (:v, :n, :t)"),
+                {"v": version, "n": name, "t": datetime.utcnow().isoformat()},
+            )
+        ran += 1
+        if verbose:
+            print(f"[migrate] applied {version:03d} {name}")
+    return ran
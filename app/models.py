@@ -25,7 +25,8 @@ class User(UserMixin, db.Model):
 
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    from .identity_cache import cached_user
+    return cached_user(int(user_id))
 
 class Class(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -35,6 +36,9 @@ class Class(db.Model):
     teacher = db.relationship('User', backref='classes_taught', foreign_keys=[teacher_id])
 
 class Enrollment(db.Model):
+    __table_args__ = (
+        db.Index('uq_enrollment_student_class', 'student_id', 'class_id', unique=True),
+    )
     id = db.Column(db.Integer, primary_key=True)
     class_id = db.Column(db.Integer, db.ForeignKey('class.id'))
     student_id = db.Column(db.Integer, db.ForeignKey('user.id'))
@@ -54,8 +58,13 @@ class Assignment(db.Model):
     class_assignments = db.relationship('ClassAssignment', cascade="all, delete-orphan", backref='assignment', lazy='dynamic')
     submissions = db.relationship('Submission', cascade="all, delete-orphan", backref='assignment', lazy='dynamic')
     rubric_criteria = db.relationship('RubricCriterion', cascade="all, delete-orphan", backref='assignment', lazy='dynamic')
+    drafts = db.relationship('Draft', cascade="all, delete-orphan", backref='assignment', lazy='dynamic')
+    gradebook_entries = db.relationship('GradebookEntry', cascade="all, delete-orphan", lazy='dynamic')
 
 class ClassAssignment(db.Model):
+    __table_args__ = (
+        db.Index('ix_class_assignment_assignment_class', 'assignment_id', 'class_id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     class_id = db.Column(db.Integer, db.ForeignKey('class.id'))
     assignment_id = db.Column(db.Integer, db.ForeignKey('assignment.id'))
@@ -63,6 +72,9 @@ class ClassAssignment(db.Model):
     klass = db.relationship('Class', backref='class_assignments')
 
 class Submission(db.Model):
+    __table_args__ = (
+        db.Index('ix_submission_assignment_student_created', 'assignment_id', 'student_id', 'created_at'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     assignment_id = db.Column(db.Integer, db.ForeignKey('assignment.id'))
     student_id = db.Column(db.Integer, db.ForeignKey('user.id'))
@@ -85,6 +97,9 @@ class Submission(db.Model):
     student = db.relationship('User', backref='submissions', foreign_keys=[student_id])
 
 class RubricCriterion(db.Model):
+    __table_args__ = (
+        db.Index('ix_rubric_criterion_assignment_order', 'assignment_id', 'order_index'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     assignment_id = db.Column(db.Integer, db.ForeignKey('assignment.id'), nullable=False)
     key = db.Column(db.String(64), nullable=False)
@@ -93,7 +108,118 @@ class RubricCriterion(db.Model):
     order_index = db.Column(db.Integer, nullable=False, default=0)
 
 class RubricGrade(db.Model):
+    __table_args__ = (
+        db.Index('uq_rubric_grade_submission_criterion', 'submission_id', 'criterion_id', unique=True),
+    )
     id = db.Column(db.Integer, primary_key=True)
     submission_id = db.Column(db.Integer, db.ForeignKey('submission.id'), nullable=False)
     criterion_id = db.Column(db.Integer, db.ForeignKey('rubric_criterion.id'), nullable=False)
     awarded = db.Column(db.Float, nullable=False, default=0.0)
+
+class GradingJob(db.Model):
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+    id = db.Column(db.Integer, primary_key=True)
+    submission_id = db.Column(db.Integer, db.ForeignKey('submission.id'), nullable=False, index=True)
+    status = db.Column(db.String(16), nullable=False, default=PENDING, index=True)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    error = db.Column(db.Text, default="")
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    submission = db.relationship('Submission', backref=db.backref('grading_jobs', cascade="all, delete-orphan"))
+
+class SubmissionCaseResult(db.Model):
+    # One byte per case, in case order (codes in app/case_results.py), for the scheme it was graded against
+    submission_id = db.Column(db.Integer, db.ForeignKey('submission.id'), primary_key=True)
+    scheme_hash = db.Column(db.String(64), nullable=False, index=True)
+    outcomes = db.Column(db.LargeBinary, nullable=False)
+
+    submission = db.relationship('Submission', backref=db.backref('case_result', uselist=False, cascade="all, delete-orphan"))
+
+class GradeCacheEntry(db.Model):
+    # key = sha256 of (code, canonical mark scheme); see app/grade_cache.py
+    key = db.Column(db.String(64), primary_key=True)
+    scheme_hash = db.Column(db.String(64), nullable=False, index=True)
+    rows_json = db.Column(db.Text, nullable=False)
+    total = db.Column(db.Float, nullable=False, default=0.0)
+    max_total = db.Column(db.Float, nullable=False, default=0.0)
+    passed = db.Column(db.Boolean, nullable=False, default=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class Draft(db.Model):
+    # One autosaved draft per student and assignment; see app/drafts.py
+    __table_args__ = (
+        db.Index('uq_draft_student_assignment', 'student_id', 'assignment_id', unique=True),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    student_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    assignment_id = db.Column(db.Integer, db.ForeignKey('assignment.id'), nullable=False)
+    code_blob = db.Column(db.LargeBinary, nullable=False)
+    compressed = db.Column(db.Boolean, nullable=False, default=False)
+    code_hash = db.Column(db.String(64), nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    revision_at = db.Column(db.DateTime, nullable=True)
+
+    revisions = db.relationship('DraftRevision', cascade="all, delete-orphan", backref='draft', lazy='dynamic')
+
+class DraftRevision(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    draft_id = db.Column(db.Integer, db.ForeignKey('draft.id'), nullable=False, index=True)
+    code_blob = db.Column(db.LargeBinary, nullable=False)
+    compressed = db.Column(db.Boolean, nullable=False, default=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class CredentialsJob(db.Model):
+    # Whole-class password reset + printable PDF, built off the request thread; see app/credentials.py
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+    id = db.Column(db.Integer, primary_key=True)
+    class_id = db.Column(db.Integer, db.ForeignKey('class.id'), nullable=False, index=True)
+    requested_by = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    status = db.Column(db.String(16), nullable=False, default=PENDING)
+    student_count = db.Column(db.Integer, nullable=False, default=0)
+    pdf = db.Column(db.LargeBinary, nullable=True)
+    error = db.Column(db.Text, default="")
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    klass = db.relationship('Class', backref=db.backref('credentials_jobs', cascade="all, delete-orphan"))
+
+class AssignmentDocument(db.Model):
+    # Assignment details for ASSIGNMENT_STORE=sql; see app/assignment_store.py
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    owner_id = db.Column(db.Integer, nullable=True, index=True)
+    title = db.Column(db.String(255), nullable=False, default="")
+    data = db.Column(db.Text, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class GradebookEntry(db.Model):
+    # Materialized (class, assignment, student) gradebook; see app/gradebook_table.py
+    __table_args__ = (
+        db.Index('uq_gradebook_class_assignment_student', 'class_id', 'assignment_id', 'student_id', unique=True),
+        db.Index('ix_gradebook_student_assignment', 'student_id', 'assignment_id'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    class_id = db.Column(db.Integer, db.ForeignKey('class.id'), nullable=False)
+    assignment_id = db.Column(db.Integer, db.ForeignKey('assignment.id'), nullable=False)
+    student_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    submission_id = db.Column(db.Integer, db.ForeignKey('submission.id'), nullable=True)
+    submitted_at = db.Column(db.DateTime, nullable=True)
+    due_at = db.Column(db.DateTime, nullable=True)
+    submitted = db.Column(db.Boolean, nullable=False, default=False)
+    late = db.Column(db.Boolean, nullable=False, default=False)
+    auto_score = db.Column(db.Float, default=0.0)
+    auto_max = db.Column(db.Float, default=0.0)
+    rubric_score = db.Column(db.Float, default=0.0)
+    rubric_max = db.Column(db.Float, default=0.0)
+    final_score = db.Column(db.Float, default=0.0)
+    final_max = db.Column(db.Float, default=0.0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
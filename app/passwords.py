@@ -0,0 +1,92 @@
+"""
+Password hashing helpers for bulk account work.
+
+generate_password_hash is deliberately slow, so hashing a whole class in a
+request thread takes seconds. hash_passwords() spreads the work over a
+process pool (PASSWORD_HASH_WORKERS, default: CPU count) and falls back to
+a plain loop for a handful of passwords. The pool is spawned, not forked:
+a web worker has threads, database connections and sandbox pipes that a
+forked child must not inherit. Only the manage.py CLI asks for "fork".
+
+Logins check one password each, but a class signing in together means
+dozens at once. verify_password() runs them on a small thread pool
+(LOGIN_VERIFY_WORKERS; hashlib releases the GIL while hashing) and admits
+at most LOGIN_VERIFY_QUEUE more waiting checks, so a burst gets a quick
+"try again" rather than every request thread hashing at once.
+"""
+import multiprocessing, os, threading, time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, TimeoutError as FutureTimeout
+from flask import current_app, has_app_context
+from werkzeug.security import generate_password_hash, check_password_hash
+
+from .metrics import PASSWORD_CHECKS_TOTAL, PASSWORD_QUEUE_DEPTH, PASSWORD_WAIT_SECONDS
+
+SERIAL_BELOW = 4
+
+
+def hash_workers() -> int:
+    n = current_app.config.get("PASSWORD_HASH_WORKERS") if has_app_context() else None
+    return max(1, int(n or os.cpu_count() or 1))
+
+
+def hash_passwords(passwords: list[str], workers: int | None = None, start_method: str = "spawn") -> list[str]:
+    workers = workers or hash_workers()
+    if workers == 1 or len(passwords) < SERIAL_BELOW:
+        return [generate_password_hash(p) for p in passwords]
+    chunk = max(1, len(passwords) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=min(workers, len(passwords)),
+                             mp_context=multiprocessing.get_context(start_method)) as ex:
+        return list(ex.map(generate_password_hash, passwords, chunksize=chunk))
+
+
+class PasswordCheckRejected(Exception):
+    """Too many password checks in flight (or one waited too long); ask the client to retry."""
+
+
+_verify_lock = threading.Lock()
+_verify_pool = None
+_verify_slots = None
+
+
+def _verifier():
+    global _verify_pool, _verify_slots
+    with _verify_lock:
+        if _verify_pool is None:
+            cfg = current_app.config
+            workers = max(1, cfg["LOGIN_VERIFY_WORKERS"] or os.cpu_count() or 1)
+            _verify_pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-check")
+            _verify_slots = threading.BoundedSemaphore(workers + max(0, cfg["LOGIN_VERIFY_QUEUE"]))
+        return _verify_pool, _verify_slots
+
+
+def verify_password(pw_hash: str, password: str) -> bool:
+    """check_password_hash on the login pool. Raises PasswordCheckRejected when saturated."""
+    if not current_app.config["LOGIN_VERIFY_OFFLOAD"]:
+        ok = check_password_hash(pw_hash, password)
+        PASSWORD_CHECKS_TOTAL.inc(1, "ok" if ok else "invalid")
+        return ok
+
+    pool, slots = _verifier()
+    if not slots.acquire(blocking=False):
+        PASSWORD_CHECKS_TOTAL.inc(1, "rejected")
+        raise PasswordCheckRejected()
+    PASSWORD_QUEUE_DEPTH.inc()
+    queued = time.perf_counter()
+
+    def check():
+        PASSWORD_WAIT_SECONDS.observe(time.perf_counter() - queued)
+        return check_password_hash(pw_hash, password)
+
+    def done(_):
+        PASSWORD_QUEUE_DEPTH.dec()
+        slots.release()
+
+    future = pool.submit(check)
+    future.add_done_callback(done)
+    try:
+        ok = future.result(timeout=current_app.config["LOGIN_VERIFY_TIMEOUT"])
+    except FutureTimeout:
+        PASSWORD_CHECKS_TOTAL.inc(1, "timeout")
+        raise PasswordCheckRejected() from None
+    PASSWORD_CHECKS_TOTAL.inc(1, "ok" if ok else "invalid")
+    return ok
@@ -0,0 +1,175 @@
+"""
+pytest grading backend, used when an assignment sets tests_path.
+
+The submission is written to a scratch directory as student.py next to a
+copy of the test file, and pytest runs there in a child process under the
+usual grading limits. Each test function becomes one grade row; the test
+names come from the test file itself, so a submission that fails to import
+still gets a row (and a zero) for every test. Parametrized tests pass only
+if every parameter set passes.
+
+Marks default to 1 per test; the mark scheme may set {"tests": {"test_x": 2}}.
+"""
+import ast, hashlib, os, shutil, signal, subprocess, sys, tempfile
+import xml.etree.ElementTree as ET
+
+from flask import current_app, has_app_context
+
+RUNNER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "pytest_runner.py")
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MESSAGE_LIMIT = 500
+
+
+def tests_root() -> str:
+    root = current_app.config.get("GRADING_TESTS_ROOT") if has_app_context() else None
+    return os.path.realpath(root or PROJECT_ROOT)
+
+
+def pytest_spec(tests_path: str, mark_scheme: dict | None) -> dict:
+    """
+    The {"pytest": {...}} grading spec for tests_path, a test file or a
+    directory holding a single test_*.py. It embeds a hash of the test file
+    so cached grades are keyed on the tests' content.
+    """
+    root = tests_root()
+    path = os.path.realpath(os.path.join(root, tests_path))
+    if os.path.commonpath([root, path]) != root:
+        return {"pytest": {"path": tests_path, "error": "tests_path is outside the tests directory"}}
+    if os.path.isdir(path):
+        found = sorted(n for n in os.listdir(path) if n.startswith("test_") and n.endswith(".py"))
+        if len(found) != 1:
+            return {"pytest": {"path": tests_path,
+                               "error": f"expected one test_*.py in {tests_path}, found {len(found)}"}}
+        path = os.path.join(path, found[0])
+    try:
+        with open(path, "rb") as f:
+            raw = f.read()
+    except OSError:
+        return {"pytest": {"path": tests_path, "error": f"test file not found: {tests_path}"}}
+    try:
+        ast.parse(raw.decode("utf-8"))
+    except (UnicodeDecodeError, SyntaxError, ValueError) as e:
+        return {"pytest": {"path": tests_path, "error": f"{tests_path} is not a valid Python test file: {e}"}}
+    digest = hashlib.sha256(raw).hexdigest()
+    marks = (mark_scheme or {}).get("tests") or {}
+    return {"pytest": {"path": path, "sha256": digest, "marks": marks}}
+
+
+def tests_path_error(tests_path: str) -> str | None:
+    """Why tests_path cannot be graded, or None; checked when an assignment is saved."""
+    return pytest_spec(tests_path, None)["pytest"].get("error")
+
+
+def collect_test_names(source: str) -> list[str]:
+    """Module-level test functions and test methods of Test* classes, in file order."""
+    names = []
+    for node in ast.parse(source).body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)) and node.name.startswith("test"):
+            names.append(node.name)
+        elif isinstance(node, ast.ClassDef) and node.name.startswith("Test"):
+            for item in node.body:
+                if isinstance(item, (ast.FunctionDef, ast.AsyncFunctionDef)) and item.name.startswith("test"):
+                    names.append(f"{node.name}.{item.name}")
+    return names
+
+
+def _row(i, name, marks, status, error=None):
+    row = {
+        "index": i, "function": name, "args": [], "kwargs": {}, "expected": None, "got": None,
+        "correct": status == "passed", "marks_awarded": marks if status == "passed" else 0.0,
+        "marks_available": marks, "status": status,
+    }
+    if error:
+        row["error"] = error[:MESSAGE_LIMIT]
+    return row
+
+
+def _parse_report(report_path: str, module: str) -> tuple[dict, str | None]:
+    """Return ({test name: (status, message)}, collection error message)."""
+    outcomes, collection_error = {}, None
+    for case in ET.parse(report_path).getroot().iter("testcase"):
+        classname = case.get("classname") or ""
+        cls = classname[len(module) + 1:] if classname.startswith(module + ".") else ""
+        base = (case.get("name") or "").split("[", 1)[0]
+        key = f"{cls}.{base}" if cls else base
+
+        status, message = "passed", None
+        for tag, label in (("failure", "failed"), ("error", "error"), ("skipped", "skipped")):
+            el = case.find(tag)
+            if el is not None:
+                status, message = label, (el.get("message") or el.text or label).strip()
+                break
+        if not classname and status == "error":
+            # the message is just "collection failure"; the traceback's last line says why
+            lines = [ln.strip().removeprefix("E").strip() for ln in (el.text or "").splitlines() if ln.strip()]
+            collection_error = lines[-1] if lines else message
+            continue
+        if outcomes.get(key, ("passed",))[0] == "passed":
+            outcomes[key] = (status, message)
+    return outcomes, collection_error
+
+
+def grade_pytest(code: str, spec: dict, limits: dict):
+    """Same return shape as grade_submission_detailed: (rows, total, max_total, passed)."""
+    if spec.get("error"):
+        return [_row(1, spec["path"], 0.0, "error", spec["error"])], 0.0, 0.0, False
+
+    try:
+        with open(spec["path"], "r", encoding="utf-8") as f:
+            source = f.read()
+        names = collect_test_names(source)
+    except OSError:
+        return [_row(1, os.path.basename(spec["path"]), 0.0, "error", "test file not found")], 0.0, 0.0, False
+    except (UnicodeDecodeError, SyntaxError, ValueError) as e:
+        return [_row(1, os.path.basename(spec["path"]), 0.0, "error", f"Invalid test file: {e}")], 0.0, 0.0, False
+    marks = {n: float(spec.get("marks", {}).get(n, 1)) for n in names}
+    max_total = sum(marks.values())
+
+    budget = limits["import_timeout"] + limits["case_timeout"] * max(1, len(names)) + 5
+    test_file = os.path.basename(spec["path"])
+    module = os.path.splitext(test_file)[0]
+    workdir = tempfile.mkdtemp(prefix="pytest_grade_")
+    try:
+        with open(os.path.join(workdir, "student.py"), "w", encoding="utf-8") as f:
+            f.write(code or "")
+        with open(os.path.join(workdir, test_file), "w", encoding="utf-8") as f:
+            f.write(source)
+        report = os.path.join(workdir, ".report.xml")
+        env = {"PATH": os.environ.get("PATH", ""), "PYTHONDONTWRITEBYTECODE": "1",
+               "PYTHONPATH": os.path.dirname(RUNNER_SCRIPT)}
+        proc = subprocess.Popen([sys.executable, RUNNER_SCRIPT, str(limits["memory_mb"]), str(budget), report, test_file],
+                                cwd=workdir, env=env, stdin=subprocess.DEVNULL,
+                                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True)
+        try:
+            proc.wait(timeout=budget)
+        except subprocess.TimeoutExpired:
+            os.killpg(proc.pid, signal.SIGKILL)
+            proc.wait()
+            rows = [_row(i, n, marks[n], "timed out", f"tests timed out after {budget:g}s")
+                    for i, n in enumerate(names, start=1)]
+            return rows, 0.0, max_total, False
+        try:
+            outcomes, collection_error = _parse_report(report, module)
+            crashed = None
+        except (OSError, ET.ParseError):
+            outcomes, collection_error = {}, None
+            if proc.returncode in (-signal.SIGXCPU, -signal.SIGKILL):
+                crashed = ("timed out", "CPU time limit exceeded")
+            else:
+                crashed = ("memory exceeded", "grader process crashed (memory limit exceeded?)")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    rows, total = [], 0.0
+    for i, name in enumerate(names, start=1):
+        if name in outcomes:
+            status, message = outcomes[name]
+        elif crashed:
+            status, message = crashed
+        else:
+            status = "error"
+            message = f"Code raised on import: {collection_error}" if collection_error else "test did not run"
+        row = _row(i, name, marks[name], status, message)
+        total += row["marks_awarded"]
+        rows.append(row)
+    return rows, total, max_total, total == max_total
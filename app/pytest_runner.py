@@ -0,0 +1,26 @@
+"""
+Child-process side of app.pytest_grading.
+
+usage: pytest_runner.py MEMORY_MB CPU_SECONDS REPORT_XML TEST_FILE
+
+Applies the address-space and CPU limits, then runs pytest on the copied
+test file in the current (scratch) directory, where the submission sits as
+student.py. Results go to REPORT_XML; pytest's own output is discarded by
+the parent.
+"""
+import sys
+
+from grading_runner import set_cpu_limit, set_memory_limit
+
+
+def main():
+    memory_mb, cpu_seconds, report, test_file = sys.argv[1:5]
+    import pytest  # before the memory limit: the import alone is most of pytest's footprint
+    set_memory_limit(int(memory_mb))
+    set_cpu_limit(float(cpu_seconds))
+    sys.exit(pytest.main(["-q", "-p", "no:cacheprovider", "-o", "junit_family=xunit2",
+                          f"--junitxml={report}", test_file]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Bulk regrade of an assignment after its mark scheme changes.
+
+Each distinct piece of code is graded once. Distinct codes are split into
+chunks that grade_batch grades in one grading process each, and a thread
+pool keeps --jobs of those processes busy (default: one per CPU core).
+Scores are written back in batched UPDATEs.
+"""
+import hashlib, json, os, time
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import func, update
+
+from .models import db, Submission, Enrollment, RubricGrade
+from .assignment_store import load_assignment
+from .grading import grade_batch, grading_limits, assignment_scheme
+from .grade_cache import remember
+from .case_results import record_case_results
+from .gradebook_table import rebuild_gradebook
+
+# Largest number of distinct codes handed to one grade_batch call, so
+# progress is written back regularly on big assignments.
+CHUNK_MAX = 25
+
+
+def _select_submissions(aid: int, class_id: int | None):
+    q = (db.session.query(Submission.id, Submission.code, Submission.rubric_max)
+         .filter(Submission.assignment_id == aid, Submission.is_draft.is_(False)))
+    if class_id is not None:
+        q = q.join(Enrollment, Enrollment.student_id == Submission.student_id).filter(Enrollment.class_id == class_id)
+    return q.order_by(Submission.id).all()
+
+
+def regrade_assignment(aid: int, class_id: int | None = None, jobs: int | None = None, batch_size: int = 200,
+                       log=print) -> dict:
+    """Regrade every non-draft submission for aid (optionally one class). Call from an app context."""
+    data = load_assignment(aid)
+    if data is None:
+        raise ValueError(f"Assignment {aid} has no JSON")
+    scheme = assignment_scheme(data)
+    limits = grading_limits()
+    jobs = jobs or os.cpu_count() or 1
+
+    t0 = time.perf_counter()
+    subs = _select_submissions(aid, class_id)
+    rubric_totals = dict(
+        db.session.query(RubricGrade.submission_id, func.sum(RubricGrade.awarded))
+        .join(Submission, Submission.id == RubricGrade.submission_id)
+        .filter(Submission.assignment_id == aid)
+        .group_by(RubricGrade.submission_id)
+        .all()
+    )
+
+    by_code = {}
+    for s in subs:
+        by_code.setdefault(hashlib.sha256((s.code or "").encode("utf-8")).hexdigest(), []).append(s)
+    log(f"[regrade] assignment {aid}: {len(subs)} submissions, {len(by_code)} distinct, {jobs} jobs")
+
+    groups = list(by_code.values())
+    chunk = max(1, min(CHUNK_MAX, -(-len(groups) // jobs)))
+    chunks = [groups[i:i + chunk] for i in range(0, len(groups), chunk)]
+
+    def grade(chunk_groups):
+        return chunk_groups, grade_batch([g[0].code for g in chunk_groups], scheme, limits)
+
+    pending, case_rows = [], []
+    written = 0
+
+    def flush():
+        nonlocal written
+        if pending:
+            db.session.execute(update(Submission), pending)
+            record_case_results(case_rows, scheme.hash)
+            db.session.commit()
+            written += len(pending)
+            pending.clear()
+            case_rows.clear()
+
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as ex:
+        for chunk_groups, results in ex.map(grade, chunks):
+            for group, result in zip(chunk_groups, results):
+                remember(group[0].code, scheme, result)
+                _, total, max_total, passed = result
+                for s in group:
+                    rubric = float(rubric_totals.get(s.id) or 0.0)
+                    rubric_max = float(s.rubric_max or 0.0)
+                    pending.append({
+                        "id": s.id,
+                        "score": total, "max_score": max_total, "passed": passed,
+                        "auto_score": total, "auto_max": max_total,
+                        "rubric_score": rubric,
+                        "final_score": rubric + total, "final_max": rubric_max + max_total,
+                    })
+                    case_rows.append((s.id, result[0]))
+            if len(pending) >= batch_size:
+                flush()
+                log(f"[regrade] {written}/{len(subs)}")
+    flush()
+    rebuild_gradebook(assignment_id=aid)
+    db.session.commit()
+
+    elapsed = time.perf_counter() - t0
+    stats = {
+        "submissions": written,
+        "distinct_code": len(by_code),
+        "seconds": round(elapsed, 2),
+        "per_second": round(written / elapsed, 1) if elapsed else None,
+    }
+    log(f"[regrade] done: {stats['submissions']} submissions in {stats['seconds']}s "
+        f"({stats['per_second']}/s, {stats['distinct_code']} graded)")
+    return stats
@@ -0,0 +1,104 @@
+"""
+CSV roster import: validate every row, hash temporary passwords in
+parallel, then create the students and their enrollments in one commit.
+
+Expected header (case-insensitive, any order): first_name, last_name,
+username, and optionally email and password. Rows whose username or email
+already exist (in the file or the database) are skipped and reported as
+duplicates; any invalid row aborts the whole import.
+"""
+import csv, io, re, secrets
+
+from .models import db, User, Role, Enrollment
+from .passwords import hash_passwords
+from .gradebook_table import rebuild_gradebook
+
+REQUIRED = ("first_name", "last_name", "username")
+OPTIONAL = ("email", "password")
+USERNAME_RE = re.compile(r"^[a-z0-9._-]{1,64}$")
+EMAIL_RE = re.compile(r"^[^@\s]+@[^@\s]+$")
+
+
+def parse_roster(text: str):
+    """Return (rows, errors). Each row is a dict with the known columns plus 'line'."""
+    reader = csv.DictReader(io.StringIO(text.lstrip("\ufeff")))
+    if not reader.fieldnames:
+        return [], ["The file is empty."]
+    fields = {f.strip().lower(): f for f in reader.fieldnames if f}
+    missing = [c for c in REQUIRED if c not in fields]
+    if missing:
+        return [], [f"Missing column(s): {', '.join(missing)}"]
+
+    rows, errors = [], []
+    for line, raw in enumerate(reader, start=2):
+        row = {c: (raw.get(fields[c]) or "").strip() for c in REQUIRED + OPTIONAL if c in fields}
+        if not any(row.values()):
+            continue
+        row["username"] = row["username"].lower()
+        row["email"] = (row.get("email") or "").lower() or f"{row['username']}@example.local"
+        row["line"] = line
+        if not USERNAME_RE.match(row["username"]):
+            errors.append(f"Line {line}: invalid username '{row['username']}'")
+        if not EMAIL_RE.match(row["email"]):
+            errors.append(f"Line {line}: invalid email '{row['email']}'")
+        if not (row["first_name"] or row["last_name"]):
+            errors.append(f"Line {line}: a first or last name is required")
+        rows.append(row)
+    if not rows and not errors:
+        errors.append("The file has no student rows.")
+    return rows, errors
+
+
+def import_roster(class_id: int, text: str, workers: int | None = None, start_method: str = "spawn") -> dict:
+    """
+    Returns {"created": [...], "duplicates": [...], "errors": [...]}.
+    created entries include the plain temporary password so it can be handed out.
+    """
+    rows, errors = parse_roster(text)
+    if errors:
+        return {"created": [], "duplicates": [], "errors": errors}
+
+    usernames = [r["username"] for r in rows]
+    emails = [r["email"] for r in rows]
+    taken_usernames, taken_emails = set(), set()
+    for i in range(0, len(rows), 500):
+        taken_usernames.update(u for (u,) in db.session.query(User.username).filter(User.username.in_(usernames[i:i + 500])))
+        taken_emails.update(e for (e,) in db.session.query(User.email).filter(User.email.in_(emails[i:i + 500])))
+
+    fresh, duplicates = [], []
+    seen_u, seen_e = set(), set()
+    for r in rows:
+        reason = None
+        if r["username"] in taken_usernames:
+            reason = "username already exists"
+        elif r["email"] in taken_emails:
+            reason = "email already exists"
+        elif r["username"] in seen_u:
+            reason = "username repeated in file"
+        elif r["email"] in seen_e:
+            reason = "email repeated in file"
+        if reason:
+            duplicates.append({"line": r["line"], "username": r["username"], "email": r["email"], "reason": reason})
+            continue
+        seen_u.add(r["username"])
+        seen_e.add(r["email"])
+        r["password"] = r.get("password") or secrets.token_urlsafe(8)
+        fresh.append(r)
+
+    hashes = hash_passwords([r["password"] for r in fresh], workers, start_method)
+
+    users = []
+    for r, h in zip(fresh, hashes):
+        name = f"{r['first_name']} {r['last_name']}".strip() or r["username"]
+        users.append(User(first_name=r["first_name"], last_name=r["last_name"], name=name,
+                          username=r["username"], email=r["email"], role=Role.STUDENT, password_hash=h))
+    db.session.add_all(users)
+    db.session.flush()
+    db.session.add_all([Enrollment(class_id=class_id, student_id=u.id) for u in users])
+    db.session.flush()
+    rebuild_gradebook(class_id=class_id, student_ids=[u.id for u in users])
+    db.session.commit()
+
+    created = [{"id": u.id, "name": u.name, "username": u.username, "email": u.email, "password": r["password"]}
+               for u, r in zip(users, fresh)]
+    return {"created": created, "duplicates": duplicates, "errors": []}
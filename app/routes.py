@@ -1,42 +1,68 @@
-import os, tempfile, shutil, subprocess, sys
+import os
 from datetime import datetime
 from io import BytesIO
-from flask import Blueprint, render_template, redirect, url_for, request, flash, abort, current_app, jsonify, send_from_directory, send_file
+from flask import Blueprint, render_template, redirect, url_for, request, flash, abort, current_app, jsonify, send_from_directory, send_file, Response, stream_with_context
 from flask_login import login_required, current_user
-from markdown2 import markdown
+from sqlalchemy import func, or_, and_
+from sqlalchemy.orm import joinedload, defer
 import bleach, secrets
 from werkzeug.utils import secure_filename
 from reportlab.pdfgen import canvas
 from reportlab.lib.pagesizes import A4
 import json
 from types import SimpleNamespace
-from .assignment_store import assignments_dir, load_assignment, save_assignment, delete_assignment
-
-from .models import db, User, Role, Class, Enrollment, Assignment, ClassAssignment, Submission, RubricCriterion, RubricGrade
-from .grading import grade_submission, grade_submission_detailed
+from .assignment_store import load_assignment, save_assignment, delete_assignment, get_store, description_html
+from .markup import ALLOWED_TAGS, ALLOWED_ATTRS
+
+from .models import db, User, Role, Class, Enrollment, Assignment, ClassAssignment, Submission, RubricCriterion, RubricGrade, GradingJob, CredentialsJob
+from .grading import grade_submission, grade_submission_detailed, assignment_scheme
+from .grade_cache import grade_cached
+from .pytest_grading import tests_path_error
+from .sandbox import run_student_code, stream_student_code
+from .grading_queue import enqueue_grading, grading_status
+from .drafts import save_draft_code, load_draft
+from .gradebook import iter_gradebook_rows, stream_csv, stream_xlsx
+from .roster import import_roster
+from .case_results import record_case_results, assignment_analytics
+from .credentials import start_credentials_job, job_status
+from .gradebook_table import refresh_gradebook_entry, rebuild_gradebook
+from .uploads import store_image, original_name, HASHED_NAME, CACHE_SECONDS
 
 main_bp = Blueprint('main', __name__)
 
-ALLOWED_TAGS = bleach.sanitizer.ALLOWED_TAGS.union({'p','img','h1','h2','h3','h4','h5','h6','pre','code','table','thead','tbody','tr','th','td'})
-ALLOWED_ATTRS = {**bleach.sanitizer.ALLOWED_ATTRIBUTES, 'img': ['src', 'alt', 'style']}
 
 
-def list_assignment_json_for_owner(owner_id: int) -> list[dict]:
-    out = []
-    d = assignments_dir()
-    for name in os.listdir(d):
-        if not (name.startswith("assignment_") and name.endswith(".json")):
-            continue
-        path = os.path.join(d, name)
-        try:
-            with open(path, "r", encoding="utf-8") as f:
-                data = json.load(f)
-            if data.get("owner_id") == owner_id:
-                out.append(data)
-        except Exception:
-            continue
-    out.sort(key=lambda x: x.get("id", 0), reverse=True)
-    return out
+def student_dashboard_context(student_id: int) -> dict:
+    """
+    Everything student_dashboard.html needs in a fixed number of queries:
+    enrollments with their classes and class assignments (one joined query),
+    assignment details (one store lookup) and the student's latest
+    submission per assignment (one grouped query).
+    """
+    enrollments = (Enrollment.query
+                   .filter_by(student_id=student_id)
+                   .options(joinedload(Enrollment.klass).joinedload(Class.class_assignments))
+                   .order_by(Enrollment.id)
+                   .all())
+
+    aids = {ca.assignment_id for e in enrollments for ca in e.klass.class_assignments}
+    assignment_map = {aid: SimpleNamespace(**data) for aid, data in get_store().get_many(aids).items()}
+
+    latest_map = {}
+    if aids:
+        latest_ids = (db.session.query(func.max(Submission.id))
+                      .filter(Submission.student_id == student_id,
+                              Submission.assignment_id.in_(aids),
+                              Submission.is_draft.is_(False))
+                      .group_by(Submission.assignment_id)
+                      .scalar_subquery())
+        latest = (Submission.query
+                  .options(defer(Submission.code), defer(Submission.feedback), defer(Submission.teacher_feedback))
+                  .filter(Submission.id.in_(latest_ids))
+                  .all())
+        latest_map = {s.assignment_id: s for s in latest}
+
+    return {"enrollments": enrollments, "assignment_map": assignment_map, "latest_map": latest_map}
 
 def _allowed_image(filename: str) -> bool:
     ext = filename.rsplit(".", 1)[-1].lower() if "." in filename else ""
@@ -46,7 +72,21 @@ def _allowed_image(filename: str) -> bool:
 @login_required
 def uploaded_file(filename):
     folder = current_app.config["UPLOAD_FOLDER"]
-    return send_from_directory(folder, filename, as_attachment=False)
+    if not HASHED_NAME.match(filename):
+        # uploads from before content hashing keep their names
+        return send_from_directory(folder, filename, as_attachment=False)
+    if request.args.get("original"):
+        original = original_name(filename)
+        if original is None:
+            abort(404)
+        if original != filename:
+            return redirect(url_for("main.uploaded_file", filename=original))
+    etag = filename.rsplit("/", 1)[-1].split(".", 1)[0]
+    resp = send_from_directory(folder, filename, as_attachment=False, etag=etag, max_age=CACHE_SECONDS)
+    resp.cache_control.public = False
+    resp.cache_control.private = True
+    resp.cache_control.immutable = True
+    return resp
 
 @main_bp.route("/upload-image", methods=["POST"])
 @login_required
@@ -60,17 +100,13 @@ def upload_image():
         return jsonify({"error": "No selected file"}), 400
     if not _allowed_image(file.filename):
         return jsonify({"error": "Unsupported file type"}), 400
-    folder = current_app.config["UPLOAD_FOLDER"]
-    os.makedirs(folder, exist_ok=True)
-    base = secure_filename(file.filename or f"pasted_{datetime.utcnow().timestamp()}.png")
-    name, dot, ext = base.partition(".")
-    i, final = 0, base
-    while os.path.exists(os.path.join(folder, final)):
-        i += 1
-        final = f"{name}_{i}.{ext}" if ext else f"{name}_{i}"
-    file.save(os.path.join(folder, final))
-    url = url_for("main.uploaded_file", filename=final, _external=False)
-    return jsonify({"url": url})
+    stored = store_image(file.read())
+    if stored is None:
+        return jsonify({"error": "Unsupported file type"}), 400
+    return jsonify({
+        "url": url_for("main.uploaded_file", filename=stored["name"], _external=False),
+        "original": url_for("main.uploaded_file", filename=stored["original"], _external=False),
+    })
 
 
 @main_bp.route('/')
@@ -78,27 +114,12 @@ def upload_image():
 def dashboard():
     if current_user.role == Role.TEACHER:
         classes = Class.query.filter_by(teacher_id=current_user.id).all()
-        assignments = list_assignment_json_for_owner(current_user.id)
+        assignments = get_store().list_by_owner(current_user.id)
         assignments = [SimpleNamespace(**a) for a in assignments]
         return render_template('teacher_dashboard.html', classes=classes, assignments=assignments)
 
     # STUDENT DASHBOARD
-    enrollments = Enrollment.query.filter_by(student_id=current_user.id).all()
-
-    assignment_map = {}
-    for e in enrollments:
-        for ca in e.klass.class_assignments:
-            aid = ca.assignment_id
-            if aid not in assignment_map:
-                data = load_assignment(aid)
-                if data:
-                    assignment_map[aid] = SimpleNamespace(**data)
-
-    return render_template(
-        'student_dashboard.html',
-        enrollments=enrollments,
-        assignment_map=assignment_map
-    )
+    return render_template('student_dashboard.html', **student_dashboard_context(current_user.id))
 
 @main_bp.route('/classes/create', methods=['GET','POST'])
 @login_required
@@ -127,6 +148,8 @@ def class_join():
         existing = Enrollment.query.filter_by(class_id=klass.id, student_id=current_user.id).first()
         if not existing:
             db.session.add(Enrollment(class_id=klass.id, student_id=current_user.id))
+            db.session.flush()
+            rebuild_gradebook(class_id=klass.id, student_ids=[current_user.id])
             db.session.commit()
             flash(f'Joined {klass.name}', 'success')
     return redirect(url_for('main.dashboard'))
@@ -148,6 +171,11 @@ def assignment_create():
         tests_path = request.form.get("tests_path") or None
         mark_scheme_json = request.form.get("mark_scheme_json") or None
 
+        tests_error = tests_path_error(tests_path) if tests_path else None
+        if tests_error:
+            flash(tests_error, "danger")
+            return render_template("assignment_create.html", mode="create", assignment=None)
+
         a = Assignment(owner_id=current_user.id)
         db.session.add(a)
         db.session.commit()  # get a.id
@@ -162,6 +190,7 @@ def assignment_create():
             "mark_scheme": json.loads(mark_scheme_json) if mark_scheme_json else None
         }
         save_assignment(a.id, assignment_data)
+        db.session.commit()
 
         flash("Assignment created", "success")
         return redirect(url_for("assignment_create", aid=a.id))
@@ -192,6 +221,10 @@ def assignment_edit(aid):
         if not title:
             flash('Title is required.', 'danger')
             return render_template('assignment_edit.html', mode='edit', assignment=a)
+        tests_error = tests_path_error(tests_path) if tests_path else None
+        if tests_error:
+            flash(tests_error, 'danger')
+            return render_template('assignment_create.html', mode='edit', assignment=a)
 
         updated = {
             "id": aid,
@@ -203,6 +236,7 @@ def assignment_edit(aid):
             "mark_scheme": json.loads(mark_scheme_json) if mark_scheme_json else None
         }
         save_assignment(aid, updated)
+        db.session.commit()
 
         flash('Assignment updated.', 'success')
         return redirect(url_for('main.assignment_detail', aid=aid))
@@ -253,11 +287,21 @@ def assignment_detail(aid):
         if not allowed:
             abort(403)
 
-    mark_scheme_json = json.dumps(data.get("mark_scheme") or {"cases": []})
+    scheme = assignment_scheme(data)
 
     if request.method == 'POST' and current_user.role == Role.STUDENT:
         code = request.form.get('code')
-        rows, total, max_total, passed = grade_submission_detailed(code, mark_scheme_json)
+        if current_app.config.get("GRADING_QUEUE"):
+            sub = Submission(assignment_id=aid, student_id=current_user.id, code=code, is_draft=False)
+            db.session.add(sub)
+            enqueue_grading(sub)
+            db.session.flush()
+            refresh_gradebook_entry(current_user.id, aid)
+            db.session.commit()
+            flash("Submitted. Your score will appear once grading finishes.", 'info')
+            return redirect(url_for('main.assignment_detail', aid=aid))
+
+        rows, total, max_total, passed = grade_cached(code, scheme)
 
         sub = Submission(
             assignment_id=aid,
@@ -272,23 +316,28 @@ def assignment_detail(aid):
             auto_max=max_total
         )
         db.session.add(sub)
+        db.session.flush()
+        record_case_results([(sub.id, rows)], scheme.hash)
+        refresh_gradebook_entry(current_user.id, aid)
         db.session.commit()
         flash(f"Submitted. Score: {total}/{max_total}", 'info')
         return redirect(url_for('main.assignment_detail', aid=aid))
 
-    description_html = markdown(a.description)
 
     # last submission preview grading (use JSON mark_scheme)
     last_rows, last_total, last_max = [], 0.0, 0.0
     last_rubric_rows, last_rubric_total, last_rubric_max = [], 0.0, 0.0
+    last_sub_id, last_status = None, None
 
     if current_user.role == Role.STUDENT:
         sub = (Submission.query
-               .filter_by(assignment_id=aid, student_id=current_user.id)
+               .filter_by(assignment_id=aid, student_id=current_user.id, is_draft=False)
                .order_by(Submission.created_at.desc())
                .first())
         if sub:
-            last_rows, last_total, last_max, _ = grade_submission_detailed(sub.code, mark_scheme_json)
+            last_sub_id, last_status = sub.id, grading_status(sub.id)
+        if sub and last_status == GradingJob.DONE:
+            last_rows, last_total, last_max, _ = grade_cached(sub.code, scheme)
 
             crits = RubricCriterion.query.filter_by(assignment_id=aid).order_by(RubricCriterion.order_index).all()
             gmap = {g.criterion_id: g.awarded for g in RubricGrade.query.filter_by(submission_id=sub.id).all()}
@@ -298,16 +347,45 @@ def assignment_detail(aid):
                 last_rubric_total += aw
                 last_rubric_max += float(c.max_marks)
 
+    # Reopen the editor on the newest of: draft, last submission, starter code.
+    editor_code = a.starter_code or ""
+    if current_user.role == Role.STUDENT:
+        draft = load_draft(current_user.id, aid)
+        if draft and (sub is None or draft[1] > sub.created_at):
+            editor_code = draft[0]
+        elif sub is not None:
+            editor_code = sub.code
+
     return render_template(
         'assignment_detail.html',
         assignment=a,
-        description_html=description_html,
+        editor_code=editor_code,
+        description_html=description_html(aid, data),
         last_rows=last_rows, last_total=last_total, last_max=last_max,
         last_rubric_rows=last_rubric_rows,
         last_rubric_total=last_rubric_total,
-        last_rubric_max=last_rubric_max
+        last_rubric_max=last_rubric_max,
+        last_sub_id=last_sub_id,
+        last_status=last_status
     )
 
+
+@main_bp.route('/submissions/<int:sid>/status')
+@login_required
+def submission_status(sid):
+    sub = Submission.query.get_or_404(sid)
+    if current_user.role == Role.STUDENT:
+        if sub.student_id != current_user.id:
+            abort(403)
+    elif sub.assignment.owner_id != current_user.id:
+        abort(403)
+    return jsonify({
+        "id": sub.id,
+        "status": grading_status(sub.id),
+        "auto_score": sub.auto_score,
+        "auto_max": sub.auto_max,
+    })
+
 @main_bp.route('/assignments/<int:aid>/assign', methods=['POST'])
 @login_required
 def assignment_assign(aid):
@@ -317,6 +395,8 @@ def assignment_assign(aid):
     due = request.form.get('due_at')
     due_dt = datetime.fromisoformat(due) if due else None
     db.session.add(ClassAssignment(class_id=klass_id, assignment_id=aid, due_at=due_dt))
+    db.session.flush()
+    rebuild_gradebook(class_id=klass_id, assignment_id=aid)
     db.session.commit()
     flash('Assigned to class', 'success')
     return redirect(url_for('main.dashboard'))
@@ -327,21 +407,41 @@ def run_code():
     data = request.get_json(force=True)
     code = (data or {}).get('code', '')
     timeout = 5
-    workdir = tempfile.mkdtemp(prefix='run_')
-    try:
-        path = os.path.join(workdir, 'student.py')
-        with open(path, 'w', encoding='utf-8') as f:
-            f.write(code)
-        proc = subprocess.Popen([sys.executable, path], cwd=workdir, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    result = run_student_code(code, timeout, current_app.config["RUN_OUTPUT_LIMIT"])
+    if result["timed_out"]:
+        return jsonify({"error": "Execution timed out"})
+    stdout, stderr = result["stdout"], result["stderr"]
+    output = (stdout or '') + ('\n' + stderr if stderr else '')
+    if result.get("truncated"):
+        output += "\n[output limit reached; program stopped]"
+    return jsonify({"output": output, "truncated": bool(result.get("truncated"))})
+
+@main_bp.route('/run_code/stream', methods=['POST'])
+@login_required
+def run_code_stream():
+    """
+    Server-Sent Events over a POST: "stdout"/"stderr" events carry JSON text
+    as it is printed, then one "exit" event. Closing the connection kills the run.
+    """
+    data = request.get_json(force=True)
+    code = (data or {}).get('code', '')
+    events = stream_student_code(code, 5, current_app.config["RUN_OUTPUT_LIMIT"])
+
+    def sse():
         try:
-            stdout, stderr = proc.communicate(timeout=timeout)
-        except subprocess.TimeoutExpired:
-            proc.kill()
-            return jsonify({"error": "Execution timed out"})
-        output = (stdout or '') + ('\n' + stderr if stderr else '')
-        return jsonify({"output": output[:8000]})
-    finally:
-        shutil.rmtree(workdir, ignore_errors=True)
+            for ev in events:
+                if ev["event"] == "ping":
+                    yield ": ping\n\n"
+                elif ev["event"] == "output":
+                    yield f"event: {ev['stream']}\ndata: {json.dumps(ev['data'])}\n\n"
+                else:
+                    info = {k: v for k, v in ev.items() if k != "event"}
+                    yield f"event: exit\ndata: {json.dumps(info)}\n\n"
+        finally:
+            events.close()
+
+    return Response(sse(), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-store", "X-Accel-Buffering": "no"})
 
 @main_bp.route('/assignments/<int:aid>/save_draft', methods=['POST'])
 @login_required
@@ -355,10 +455,10 @@ def save_draft(aid):
         abort(403)
     data = request.get_json(force=True) or {}
     code = data.get("code", "")
-    sub = Submission(assignment_id=aid, student_id=current_user.id, code=code, is_draft=True)
-    db.session.add(sub)
-    db.session.commit()
-    return jsonify({"ok": True, "saved_at": sub.created_at.isoformat()})
+    saved_at, retry_after = save_draft_code(current_user.id, aid, code, force=bool(data.get("force")))
+    if saved_at is None:
+        return jsonify({"ok": True, "saved": False, "retry_after": retry_after})
+    return jsonify({"ok": True, "saved": True, "saved_at": saved_at.isoformat()})
 
 # Rubric editor
 @main_bp.route('/assignments/<int:aid>/rubric', methods=['GET', 'POST'])
@@ -401,6 +501,21 @@ def rubric_edit(aid):
     criteria = RubricCriterion.query.filter_by(assignment_id=aid).order_by(RubricCriterion.order_index).all()
     return render_template('rubric_edit.html', assignment=assignment, criteria=criteria)
 
+@main_bp.route('/assignments/<int:aid>/analytics')
+@login_required
+def assignment_analytics_view(aid):
+    if current_user.role != Role.TEACHER:
+        abort(403)
+    a = Assignment.query.get_or_404(aid)
+    if a.owner_id != current_user.id:
+        abort(403)
+    data = load_assignment(aid) or {}
+    view = 'all' if request.args.get('view') == 'all' else 'latest'
+    stats = assignment_analytics(aid, assignment_scheme(data), latest_only=(view == 'latest'))
+    return render_template('assignment_analytics.html',
+                           assignment=SimpleNamespace(id=aid, title=data.get("title") or f"Assignment {aid}"),
+                           stats=stats, view=view)
+
 @main_bp.route('/assignments/<int:aid>/submissions')
 @login_required
 def submissions_list(aid):
@@ -409,14 +524,49 @@ def submissions_list(aid):
     a = Assignment.query.get_or_404(aid)
     if a.owner_id != current_user.id:
         abort(403)
-    subs = (Submission.query.filter_by(assignment_id=aid).order_by(Submission.created_at.desc()).all())
+    view = request.args.get('view', 'all')
+    latest_only = view == 'latest'
+    cursor = request.args.get('cursor')
+    page_size = int(current_app.config.get("SUBMISSIONS_PAGE_SIZE", 50))
+
+    q = Submission.query.filter(Submission.assignment_id == aid, Submission.is_draft.is_(False))
+    if latest_only:
+        # Rank each student's submissions newest first and keep rank 1.
+        ranked = (db.session.query(
+                      Submission.id.label("id"),
+                      func.row_number().over(
+                          partition_by=Submission.student_id,
+                          order_by=(Submission.created_at.desc(), Submission.id.desc())
+                      ).label("rn"))
+                  .filter(Submission.assignment_id == aid, Submission.is_draft.is_(False))
+                  .subquery())
+        q = q.join(ranked, ranked.c.id == Submission.id).filter(ranked.c.rn == 1)
+    if cursor:
+        # Keyset pagination on (created_at, id), newest first.
+        try:
+            ts, _, last_id = cursor.rpartition('_')
+            ts, last_id = datetime.fromisoformat(ts), int(last_id)
+        except ValueError:
+            abort(400)
+        q = q.filter(or_(Submission.created_at < ts,
+                         and_(Submission.created_at == ts, Submission.id < last_id)))
+    subs = (q.options(defer(Submission.code), defer(Submission.feedback), defer(Submission.teacher_feedback),
+                      joinedload(Submission.student))
+             .order_by(Submission.created_at.desc(), Submission.id.desc())
+             .limit(page_size + 1)
+             .all())
+    next_cursor = None
+    if len(subs) > page_size:
+        subs = subs[:page_size]
+        next_cursor = f"{subs[-1].created_at.isoformat()}_{subs[-1].id}"
 
     data = load_assignment(aid)
     if not data:
         abort(404)
     assignment = SimpleNamespace(**data)
 
-    return render_template('submissions_list.html', assignment=assignment, submissions=subs)
+    return render_template('submissions_list.html', assignment=assignment, submissions=subs,
+                           view=view, next_cursor=next_cursor, first_page=not cursor)
 
 @main_bp.route('/assignments/<int:aid>/submissions/<int:sid>', methods=['GET','POST'])
 @login_required
@@ -440,8 +590,8 @@ def submission_grade(aid, sid):
     assignment = SimpleNamespace(**data)
 
     # Auto-grade using JSON mark scheme
-    mark_scheme_json = json.dumps(data.get("mark_scheme") or {"cases": []})
-    rows, auto_total, auto_max, _ = grade_submission_detailed(sub.code, mark_scheme_json)
+    scheme = assignment_scheme(data)
+    rows, auto_total, auto_max, _ = grade_cached(sub.code, scheme)
 
     sub.auto_score = auto_total
     sub.auto_max = auto_max
@@ -487,6 +637,8 @@ def submission_grade(aid, sid):
         sub.rubric_max = rubric_max
         sub.final_score = (sub.rubric_score or 0.0) + (sub.auto_score or 0.0)
         sub.final_max = (sub.rubric_max or 0.0) + (sub.auto_max or 0.0)
+        db.session.flush()
+        refresh_gradebook_entry(sub.student_id, aid)
 
         db.session.commit()
         flash('Marks and feedback saved.', 'success')
@@ -507,6 +659,53 @@ def submission_grade(aid, sid):
         auto_total=auto_total,
         auto_max=auto_max
     )
+def _gradebook_response(rows, fmt: str, basename: str):
+    if fmt == "csv":
+        body, mimetype = stream_csv(rows), "text/csv; charset=utf-8"
+    else:
+        body, mimetype = stream_xlsx(rows), "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+    resp = Response(stream_with_context(body), mimetype=mimetype)
+    resp.headers["Content-Disposition"] = f'attachment; filename="{secure_filename(basename)}.{fmt}"'
+    return resp
+
+@main_bp.route('/classes/<int:cid>/gradebook.<any(csv, xlsx):fmt>')
+@login_required
+def class_gradebook(cid, fmt):
+    if current_user.role != Role.TEACHER:
+        abort(403)
+    klass = Class.query.get_or_404(cid)
+    if klass.teacher_id != current_user.id:
+        abort(403)
+    return _gradebook_response(iter_gradebook_rows(class_id=cid, teacher_id=current_user.id), fmt, f"gradebook_{klass.name}")
+
+@main_bp.route('/assignments/<int:aid>/gradebook.<any(csv, xlsx):fmt>')
+@login_required
+def assignment_gradebook(aid, fmt):
+    if current_user.role != Role.TEACHER:
+        abort(403)
+    a = Assignment.query.get_or_404(aid)
+    if a.owner_id != current_user.id:
+        abort(403)
+    return _gradebook_response(iter_gradebook_rows(assignment_id=aid, teacher_id=current_user.id), fmt, f"gradebook_assignment_{aid}")
+
+@main_bp.route('/classes/<int:cid>/roster', methods=['GET','POST'])
+@login_required
+def class_roster_import(cid):
+    if current_user.role != Role.TEACHER:
+        abort(403)
+    klass = Class.query.get_or_404(cid)
+    if klass.teacher_id != current_user.id:
+        abort(403)
+    result = None
+    if request.method == 'POST':
+        f = request.files.get('file')
+        text = f.read().decode('utf-8', errors='replace') if f and f.filename else request.form.get('csv_text', '')
+        result = import_roster(klass.id, text)
+        if not result["errors"]:
+            flash(f'{len(result["created"])} student(s) added to {klass.name}; '
+                  f'{len(result["duplicates"])} duplicate(s) skipped.', 'success')
+    return render_template('roster_import.html', klass=klass, result=result)
+
 # Teacher manage students
 @main_bp.route('/teacher/students', methods=['GET','POST'])
 @login_required
@@ -570,6 +769,48 @@ def student_credentials_pdf(uid):
     filename = f"credentials_{u.username or u.id}.pdf"
     return send_file(buf, mimetype="application/pdf", as_attachment=True, download_name=filename)
 
+@main_bp.route('/classes/<int:cid>/credentials', methods=['POST'])
+@login_required
+def class_credentials(cid):
+    if current_user.role != Role.TEACHER:
+        abort(403)
+    klass = Class.query.get_or_404(cid)
+    if klass.teacher_id != current_user.id:
+        abort(403)
+    job = start_credentials_job(klass, current_user.id)
+    return redirect(url_for('main.credentials_job', jid=job.id))
+
+def _own_credentials_job(jid):
+    if current_user.role != Role.TEACHER:
+        abort(403)
+    job = CredentialsJob.query.options(defer(CredentialsJob.pdf)).filter_by(id=jid).first_or_404()
+    if job.klass.teacher_id != current_user.id:
+        abort(403)
+    return job
+
+@main_bp.route('/credentials/<int:jid>')
+@login_required
+def credentials_job(jid):
+    job = _own_credentials_job(jid)
+    return render_template('credentials_job.html', job=job, status=job_status(job))
+
+@main_bp.route('/credentials/<int:jid>/status')
+@login_required
+def credentials_job_status(jid):
+    job = _own_credentials_job(jid)
+    return jsonify({"id": job.id, "status": job_status(job), "students": job.student_count})
+
+@main_bp.route('/credentials/<int:jid>.pdf')
+@login_required
+def credentials_job_pdf(jid):
+    job = _own_credentials_job(jid)
+    if job.status != CredentialsJob.DONE:
+        abort(404)
+    resp = send_file(BytesIO(job.pdf), mimetype="application/pdf", as_attachment=True,
+                     download_name=f"credentials_{secure_filename(job.klass.name) or job.class_id}.pdf")
+    resp.headers["Cache-Control"] = "no-store"
+    return resp
+
 from types import SimpleNamespace
 from .assignment_store import load_assignment
 
@@ -579,20 +820,4 @@ def student_dashboard():
     if current_user.role != Role.STUDENT:
         abort(403)
 
-    enrollments = current_user.enrollments  # or your existing query
-
-    # Build a lookup of assignment_id -> JSON-backed assignment
-    assignment_map = {}
-    for e in enrollments:
-        for ca in e.klass.class_assignments:
-            aid = ca.assignment_id
-            if aid not in assignment_map:
-                data = load_assignment(aid)
-                if data:
-                    assignment_map[aid] = SimpleNamespace(**data)
-
-    return render_template(
-        "student_dashboard.html",
-        enrollments=enrollments,
-        assignment_map=assignment_map
-    )
\ No newline at end of file
+    return render_template("student_dashboard.html", **student_dashboard_context(current_user.id))
@@ -0,0 +1,291 @@
+import os, queue, selectors, shutil, signal, subprocess, sys, tempfile, threading, time
+from flask import current_app
+
+from .metrics import timed
+from .sandbox_worker import OutputBudget, read_frame, write_frame
+
+WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sandbox_worker.py")
+
+# Extra time the web process waits for a worker beyond the job's own timeout
+# before deciding the worker itself is stuck.
+WORKER_GRACE = 2.0
+
+# Streams yield {"event": "ping"} after this long without output, so the
+# response gets written to and a closed connection is noticed.
+HEARTBEAT = 1.0
+
+# Run events, as yielded by stream_student_code():
+#   {"event": "output", "stream": "stdout" | "stderr", "data": str}
+#   {"event": "ping"}
+#   {"event": "exit", "returncode", "timed_out", "truncated", "cancelled"}
+# Closing the generator before "exit" kills the run.
+
+
+def _failed_exit() -> dict:
+    return {"event": "exit", "returncode": None, "timed_out": True, "truncated": False, "cancelled": False}
+
+
+def collect(events) -> dict:
+    """Fold a run's events into the {"stdout", "stderr", "timed_out", ...} result."""
+    out = {"stdout": [], "stderr": []}
+    result = _failed_exit()
+    for ev in events:
+        if ev["event"] == "output":
+            out[ev["stream"]].append(ev["data"])
+        elif ev["event"] == "exit":
+            result = ev
+    result = {k: v for k, v in result.items() if k != "event"}
+    return {"stdout": "".join(out["stdout"]), "stderr": "".join(out["stderr"]), **result}
+
+
+def stream_subprocess(code: str, timeout: float, max_bytes: int = 0):
+    """The one-off path: fresh temp dir and interpreter per run."""
+    workdir = tempfile.mkdtemp(prefix='run_')
+    proc = None
+    try:
+        path = os.path.join(workdir, 'student.py')
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(code)
+        proc = subprocess.Popen([sys.executable, "-u", path], cwd=workdir, stdin=subprocess.DEVNULL,
+                                stdout=subprocess.PIPE, stderr=subprocess.PIPE, start_new_session=True)
+        names = {proc.stdout.fileno(): "stdout", proc.stderr.fileno(): "stderr"}
+        budget = OutputBudget(max_bytes)
+        deadline = time.monotonic() + timeout
+        timed_out = False
+        with selectors.DefaultSelector() as sel:
+            for fd in names:
+                sel.register(fd, selectors.EVENT_READ)
+            while sel.get_map() and not budget.truncated:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    timed_out = True
+                    break
+                ready = sel.select(min(remaining, HEARTBEAT))
+                if not ready:
+                    yield {"event": "ping"}
+                for key, _ in ready:
+                    data = os.read(key.fd, 65536)
+                    if not data:
+                        sel.unregister(key.fd)
+                        continue
+                    text = budget.take(names[key.fd], data)
+                    if text:
+                        yield {"event": "output", "stream": names[key.fd], "data": text}
+                    if budget.truncated:
+                        break
+        for stream in names.values():
+            tail = budget.flush(stream)
+            if tail:
+                yield {"event": "output", "stream": stream, "data": tail}
+        if not (timed_out or budget.truncated):
+            try:  # both pipes closed, but the code may still be running
+                proc.wait(timeout=max(0, deadline - time.monotonic()))
+            except subprocess.TimeoutExpired:
+                timed_out = True
+        if timed_out or budget.truncated:
+            _kill_group(proc)
+        proc.wait()
+        yield {"event": "exit", "returncode": None if timed_out else proc.returncode,
+               "timed_out": timed_out, "truncated": budget.truncated, "cancelled": False}
+    finally:
+        if proc is not None:
+            if proc.poll() is None:  # closed early: the client cancelled
+                _kill_group(proc)
+                proc.wait()
+            proc.stdout.close()
+            proc.stderr.close()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def _kill_group(proc) -> None:
+    try:
+        os.killpg(proc.pid, signal.SIGKILL)
+    except OSError:
+        pass
+
+
+def run_subprocess(code: str, timeout: float, max_bytes: int = 0) -> dict:
+    return collect(stream_subprocess(code, timeout, max_bytes))
+
+
+class SandboxWorker:
+    def __init__(self):
+        self.proc = subprocess.Popen(
+            [sys.executable, WORKER_SCRIPT],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+        )
+        # Read frames off the raw pipe: a buffered reader could hold the next
+        # frame where select() can't see it.
+        self.out = self.proc.stdout.raw
+        self.jobs = 0
+        self.streaming = False
+
+    def alive(self) -> bool:
+        return self.proc.poll() is None
+
+    def run(self, code: str, timeout: float, max_bytes: int = 0) -> dict:
+        self.jobs += 1
+        write_frame(self.proc.stdin, {"code": code, "timeout": timeout, "max_bytes": max_bytes})
+        # Only block on the pipe once we know a full reply is there (or give up).
+        fd = self.out.fileno()
+        with selectors.DefaultSelector() as sel:
+            sel.register(fd, selectors.EVENT_READ)
+            if not sel.select(timeout + WORKER_GRACE):
+                raise TimeoutError("sandbox worker did not answer")
+        result = read_frame(self.out)
+        if result is None:
+            raise EOFError("sandbox worker exited")
+        return result
+
+    def stream(self, code: str, timeout: float, max_bytes: int = 0):
+        """Yield the run's events; if closed early, call cancel() before reusing the worker."""
+        self.jobs += 1
+        self.streaming = True
+        write_frame(self.proc.stdin, {"code": code, "timeout": timeout, "max_bytes": max_bytes, "stream": True})
+        deadline = time.monotonic() + timeout + WORKER_GRACE
+        with selectors.DefaultSelector() as sel:
+            sel.register(self.out.fileno(), selectors.EVENT_READ)
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError("sandbox worker did not answer")
+                if not sel.select(min(remaining, HEARTBEAT)):
+                    yield {"event": "ping"}
+                    continue
+                frame = read_frame(self.out)
+                if frame is None:
+                    raise EOFError("sandbox worker exited")
+                if frame["event"] == "exit":
+                    self.streaming = False
+                yield frame
+                if not self.streaming:
+                    return
+
+    def cancel(self) -> bool:
+        """Stop an unfinished stream and drain it. False if the worker should be replaced."""
+        try:
+            write_frame(self.proc.stdin, {"cancel": True})
+            deadline = time.monotonic() + WORKER_GRACE
+            with selectors.DefaultSelector() as sel:
+                sel.register(self.out.fileno(), selectors.EVENT_READ)
+                while self.streaming:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0 or not sel.select(remaining):
+                        return False
+                    frame = read_frame(self.out)
+                    if frame is None:
+                        return False
+                    if frame["event"] == "exit":
+                        self.streaming = False
+        except (OSError, ValueError):
+            return False
+        return True
+
+    def close(self):
+        if self.alive():
+            # SIGTERM first: the worker kills its running job's process group
+            # (its own session, which SIGKILLing the worker would orphan).
+            self.proc.terminate()
+            try:
+                self.proc.wait(timeout=1)
+            except subprocess.TimeoutExpired:
+                self.proc.kill()
+        try:
+            self.proc.wait(timeout=1)
+        except subprocess.TimeoutExpired:
+            pass
+        for s in (self.proc.stdin, self.proc.stdout):
+            try:
+                s.close()
+            except OSError:
+                pass
+
+
+class SandboxPool:
+    """
+    Pre-started interpreters that run student code sent over a pipe.
+    Each worker is replaced after max_jobs runs, or straight away if it dies.
+    """
+
+    def __init__(self, size: int, max_jobs: int):
+        self.size = size
+        self.max_jobs = max_jobs
+        self._idle = queue.LifoQueue()
+        for _ in range(size):
+            self._idle.put(SandboxWorker())
+
+    def run(self, code: str, timeout: float, max_bytes: int = 0) -> dict:
+        w = self._idle.get()
+        try:
+            result = w.run(code, timeout, max_bytes)
+        except (OSError, ValueError, TimeoutError, EOFError):
+            w.close()
+            self._idle.put(SandboxWorker())
+            return collect([])
+        self._release(w)
+        return result
+
+    def stream(self, code: str, timeout: float, max_bytes: int = 0):
+        w = self._idle.get()
+        healthy = False
+        try:
+            yield from w.stream(code, timeout, max_bytes)
+            healthy = True
+        except (OSError, ValueError, TimeoutError, EOFError):
+            w.streaming = False
+            yield _failed_exit()
+        finally:
+            if not healthy and w.streaming:
+                healthy = w.cancel()
+            if healthy:
+                self._release(w)
+            else:
+                w.close()
+                self._idle.put(SandboxWorker())
+
+    def _release(self, w: SandboxWorker) -> None:
+        if w.jobs >= self.max_jobs or not w.alive():
+            w.close()
+            w = SandboxWorker()
+        self._idle.put(w)
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> SandboxPool | None:
+    """One pool per process (gunicorn forks workers after import)."""
+    global _pool, _pool_pid
+    size = int(current_app.config.get("RUN_POOL_SIZE", 0))
+    if size <= 0:
+        return None
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            _pool = SandboxPool(size, int(current_app.config.get("RUN_POOL_MAX_JOBS", 100)))
+            _pool_pid = os.getpid()
+    return _pool
+
+
+@timed("run_code")
+def run_student_code(code: str, timeout: float, max_bytes: int = 0) -> dict:
+    pool = get_pool()
+    if pool is None:
+        return run_subprocess(code, timeout, max_bytes)
+    return pool.run(code, timeout, max_bytes)
+
+
+def stream_student_code(code: str, timeout: float, max_bytes: int = 0):
+    """Generator of run events (see above); close it to cancel the run."""
+    pool = get_pool()
+    if pool is None:
+        return stream_subprocess(code, timeout, max_bytes)
+    return pool.stream(code, timeout, max_bytes)
@@ -0,0 +1,275 @@
+"""
+Long-lived sandbox worker used by app.sandbox.SandboxPool.
+
+Started as a plain script (never imported by the web app). It reads framed
+JSON jobs from stdin, forks a fresh child per job so no state leaks between
+students, and writes a framed JSON result back to stdout.
+
+A job with "stream": true is answered with {"event": "output", "stream",
+"data"} frames as the child writes, then {"event": "exit", ...}; while it
+runs, a {"cancel": true} frame on stdin kills the child. "max_bytes" caps
+the output taken from the child; past it the child is killed and the
+result is marked truncated.
+
+Frame: 4-byte big-endian length followed by UTF-8 JSON.
+"""
+import codecs, json, os, selectors, shutil, signal, struct, sys, tempfile, time, traceback
+
+HEADER = struct.Struct(">I")
+
+# How often run_job checks whether a child that closed its pipes has exited.
+REAP_POLL = 0.05
+
+# The running job's pid (and process group), for the SIGTERM handler.
+_job_pid = None
+
+
+def _read_exact(stream, n):
+    # Raw (unbuffered) streams may return short reads.
+    buf = b""
+    while len(buf) < n:
+        chunk = stream.read(n - len(buf))
+        if not chunk:
+            break
+        buf += chunk
+    return buf
+
+
+def read_frame(stream):
+    head = _read_exact(stream, HEADER.size)
+    if len(head) < HEADER.size:
+        return None
+    (n,) = HEADER.unpack(head)
+    body = _read_exact(stream, n)
+    if len(body) < n:
+        return None
+    return json.loads(body.decode("utf-8"))
+
+
+def write_frame(stream, obj):
+    body = json.dumps(obj).encode("utf-8")
+    stream.write(HEADER.pack(len(body)) + body)
+    stream.flush()
+
+
+class OutputBudget:
+    """Caps the combined bytes taken from a child's pipes (0 = no cap) and decodes them incrementally."""
+
+    def __init__(self, max_bytes: int = 0):
+        self.max_bytes = max_bytes
+        self.used = 0
+        self.truncated = False
+        self._decoders = {}
+
+    def take(self, stream: str, data: bytes) -> str:
+        if self.max_bytes:
+            room = max(0, self.max_bytes - self.used)
+            if len(data) > room:
+                data = data[:room]
+                self.truncated = True
+            self.used += len(data)
+        return self._decoder(stream).decode(data)
+
+    def flush(self, stream: str) -> str:
+        return self._decoder(stream).decode(b"", final=True)
+
+    def _decoder(self, stream):
+        if stream not in self._decoders:
+            self._decoders[stream] = codecs.getincrementaldecoder("utf-8")("replace")
+        return self._decoders[stream]
+
+
+def clear_dir(d):
+    for name in os.listdir(d):
+        p = os.path.join(d, name)
+        if os.path.isdir(p) and not os.path.islink(p):
+            shutil.rmtree(p, ignore_errors=True)
+        else:
+            try:
+                os.remove(p)
+            except OSError:
+                pass
+
+
+def child_main(path, code, out_w, err_w):
+    # Runs in the forked child: behave like `python student.py` in a scratch dir.
+    os.setsid()
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    devnull = os.open(os.devnull, os.O_RDONLY)
+    os.dup2(devnull, 0)
+    os.dup2(out_w, 1)
+    os.dup2(err_w, 2)
+    sys.stdin = open(0, "r", encoding="utf-8", closefd=False)
+    # Line-buffered, like a terminal, so streamed runs show each print as it happens.
+    sys.stdout = open(1, "w", buffering=1, encoding="utf-8", errors="backslashreplace", closefd=False)
+    sys.stderr = open(2, "w", buffering=1, encoding="utf-8", errors="backslashreplace", closefd=False)
+    workdir = os.path.dirname(path)
+    os.chdir(workdir)
+    sys.path[0] = workdir
+    sys.argv = [path]
+
+    status = 0
+    try:
+        ns = {"__name__": "__main__", "__file__": path, "__builtins__": __builtins__}
+        exec(compile(code, path, "exec"), ns, ns)
+    except SystemExit as e:
+        if e.code is None:
+            status = 0
+        elif isinstance(e.code, int):
+            status = e.code
+        else:
+            print(e.code, file=sys.stderr)
+            status = 1
+    except BaseException as e:
+        # Hide this worker's own frame so the traceback looks like a normal run.
+        traceback.print_exception(type(e), e, e.__traceback__.tb_next)
+        status = 1
+    try:
+        sys.stdout.flush()
+        sys.stderr.flush()
+    finally:
+        os._exit(status & 0xFF)
+
+
+def run_job(workdir, job, emit=None, control=None):
+    """
+    Run one job. With emit, output goes to emit(stream, text) as it arrives
+    instead of into the result; control is read for a cancel frame.
+    """
+    code = job.get("code", "")
+    timeout = float(job.get("timeout", 5))
+    budget = OutputBudget(int(job.get("max_bytes") or 0))
+    path = os.path.join(workdir, "student.py")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(code)
+
+    global _job_pid
+    out_r, out_w = os.pipe()
+    err_r, err_w = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(out_r)
+        os.close(err_r)
+        child_main(path, code, out_w, err_w)
+    _job_pid = pid
+    os.close(out_w)
+    os.close(err_w)
+
+    names = {out_r: "stdout", err_r: "stderr"}
+    chunks = {"stdout": [], "stderr": []}
+    sel = selectors.DefaultSelector()
+    sel.register(out_r, selectors.EVENT_READ)
+    sel.register(err_r, selectors.EVENT_READ)
+    if control is not None:
+        sel.register(control.fileno(), selectors.EVENT_READ)
+    deadline = time.monotonic() + timeout
+    timed_out = cancelled = False
+    open_fds = 2
+    while open_fds and not (cancelled or budget.truncated):
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            timed_out = True
+            break
+        for key, _ in sel.select(remaining):
+            if control is not None and key.fd == control.fileno():
+                read_frame(control)  # the cancel frame (None if the web process went away)
+                cancelled = True
+                break
+            data = os.read(key.fd, 65536)
+            if not data:
+                sel.unregister(key.fd)
+                open_fds -= 1
+                continue
+            text = budget.take(names[key.fd], data)
+            if emit is None:
+                chunks[names[key.fd]].append(text)
+            elif text:
+                emit(names[key.fd], text)
+            if budget.truncated:
+                break
+    status = None
+    if not (timed_out or cancelled or budget.truncated):
+        # Both pipes are closed, but the child can still be running: reap it
+        # by the deadline or kill it.
+        while True:
+            reaped, wstatus = os.waitpid(pid, os.WNOHANG)
+            if reaped:
+                status = wstatus
+                break
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                timed_out = True
+                break
+            if control is not None:
+                if sel.select(min(remaining, REAP_POLL)):
+                    read_frame(control)
+                    cancelled = True
+                    break
+            else:
+                time.sleep(min(remaining, REAP_POLL))
+    sel.close()
+    for stream in chunks:
+        tail = budget.flush(stream)
+        if emit is None:
+            chunks[stream].append(tail)
+        elif tail:
+            emit(stream, tail)
+
+    if timed_out or cancelled or budget.truncated:
+        try:
+            os.killpg(pid, signal.SIGKILL)
+        except OSError:
+            pass
+    if status is None:
+        _, status = os.waitpid(pid, 0)
+    _job_pid = None
+    os.close(out_r)
+    os.close(err_r)
+    clear_dir(workdir)
+
+    return {
+        "stdout": "".join(chunks["stdout"]),
+        "stderr": "".join(chunks["stderr"]),
+        "timed_out": timed_out,
+        "truncated": budget.truncated,
+        "cancelled": cancelled,
+        "returncode": os.waitstatus_to_exitcode(status),
+    }
+
+
+def _terminate(signum, frame):
+    # The job runs in its own session, so it would outlive this worker.
+    if _job_pid is not None:
+        try:
+            os.killpg(_job_pid, signal.SIGKILL)
+        except OSError:
+            pass
+    os._exit(1)
+
+
+def main():
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, _terminate)
+    stdin = sys.stdin.buffer
+    stdout = sys.stdout.buffer
+    workdir = tempfile.mkdtemp(prefix="run_")
+    try:
+        while True:
+            job = read_frame(stdin)
+            if job is None:
+                break
+            if job.get("cancel"):
+                continue  # arrived after its run had already finished
+            if job.get("stream"):
+                emit = lambda stream, text: write_frame(stdout, {"event": "output", "stream": stream, "data": text})
+                result = run_job(workdir, job, emit=emit, control=stdin)
+                del result["stdout"], result["stderr"]
+                write_frame(stdout, {"event": "exit", **result})
+            else:
+                write_frame(stdout, run_job(workdir, job))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,7 +3,7 @@ import json
 from pathlib import Path
 
 from .models import db, User, Role, Assignment
-from .assignment_store import save_assignment, assignments_dir
+from .assignment_store import save_assignment, get_store
 
 
 def seed_admin():
@@ -56,8 +56,7 @@ def seed_assignments_from_json():
         # Nothing to seed; silently return (keeps setup smooth)
         return
 
-    # Ensure destination folder exists
-    out_dir = assignments_dir()
+    store = get_store()
 
     for fp in sorted(seed_dir.glob("*.json")):
         try:
@@ -104,9 +103,10 @@ def seed_assignments_from_json():
                 db.session.commit()
                 print(f"[seed] DB updated owner_id for Assignment id={aid} -> {owner_id}")
 
-        # 2) Save JSON into app store (source of truth for details)
+        # 2) Save details into the assignment store (source of truth for details)
         save_assignment(aid, data)
-        print(f"[seed] JSON saved -> {out_dir}/assignment_{aid}.json")
+        db.session.commit()
+        print(f"[seed] details saved -> {store.location(aid)}")
 
 
 def seed_all():
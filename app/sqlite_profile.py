@@ -0,0 +1,44 @@
+"""
+Per-connection PRAGMAs for running on SQLite with several gunicorn workers.
+
+WAL lets readers keep going while one writer commits, busy_timeout makes a
+blocked writer wait instead of failing with "database is locked", and
+synchronous=NORMAL is durable across application crashes in WAL mode
+(only an OS crash can lose the last transactions).
+"""
+from sqlalchemy import event
+
+
+def sqlite_pragmas(config) -> list[str]:
+    pragmas = []
+    if config.get("SQLITE_WAL", True):
+        pragmas.append("PRAGMA journal_mode=WAL")
+    pragmas.append(f"PRAGMA busy_timeout={int(config.get('SQLITE_BUSY_TIMEOUT_MS', 5000))}")
+    sync = str(config.get("SQLITE_SYNCHRONOUS", "NORMAL")).upper()
+    if sync in ("OFF", "NORMAL", "FULL", "EXTRA"):
+        pragmas.append(f"PRAGMA synchronous={sync}")
+    # Negative cache_size is in KiB rather than pages.
+    pragmas.append(f"PRAGMA cache_size=-{int(config.get('SQLITE_CACHE_SIZE_KB', 20000))}")
+    pragmas.append(f"PRAGMA mmap_size={int(config.get('SQLITE_MMAP_SIZE_MB', 128)) * 1024 * 1024}")
+    return pragmas
+
+
+def apply_sqlite_profile(app, db) -> None:
+    """Register a connect hook on the app's engine when it is SQLite."""
+    if not app.config.get("SQLITE_PROFILE", True):
+        return
+    if not str(app.config.get("SQLALCHEMY_DATABASE_URI", "")).startswith("sqlite"):
+        return
+    pragmas = sqlite_pragmas(app.config)
+
+    with app.app_context():
+        engine = db.engine
+
+    @event.listens_for(engine, "connect")
+    def _set_pragmas(dbapi_conn, connection_record):
+        cur = dbapi_conn.cursor()
+        try:
+            for p in pragmas:
+                cur.execute(p)
+        finally:
+            cur.close()
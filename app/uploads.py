@@ -0,0 +1,122 @@
+"""
+Content-addressed image uploads.
+
+An upload is stored once under the sha256 of its bytes, as
+<UPLOAD_FOLDER>/<h[:2]>/<h>.<ext>, so pasting the same screenshot twice
+costs nothing. When Pillow is installed, images larger than
+UPLOAD_MAX_DIMENSION (or that shrink as WebP) also get a resized WebP
+rendition, <h>-w<dim>q<quality>.webp, which is what descriptions embed;
+the original stays available at its own URL or with ?original=1.
+
+Names never change content, so they are served with a strong ETag and an
+immutable Cache-Control.
+"""
+import hashlib, io, os, re, tempfile
+
+from flask import current_app
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # optional: without Pillow uploads are stored as-is
+    Image = None
+
+CACHE_SECONDS = 365 * 24 * 3600
+HASHED_NAME = re.compile(r"^([0-9a-f]{2})/(\1[0-9a-f]{62})(-w\d+q\d+)?\.(png|jpg|gif|webp)$")
+
+
+def sniff_image_type(head: bytes) -> str | None:
+    """Extension for the image format in head, going by magic bytes rather than the filename."""
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "png"
+    if head.startswith(b"\xff\xd8\xff"):
+        return "jpg"
+    if head[:6] in (b"GIF87a", b"GIF89a"):
+        return "gif"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "webp"
+    return None
+
+
+def _path(folder: str, name: str) -> str:
+    return os.path.join(folder, *name.split("/"))
+
+
+def _write_once(folder: str, name: str, data: bytes) -> None:
+    """Write data under name unless an identical file is already there (temp file + rename)."""
+    path = _path(folder, name)
+    if os.path.exists(path):
+        return
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".upload-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def _webp_rendition(data: bytes, max_dim: int, quality: int) -> bytes | None:
+    """Downsized WebP of data, or None when it would not help (or cannot be made)."""
+    if Image is None:
+        return None
+    try:
+        with Image.open(io.BytesIO(data)) as im:
+            if getattr(im, "is_animated", False):
+                return None
+            im = ImageOps.exif_transpose(im)
+            oversized = max(im.size) > max_dim
+            if oversized:
+                im.thumbnail((max_dim, max_dim), Image.LANCZOS)
+            if im.mode not in ("RGB", "RGBA"):
+                im = im.convert("RGBA" if "A" in im.getbands() or "transparency" in im.info else "RGB")
+            out = io.BytesIO()
+            im.save(out, "WEBP", quality=quality, method=4)
+    except Exception:
+        return None
+    webp = out.getvalue()
+    return webp if oversized or len(webp) < len(data) else None
+
+
+def store_image(data: bytes) -> dict | None:
+    """
+    Store an uploaded image. Returns {"name", "original"} (relative names
+    under UPLOAD_FOLDER; "name" is the rendition to embed), or None if data
+    is not an allowed image.
+    """
+    ext = sniff_image_type(data[:16])
+    if ext is None or ext not in {("jpg" if e == "jpeg" else e) for e in current_app.config["ALLOWED_IMAGE_EXTENSIONS"]}:
+        return None
+    folder = current_app.config["UPLOAD_FOLDER"]
+    digest = hashlib.sha256(data).hexdigest()
+    original = f"{digest[:2]}/{digest}.{ext}"
+    _write_once(folder, original, data)
+
+    max_dim = current_app.config["UPLOAD_MAX_DIMENSION"]
+    quality = current_app.config["UPLOAD_WEBP_QUALITY"]
+    rendition = f"{digest[:2]}/{digest}-w{max_dim}q{quality}.webp"
+    if not os.path.exists(_path(folder, rendition)):
+        webp = _webp_rendition(data, max_dim, quality) if max_dim else None
+        if webp is None:
+            return {"name": original, "original": original}
+        _write_once(folder, rendition, webp)
+    return {"name": rendition, "original": original}
+
+
+def original_name(name: str) -> str | None:
+    """The stored original behind a hashed name (itself, for an original)."""
+    m = HASHED_NAME.match(name)
+    if not m:
+        return None
+    if not m.group(3):
+        return name
+    folder = current_app.config["UPLOAD_FOLDER"]
+    for ext in ("png", "jpg", "gif", "webp"):
+        candidate = f"{m.group(1)}/{m.group(2)}.{ext}"
+        if os.path.exists(_path(folder, candidate)):
+            return candidate
+    return None
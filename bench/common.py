@@ -0,0 +1,24 @@
+import os, sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+
+def percentile(values, p):
+    s = sorted(values)
+    if not s:
+        return None
+    return s[max(0, min(len(s) - 1, round(p / 100 * (len(s) - 1))))]
+
+
+def summarize(latencies_ms: list, wall_s: float) -> dict:
+    n = len(latencies_ms)
+    return {
+        "n": n,
+        "p50_ms": round(percentile(latencies_ms, 50), 2) if n else None,
+        "p90_ms": round(percentile(latencies_ms, 90), 2) if n else None,
+        "p99_ms": round(percentile(latencies_ms, 99), 2) if n else None,
+        "mean_ms": round(sum(latencies_ms) / n, 2) if n else None,
+        "per_s": round(n / wall_s, 1) if wall_s else None,
+    }
@@ -0,0 +1,92 @@
+"""
+Per-call grading vs batched grading against one compiled mark scheme.
+
+  per_call        grade_submission_detailed once per submission (one
+                  grading process each), over --jobs threads
+  batch           grade_batch over --jobs threads, each call grading a
+                  chunk of submissions in one grading process
+  compile         compile_scheme on the JSON every call (cache hit) vs a
+                  fresh json.loads + validation
+
+Usage:
+  python bench/grading_batch.py [--submissions 200] [--cases 10] [--jobs 4] [--chunk 25]
+"""
+import argparse, json, os, time
+from concurrent.futures import ThreadPoolExecutor
+
+from common import summarize
+
+from app.grading import grade_batch, grade_submission_detailed, grading_limits
+from app.mark_scheme import compile_scheme, _compile
+
+
+def make_codes(n):
+    variants = [
+        "def solve(x):\n    return x\n",
+        "def solve(x):\n    return x + 1\n",
+        "def solve(x):\n    t = 0\n    for i in range(2000):\n        t += i\n    return x\n",
+        "def solve(x)\n    return x\n",
+    ]
+    # a comment makes every submission distinct, as real ones are
+    return [f"{variants[i % len(variants)]}# {i}\n" for i in range(n)]
+
+
+def run(fn, items, jobs):
+    lat = []
+
+    def one(item):
+        t0 = time.perf_counter()
+        fn(item)
+        lat.append((time.perf_counter() - t0) * 1000)
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=jobs) as ex:
+        list(ex.map(one, items))
+    wall = time.perf_counter() - t0
+    out = summarize(lat, wall)
+    out["wall_s"] = round(wall, 2)
+    return out
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--submissions", type=int, default=200)
+    ap.add_argument("--cases", type=int, default=10)
+    ap.add_argument("--jobs", type=int, default=os.cpu_count() or 1)
+    ap.add_argument("--chunk", type=int, default=25)
+    args = ap.parse_args()
+
+    scheme_json = json.dumps({"cases": [{"function": "solve", "args": [i], "expected": i, "marks": 1}
+                                        for i in range(args.cases)]})
+    scheme = compile_scheme(scheme_json)
+    limits = grading_limits()
+    codes = make_codes(args.submissions)
+    chunks = [codes[i:i + args.chunk] for i in range(0, len(codes), args.chunk)]
+
+    per_call = run(lambda c: grade_submission_detailed(c, scheme, limits), codes, args.jobs)
+    batch = run(lambda chunk: grade_batch(chunk, scheme, limits), chunks, args.jobs)
+    per_call["submissions_per_s"] = round(len(codes) / per_call["wall_s"], 1)
+    batch["submissions_per_s"] = round(len(codes) / batch["wall_s"], 1)
+    batch["chunk"] = args.chunk
+
+    n = 20000
+    t0 = time.perf_counter()
+    for _ in range(n):
+        compile_scheme(scheme_json)
+    cached_us = (time.perf_counter() - t0) / n * 1e6
+    t0 = time.perf_counter()
+    for _ in range(n):
+        _compile(json.loads(scheme_json))
+    fresh_us = (time.perf_counter() - t0) / n * 1e6
+
+    print(json.dumps({
+        "args": vars(args),
+        "per_call": per_call,
+        "batch": batch,
+        "speedup": round(per_call["wall_s"] / batch["wall_s"], 2) if batch["wall_s"] else None,
+        "compile": {"cached_us": round(cached_us, 2), "uncached_us": round(fresh_us, 2)},
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
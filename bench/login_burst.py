@@ -0,0 +1,122 @@
+"""
+A class logging in at once: every student posts /login at the same moment
+and then opens a few pages. It runs twice against a throwaway database:
+
+  current  password checked in the request thread, load_user queries every request
+  new      bounded password-check pool and the load_user identity cache
+
+It reports login and page latency, how many logins were turned away with
+a 503 (admission control) and how many SQL statements the pages cost.
+
+Usage:
+  python bench/login_burst.py [--students 40] [--pages 5] [--workers 0] [--queue 32]
+"""
+import argparse, json, os, shutil, tempfile, threading, time
+from concurrent.futures import ThreadPoolExecutor
+
+from common import summarize
+
+PASSWORD = "burst-pass"
+
+
+def seed(db, students: int) -> list[str]:
+    from werkzeug.security import generate_password_hash
+    from app.models import User, Role, Class, Enrollment
+    pw_hash = generate_password_hash(PASSWORD)  # the real default method: that is the cost under test
+    teacher = User(email="t@burst", name="Teacher", username="t", role=Role.TEACHER, password_hash=pw_hash)
+    db.session.add(teacher)
+    db.session.flush()
+    klass = Class(name="Burst", code="burst", teacher_id=teacher.id)
+    db.session.add(klass)
+    db.session.flush()
+    names = []
+    for i in range(students):
+        u = User(email=f"s{i}@burst", name=f"Student {i}", username=f"s{i}", role=Role.STUDENT, password_hash=pw_hash)
+        db.session.add(u)
+        db.session.flush()
+        db.session.add(Enrollment(class_id=klass.id, student_id=u.id))
+        names.append(u.username)
+    db.session.commit()
+    return names
+
+
+def burst(app, usernames: list[str], pages: int) -> dict:
+    from app.metrics import REQUEST_SQL
+    login_ms, page_ms, rejected = [], [], 0
+    lock = threading.Lock()
+    start = threading.Barrier(len(usernames))
+    sql_before = sum(s[-2] for k, s in REQUEST_SQL._series.items() if k == ("main.dashboard",))
+
+    def student(username):
+        nonlocal rejected
+        c = app.test_client()
+        start.wait()
+        while True:
+            t0 = time.perf_counter()
+            r = c.post("/login", data={"email": username, "password": PASSWORD})
+            dt = (time.perf_counter() - t0) * 1000
+            with lock:
+                login_ms.append(dt)
+            if r.status_code == 302:
+                break
+            assert r.status_code == 503, r.status_code
+            with lock:
+                rejected += 1
+            time.sleep(0.05)
+        for _ in range(pages):
+            t0 = time.perf_counter()
+            assert c.get("/").status_code == 200
+            with lock:
+                page_ms.append((time.perf_counter() - t0) * 1000)
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=len(usernames)) as ex:
+        list(ex.map(student, usernames))
+    wall = time.perf_counter() - t0
+    sql_after = sum(s[-2] for k, s in REQUEST_SQL._series.items() if k == ("main.dashboard",))
+    return {
+        "wall_s": round(wall, 2),
+        "login": summarize(login_ms, wall),
+        "rejected_503": rejected,
+        "page": summarize(page_ms, wall),
+        "sql_per_page": round((sql_after - sql_before) / len(page_ms), 2) if page_ms else None,
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--students", type=int, default=40)
+    ap.add_argument("--pages", type=int, default=5, help="dashboard loads per student after logging in")
+    ap.add_argument("--workers", type=int, default=0, help="LOGIN_VERIFY_WORKERS (0 = CPU count)")
+    ap.add_argument("--queue", type=int, default=32, help="LOGIN_VERIFY_QUEUE")
+    args = ap.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="codebuddy_login_")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+    os.environ["ASSIGNMENTS_DIR"] = os.path.join(tmp, "assignments")
+    os.environ["WTF_CSRF_ENABLED"] = "false"
+    os.environ["LOGIN_VERIFY_WORKERS"] = str(args.workers)
+    os.environ["LOGIN_VERIFY_QUEUE"] = str(args.queue)
+    from app import create_app, db
+
+    modes = {
+        "current": {"LOGIN_VERIFY_OFFLOAD": False, "USER_CACHE_TTL": 0},
+        "new": {"LOGIN_VERIFY_OFFLOAD": True},
+    }
+    out = {"meta": {"cpus": os.cpu_count(), "args": vars(args)}}
+    try:
+        app = create_app()
+        with app.app_context():
+            db.create_all()
+            usernames = seed(db, args.students)
+        defaults = {k: app.config[k] for k in ("LOGIN_VERIFY_OFFLOAD", "USER_CACHE_TTL")}
+        for mode, overrides in modes.items():
+            app.config.update(defaults, **overrides)
+            out[mode] = burst(app, usernames, args.pages)
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+    print(json.dumps(out, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+EXPLAIN QUERY PLAN and timings for the hot lookups, before and after the
+index migration (app/migrations.py).
+
+Builds a throwaway SQLite DB with the pre-index schema, seeds it, prints
+plans and timings, runs the migrations and prints them again.
+
+Usage:
+  python bench/query_plans.py [--students 500] [--assignments 40] [--subs-per 5]
+"""
+import argparse, json, os, random, tempfile, time
+from datetime import datetime, timedelta
+
+import common  # noqa: F401  (puts the repo root on sys.path)
+
+INDEXES = [
+    "ix_submission_assignment_student_created",
+    "uq_enrollment_student_class",
+    "ix_class_assignment_assignment_class",
+    "uq_rubric_grade_submission_criterion",
+    "ix_rubric_criterion_assignment_order",
+]
+
+QUERIES = {
+    "latest submission for student": (
+        "SELECT id FROM submission WHERE assignment_id = :a AND student_id = :s "
+        "ORDER BY created_at DESC LIMIT 1"),
+    "submissions for assignment": (
+        "SELECT id FROM submission WHERE assignment_id = :a ORDER BY created_at DESC"),
+    "enrollment check": (
+        "SELECT id FROM enrollment WHERE student_id = :s AND class_id = :c"),
+    "class assignment check": (
+        "SELECT id FROM class_assignment WHERE assignment_id = :a AND class_id = :c"),
+    "rubric grades for submission": (
+        "SELECT criterion_id, awarded FROM rubric_grade WHERE submission_id = :sub"),
+    "rubric criteria for assignment": (
+        "SELECT id FROM rubric_criterion WHERE assignment_id = :a ORDER BY order_index"),
+}
+
+
+def report(conn, params, repeat):
+    from sqlalchemy import text
+    out = {}
+    for name, sql in QUERIES.items():
+        plan = [r[-1] for r in conn.execute(text("EXPLAIN QUERY PLAN " + sql), params)]
+        t0 = time.perf_counter()
+        for _ in range(repeat):
+            conn.execute(text(sql), params).fetchall()
+        out[name] = {"plan": plan, "ms_per_query": round((time.perf_counter() - t0) * 1000 / repeat, 3)}
+    return out
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--students", type=int, default=500)
+    ap.add_argument("--assignments", type=int, default=40)
+    ap.add_argument("--subs-per", type=int, default=5)
+    ap.add_argument("--repeat", type=int, default=200)
+    args = ap.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+    from sqlalchemy import text
+    from app import create_app, db
+    from app.models import User, Role, Class, Enrollment, Assignment, ClassAssignment, Submission, RubricCriterion, RubricGrade
+    from app.migrations import migrate
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        with db.engine.begin() as conn:
+            for name in INDEXES:
+                conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+
+        rnd = random.Random(1)
+        teacher = User(email="t@bench", name="T", username="t", role=Role.TEACHER, password_hash="x")
+        db.session.add(teacher)
+        db.session.flush()
+        classes = [Class(name=f"C{i}", code=f"bench{i}", teacher_id=teacher.id) for i in range(max(1, args.students // 25))]
+        db.session.add_all(classes)
+        db.session.flush()
+        assignments = [Assignment(owner_id=teacher.id) for _ in range(args.assignments)]
+        db.session.add_all(assignments)
+        db.session.flush()
+        for a in assignments:
+            for c in rnd.sample(classes, min(3, len(classes))):
+                db.session.add(ClassAssignment(class_id=c.id, assignment_id=a.id))
+            for i in range(4):
+                db.session.add(RubricCriterion(assignment_id=a.id, key=f"k{i}", label=f"L{i}", order_index=i))
+        db.session.flush()
+        crits = RubricCriterion.query.all()
+        base = datetime(2026, 1, 1)
+        for n in range(args.students):
+            s = User(email=f"s{n}@bench", name=f"S{n}", username=f"s{n}", role=Role.STUDENT, password_hash="x")
+            db.session.add(s)
+            db.session.flush()
+            db.session.add(Enrollment(student_id=s.id, class_id=rnd.choice(classes).id))
+            for a in rnd.sample(assignments, min(len(assignments), 10)):
+                for k in range(args.subs_per):
+                    db.session.add(Submission(assignment_id=a.id, student_id=s.id, code="x",
+                                              created_at=base + timedelta(minutes=rnd.randint(0, 100000))))
+        db.session.flush()
+        sub_ids = [r[0] for r in db.session.query(Submission.id).limit(2000)]
+        for sid in sub_ids:
+            for c in crits[:4]:
+                db.session.add(RubricGrade(submission_id=sid, criterion_id=c.id, awarded=1.0))
+        db.session.commit()
+
+        params = {"a": assignments[len(assignments) // 2].id, "s": args.students // 2 + 1,
+                  "c": classes[0].id, "sub": sub_ids[len(sub_ids) // 2]}
+        counts = {"submissions": Submission.query.count(), "rubric_grades": RubricGrade.query.count()}
+        with db.engine.connect() as conn:
+            before = report(conn, params, args.repeat)
+        migrate(verbose=False)
+        with db.engine.connect() as conn:
+            conn.execute(text("ANALYZE"))
+            after = report(conn, params, args.repeat)
+
+    print(json.dumps({"rows": counts, "before": before, "after": after}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
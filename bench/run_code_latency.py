@@ -0,0 +1,59 @@
+"""
+p50/p99 latency of /run_code's execution path: one-off Popen vs the sandbox pool.
+
+Usage:
+  python bench/run_code_latency.py [--runs 200] [--clients 8] [--pool-size 4] [--max-jobs 100]
+"""
+import argparse, json, os, statistics, sys, time
+from concurrent.futures import ThreadPoolExecutor
+
+from common import percentile
+
+from app.sandbox import SandboxPool, run_subprocess
+
+SNIPPET = "total = 0\nfor i in range(1000):\n    total += i\nprint(total)\n"
+
+
+def measure(fn, runs, clients):
+    def one(_):
+        t0 = time.perf_counter()
+        result = fn(SNIPPET, 5)
+        assert result["stdout"].strip() == "499500", result
+        return (time.perf_counter() - t0) * 1000
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as ex:
+        lat = list(ex.map(one, range(runs)))
+    wall = time.perf_counter() - t0
+    return {
+        "runs": runs,
+        "clients": clients,
+        "p50_ms": round(percentile(lat, 50), 2),
+        "p99_ms": round(percentile(lat, 99), 2),
+        "mean_ms": round(statistics.mean(lat), 2),
+        "runs_per_s": round(runs / wall, 1),
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--runs", type=int, default=200)
+    ap.add_argument("--clients", type=int, default=8)
+    ap.add_argument("--pool-size", type=int, default=4)
+    ap.add_argument("--max-jobs", type=int, default=100)
+    args = ap.parse_args()
+
+    out = {"popen": measure(run_subprocess, args.runs, args.clients)}
+    pool = SandboxPool(args.pool_size, args.max_jobs)
+    try:
+        pool.run("pass", 5)  # let the interpreters finish starting
+        out["pool"] = measure(pool.run, args.runs, args.clients)
+    finally:
+        pool.close()
+    out["pool"]["size"] = args.pool_size
+    out["pool"]["max_jobs"] = args.max_jobs
+    print(json.dumps(out, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,247 @@
+"""
+End-to-end benchmark suite.
+
+Builds the app with create_app against a throwaway database and assignment
+store, seeds it, then measures:
+  - grading throughput (grade_submission_detailed), serial and threaded
+  - /run_code latency
+  - per-route latency for the dashboards, submissions_list and
+    submission_grade, with a single client and with concurrent clients
+
+Results are printed (or written with --out) as JSON so runs can be diffed.
+
+Usage:
+  python bench/suite.py [--teachers 2] [--classes 3] [--students 30]
+                        [--assignments 5] [--subs 3] [--requests 30]
+                        [--clients 8] [--only grading,run_code,routes]
+                        [--out results.json]
+"""
+import argparse, json, os, platform, random, shutil, tempfile, time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from common import summarize
+
+PASSWORD = "bench-pass"
+
+GOOD = "def solve(x):\n    return x\n"
+SLOW = "def solve(x):\n    t = 0\n    for i in range(20000):\n        t += i\n    return x\n"
+WRONG = "def solve(x):\n    return x + 1\n"
+BROKEN = "def solve(x)\n    return x\n"
+CODES = [GOOD, SLOW, WRONG, BROKEN]
+
+MARK_SCHEME = {"cases": [{"function": "solve", "args": [i], "expected": i, "marks": 1} for i in range(5)]}
+
+
+def configure_env(tmp: str) -> None:
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+    os.environ["ASSIGNMENTS_DIR"] = os.path.join(tmp, "assignments")
+    os.environ["UPLOAD_FOLDER"] = os.path.join(tmp, "uploads")
+    os.environ.setdefault("RUN_POOL_SIZE", "4")
+
+
+def seed(db, args) -> dict:
+    from werkzeug.security import generate_password_hash
+    from app.models import User, Role, Class, Enrollment, Assignment, ClassAssignment, Submission, RubricCriterion
+    from app.assignment_store import save_assignment
+
+    rnd = random.Random(42)
+    # One cheap hash shared by every seeded user keeps seeding fast.
+    pw_hash = generate_password_hash(PASSWORD, method="pbkdf2:sha256:1000")
+    base = datetime(2026, 1, 1)
+    teachers, students, assignments_by_teacher = [], [], {}
+
+    for t in range(args.teachers):
+        teacher = User(email=f"t{t}@bench", name=f"Teacher {t}", username=f"t{t}", role=Role.TEACHER, password_hash=pw_hash)
+        db.session.add(teacher)
+        db.session.flush()
+        teachers.append(teacher)
+
+        assignments = []
+        for _ in range(args.assignments):
+            a = Assignment(owner_id=teacher.id)
+            db.session.add(a)
+            db.session.flush()
+            save_assignment(a.id, {
+                "id": a.id, "owner_id": teacher.id, "title": f"Assignment {a.id}",
+                "description": "Return **x**.\n\n| a | b |\n|---|---|\n| 1 | 2 |\n",
+                "starter_code": "def solve(x):\n    pass\n", "tests_path": None, "mark_scheme": MARK_SCHEME,
+            })
+            for i in range(3):
+                db.session.add(RubricCriterion(assignment_id=a.id, key=f"k{i}", label=f"Criterion {i}", max_marks=2, order_index=i))
+            assignments.append(a)
+        assignments_by_teacher[teacher.id] = assignments
+
+        for c in range(args.classes):
+            klass = Class(name=f"Class {t}-{c}", code=f"b{t}x{c}", teacher_id=teacher.id)
+            db.session.add(klass)
+            db.session.flush()
+            for a in assignments:
+                db.session.add(ClassAssignment(class_id=klass.id, assignment_id=a.id, due_at=base + timedelta(days=30)))
+            for s in range(args.students):
+                n = len(students)
+                student = User(email=f"s{n}@bench", name=f"Student {n}", username=f"s{n}", role=Role.STUDENT, password_hash=pw_hash)
+                db.session.add(student)
+                db.session.flush()
+                students.append(student)
+                db.session.add(Enrollment(class_id=klass.id, student_id=student.id))
+                for a in assignments:
+                    for k in range(args.subs):
+                        db.session.add(Submission(
+                            assignment_id=a.id, student_id=student.id, code=rnd.choice(CODES),
+                            created_at=base + timedelta(minutes=rnd.randint(0, 40000)),
+                        ))
+        db.session.commit()
+
+    from app.models import Submission as S
+    return {
+        "teachers": [t.username for t in teachers],
+        "students": [s.username for s in students],
+        "assignments": {t.username: [a.id for a in assignments_by_teacher[t.id]] for t in teachers},
+        "submission_ids": {a.id: [sid for (sid,) in db.session.query(S.id).filter_by(assignment_id=a.id).limit(200)]
+                           for t in teachers for a in assignments_by_teacher[t.id]},
+        "counts": {"users": User.query.count(), "classes": Class.query.count(),
+                   "assignments": Assignment.query.count(), "submissions": S.query.count()},
+    }
+
+
+def login(app, username):
+    c = app.test_client()
+    r = c.post("/login", data={"email": username, "password": PASSWORD})
+    assert r.status_code == 302, f"login failed for {username}"
+    return c
+
+
+def bench_grading(args) -> dict:
+    from app.grading import grade_submission_detailed
+    ms = json.dumps(MARK_SCHEME)
+    codes = [CODES[i % len(CODES)] for i in range(args.grading_runs)]
+
+    out = {}
+    for label, workers in (("serial", 1), ("threads", args.clients)):
+        lat = []
+
+        def one(code):
+            t0 = time.perf_counter()
+            grade_submission_detailed(code, ms)
+            lat.append((time.perf_counter() - t0) * 1000)
+
+        t0 = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as ex:
+            list(ex.map(one, codes))
+        out[label] = summarize(lat, time.perf_counter() - t0)
+        out[label]["workers"] = workers
+    return out
+
+
+def timed_requests(make_client, urls, clients, method="get", payload=None) -> dict:
+    lat, errors = [], 0
+
+    def run(job):
+        nonlocal errors
+        client, url = job
+        t0 = time.perf_counter()
+        r = client.post(url, json=payload) if method == "post" else client.get(url)
+        lat.append((time.perf_counter() - t0) * 1000)
+        if r.status_code >= 400:
+            errors += 1
+
+    pool = [make_client(i) for i in range(clients)]
+    jobs = [(pool[i % clients], url) for i, url in enumerate(urls)]
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as ex:
+        list(ex.map(run, jobs))
+    out = summarize(lat, time.perf_counter() - t0)
+    out["errors"] = errors
+    out["clients"] = clients
+    return out
+
+
+def bench_run_code(app, data, args) -> dict:
+    student = data["students"][0]
+    payload = {"code": "print(sum(range(1000)))"}
+    out = {}
+    for clients in (1, args.clients):
+        out[f"clients_{clients}"] = timed_requests(lambda i: login(app, student), ["/run_code"] * args.requests,
+                                                   clients, method="post", payload=payload)
+    return out
+
+
+def bench_routes(app, data, args) -> dict:
+    teacher = data["teachers"][0]
+    aids = data["assignments"][teacher]
+    students = data["students"][:max(args.clients, 1)]
+    routes = {
+        "teacher_dashboard": (lambda i: login(app, teacher), lambda k: "/"),
+        "student_dashboard": (lambda i: login(app, students[i % len(students)]), lambda k: "/"),
+        "student_dashboard_page": (lambda i: login(app, students[i % len(students)]), lambda k: "/student/dashboard"),
+        "assignment_detail": (lambda i: login(app, students[i % len(students)]), lambda k: f"/assignments/{aids[k % len(aids)]}"),
+        "submissions_list": (lambda i: login(app, teacher), lambda k: f"/assignments/{aids[k % len(aids)]}/submissions"),
+        "submissions_list_latest": (lambda i: login(app, teacher), lambda k: f"/assignments/{aids[k % len(aids)]}/submissions?view=latest"),
+        "submission_grade": (lambda i: login(app, teacher),
+                             lambda k: (lambda aid: f"/assignments/{aid}/submissions/{data['submission_ids'][aid][k % len(data['submission_ids'][aid])]}")(aids[k % len(aids)])),
+    }
+    out = {}
+    for name, (make_client, url_for_k) in routes.items():
+        urls = [url_for_k(k) for k in range(args.requests)]
+        out[name] = {f"clients_{c}": timed_requests(make_client, urls, c) for c in (1, args.clients)}
+    return out
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--teachers", type=int, default=2)
+    ap.add_argument("--classes", type=int, default=3, help="classes per teacher")
+    ap.add_argument("--students", type=int, default=30, help="students per class")
+    ap.add_argument("--assignments", type=int, default=5, help="assignments per teacher")
+    ap.add_argument("--subs", type=int, default=3, help="submissions per student per assignment")
+    ap.add_argument("--requests", type=int, default=30, help="requests per route measurement")
+    ap.add_argument("--grading-runs", type=int, default=40)
+    ap.add_argument("--clients", type=int, default=8)
+    ap.add_argument("--only", default="grading,run_code,routes")
+    ap.add_argument("--out")
+    args = ap.parse_args()
+    only = set(args.only.split(","))
+
+    tmp = tempfile.mkdtemp(prefix="codebuddy_bench_")
+    configure_env(tmp)
+    from app import create_app, db
+
+    try:
+        app = create_app()
+        with app.app_context():
+            db.create_all()
+            t0 = time.perf_counter()
+            data = seed(db, args)
+            seed_s = time.perf_counter() - t0
+
+        results = {
+            "meta": {
+                "started_at": datetime.utcnow().isoformat(),
+                "python": platform.python_version(),
+                "machine": platform.machine(),
+                "cpus": os.cpu_count(),
+                "args": vars(args),
+                "seeded": data["counts"],
+                "seed_seconds": round(seed_s, 2),
+            }
+        }
+        if "grading" in only:
+            with app.app_context():
+                results["grading"] = bench_grading(args)
+        if "run_code" in only:
+            results["run_code"] = bench_run_code(app, data, args)
+        if "routes" in only:
+            results["routes"] = bench_routes(app, data, args)
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    text = json.dumps(results, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text)
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
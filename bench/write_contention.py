@@ -0,0 +1,105 @@
+"""
+Multi-process write contention on SQLite: N students submitting at once.
+
+Each process builds its own app with create_app (as a gunicorn worker
+would), waits on a shared barrier, then inserts --subs submissions, each in
+its own transaction. Runs once with the SQLite profile off and once with it
+on, and reports throughput, commit latency and "database is locked" errors.
+
+Usage:
+  python bench/write_contention.py [--procs 8] [--subs 50] [--code-kb 4]
+"""
+import argparse, json, multiprocessing as mp, os, statistics, sys, tempfile, time
+
+from common import percentile
+
+
+def worker(env, student_id, aid, n, code, barrier, out):
+    os.environ.update(env)
+    from sqlalchemy.exc import OperationalError
+    from app import create_app, db
+    from app.models import Submission
+
+    app = create_app()
+    lat, errors = [], 0
+    with app.app_context():
+        barrier.wait()
+        for i in range(n):
+            t0 = time.perf_counter()
+            try:
+                db.session.add(Submission(assignment_id=aid, student_id=student_id, code=code,
+                                          score=1.0, max_score=1.0, auto_score=1.0, auto_max=1.0))
+                db.session.commit()
+                lat.append((time.perf_counter() - t0) * 1000)
+            except OperationalError:
+                db.session.rollback()
+                errors += 1
+            # a page view between submits, like the redirect after POST
+            Submission.query.filter_by(assignment_id=aid, student_id=student_id).order_by(Submission.id.desc()).first()
+    out.put({"lat": lat, "errors": errors})
+
+
+def run(profile: bool, args) -> dict:
+    tmp = tempfile.mkdtemp()
+    env = {
+        "DATABASE_URL": f"sqlite:///{os.path.join(tmp, 'bench.db')}",
+        "SQLITE_PROFILE": "true" if profile else "false",
+        "SQLITE_BUSY_TIMEOUT_MS": str(args.busy_ms),
+    }
+    os.environ.update(env)
+    from app import create_app, db
+    from app.models import User, Role, Assignment
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        t = User(email="t@bench", name="T", username="t", role=Role.TEACHER, password_hash="x")
+        db.session.add(t)
+        db.session.flush()
+        a = Assignment(owner_id=t.id)
+        db.session.add(a)
+        students = [User(email=f"s{i}@bench", name=f"S{i}", username=f"s{i}", role=Role.STUDENT, password_hash="x")
+                    for i in range(args.procs)]
+        db.session.add_all(students)
+        db.session.commit()
+        aid, sids = a.id, [s.id for s in students]
+        db.engine.dispose()
+
+    ctx = mp.get_context("spawn")
+    barrier = ctx.Barrier(args.procs + 1)
+    out = ctx.Queue()
+    code = "x = 1\n" * (args.code_kb * 1024 // 6)
+    procs = [ctx.Process(target=worker, args=(env, sid, aid, args.subs, code, barrier, out)) for sid in sids]
+    for p in procs:
+        p.start()
+    barrier.wait()
+    t0 = time.perf_counter()
+    results = [out.get() for _ in procs]
+    wall = time.perf_counter() - t0
+    for p in procs:
+        p.join()
+
+    lat = [x for r in results for x in r["lat"]]
+    return {
+        "profile": profile,
+        "processes": args.procs,
+        "committed": len(lat),
+        "lock_errors": sum(r["errors"] for r in results),
+        "commits_per_s": round(len(lat) / wall, 1),
+        "p50_ms": round(percentile(lat, 50), 2) if lat else None,
+        "p99_ms": round(percentile(lat, 99), 2) if lat else None,
+        "mean_ms": round(statistics.mean(lat), 2) if lat else None,
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--procs", type=int, default=8)
+    ap.add_argument("--subs", type=int, default=50)
+    ap.add_argument("--code-kb", type=int, default=4)
+    ap.add_argument("--busy-ms", type=int, default=5000)
+    args = ap.parse_args()
+    print(json.dumps([run(False, args), run(True, args)], indent=2))
+
+
+if __name__ == "__main__":
+    main()
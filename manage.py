@@ -1,10 +1,130 @@
+import argparse
+
 from app import create_app, db
 from app.models import *
 from app.seed import seed_all
 
 app = create_app()
-if __name__ == "__main__":
+
+
+def cmd_init(args):
+    from app.migrations import migrate
+    db.create_all()
+    migrate()
+    seed_all()
+    print("DB initialized; admin teacher + dummy student seeded.")
+
+
+def cmd_migrate(args):
+    from app.migrations import migrate, pending_migrations
+    if args.list:
+        for version, name, _ in pending_migrations():
+            print(f"{version:03d} {name}")
+        return
+    db.create_all()
+    n = migrate()
+    print(f"{n} migration(s) applied.")
+
+
+def cmd_regrade(args):
+    from app.regrade import regrade_assignment
+    regrade_assignment(args.assignment, class_id=args.class_id, jobs=args.jobs, batch_size=args.batch)
+
+
+def cmd_grading_worker(args):
+    from app.grading_queue import run_worker
+    db.create_all()
+    run_worker(poll_interval=args.poll, once=args.once, batch_size=args.batch)
+
+
+def cmd_import_assignments(args):
+    from app.assignment_store import import_json_directory
+    db.create_all()
+    stats = import_json_directory(args.source, overwrite=args.overwrite)
+    print(f"{stats['imported']} assignment(s) imported, {stats['skipped']} already in the database.")
+    if app.config.get("ASSIGNMENT_STORE") != "sql":
+        print("Set ASSIGNMENT_STORE=sql to serve assignments from the database.")
+
+
+def cmd_import_roster(args):
+    import csv, sys
+    from app.roster import import_roster
+    if not db.session.get(Class, args.class_id):
+        sys.exit(f"No class with id {args.class_id}")
+    with open(args.file, encoding="utf-8-sig") as f:
+        # single-threaded CLI: forking the hashing pool is safe and starts faster
+        result = import_roster(args.class_id, f.read(), workers=args.workers, start_method="fork")
+    if result["errors"]:
+        print("\n".join(result["errors"]), file=sys.stderr)
+        sys.exit("Nothing imported.")
+    for d in result["duplicates"]:
+        print(f"skipped line {d['line']}: {d['username']} ({d['reason']})", file=sys.stderr)
+    out = open(args.out, "w", newline="", encoding="utf-8") if args.out else sys.stdout
+    w = csv.writer(out)
+    w.writerow(["name", "username", "email", "password"])
+    for u in result["created"]:
+        w.writerow([u["name"], u["username"], u["email"], u["password"]])
+    if args.out:
+        out.close()
+    print(f"{len(result['created'])} created, {len(result['duplicates'])} duplicate(s) skipped.", file=sys.stderr)
+
+
+def cmd_rebuild_gradebook(args):
+    from app.gradebook_table import rebuild_gradebook
+    db.create_all()
+    n = rebuild_gradebook(class_id=args.class_id, assignment_id=args.assignment)
+    db.session.commit()
+    print(f"{n} gradebook row(s) written.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="codeBuddy management commands")
+    sub = parser.add_subparsers(dest="command")
+
+    sub.add_parser("init", help="create tables and seed (default)")
+
+    p = sub.add_parser("migrate", help="apply pending schema migrations")
+    p.add_argument("--list", action="store_true", help="only list pending migrations")
+
+    p = sub.add_parser("regrade", help="regrade all submissions for an assignment")
+    p.add_argument("--assignment", type=int, required=True)
+    p.add_argument("--class", dest="class_id", type=int, default=None, help="only students in this class")
+    p.add_argument("--jobs", type=int, default=None, help="submissions graded in parallel (default: CPU count)")
+    p.add_argument("--batch", type=int, default=200, help="rows per write transaction")
+
+    p = sub.add_parser("grading-worker", help="grade queued submissions")
+    p.add_argument("--poll", type=float, default=1.0, help="seconds between polls when idle")
+    p.add_argument("--once", action="store_true", help="exit when the queue is empty")
+    p.add_argument("--batch", type=int, default=20, help="jobs claimed and graded together")
+
+    p = sub.add_parser("import-assignments", help="copy assignment JSON files into the database store")
+    p.add_argument("--from", dest="source", default=None, help="directory of assignment_<id>.json (default: ASSIGNMENTS_DIR)")
+    p.add_argument("--overwrite", action="store_true", help="replace assignments already in the database")
+
+    p = sub.add_parser("import-roster", help="create students from a CSV and enroll them in a class")
+    p.add_argument("file")
+    p.add_argument("--class", dest="class_id", type=int, required=True)
+    p.add_argument("--workers", type=int, default=None, help="password hashing processes")
+    p.add_argument("--out", help="write created credentials here instead of stdout")
+
+    p = sub.add_parser("rebuild-gradebook", help="recompute the materialized gradebook (backfill)")
+    p.add_argument("--class", dest="class_id", type=int, default=None, help="only this class")
+    p.add_argument("--assignment", type=int, default=None, help="only this assignment")
+
+    args = parser.parse_args()
+    handlers = {
+        None: cmd_init,
+        "init": cmd_init,
+        "migrate": cmd_migrate,
+        "regrade": cmd_regrade,
+        "grading-worker": cmd_grading_worker,
+        "import-assignments": cmd_import_assignments,
+        "import-roster": cmd_import_roster,
+        "rebuild-gradebook": cmd_rebuild_gradebook,
+    }
     with app.app_context():
-        db.create_all()
-        seed_all()
-        print("DB initialized; admin teacher + dummy student seeded.")
+        handlers[args.command](args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,34 @@
+import pytest
+
+PASSWORD = "pw"
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{tmp_path / 'test.db'}")
+    monkeypatch.setenv("ASSIGNMENTS_DIR", str(tmp_path / "assignments"))
+    monkeypatch.setenv("UPLOAD_FOLDER", str(tmp_path / "uploads"))
+    monkeypatch.setenv("WTF_CSRF_ENABLED", "false")
+    monkeypatch.setenv("RUN_POOL_SIZE", "0")
+    monkeypatch.setenv("USER_CACHE_TTL", "0")  # load_user queries on every request
+    monkeypatch.setenv("SQLITE_BUSY_TIMEOUT_MS", "500")  # a lock wait fails the test quickly
+    from app import create_app, db
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+    yield app  # no app context held open: each request gets its own session, as in production
+
+
+def add_user(db, username: str, role):
+    from app.models import User
+    user = User(email=f"{username}@x", name=username, username=username, role=role)
+    user.set_password(PASSWORD)
+    db.session.add(user)
+    db.session.flush()
+    return user
+
+
+def login(app, username: str):
+    client = app.test_client()
+    assert client.post("/login", data={"email": username, "password": PASSWORD}).status_code == 302
+    return client
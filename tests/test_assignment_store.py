@@ -0,0 +1,47 @@
+"""The sql assignment store writes inside the caller's transaction."""
+from app.models import Role
+
+from conftest import add_user, login
+
+OLD_SCHEME = {"cases": [{"name": "one", "call": "f()", "expected": 1, "points": 1}]}
+NEW_SCHEME = {"cases": [{"name": "two", "call": "f()", "expected": 2, "points": 1}]}
+
+
+def test_sql_store_mark_scheme_edit(app):
+    from app import db
+    from app.models import Assignment, GradeCacheEntry
+    from app.assignment_store import save_assignment, load_assignment
+    from app.grade_cache import remember, scheme_hash
+
+    app.config["ASSIGNMENT_STORE"] = "sql"
+    with app.app_context():
+        teacher = add_user(db, "t", Role.TEACHER)
+        a = Assignment(owner_id=teacher.id)
+        db.session.add(a)
+        db.session.flush()
+        aid = a.id
+        save_assignment(aid, {"id": aid, "owner_id": teacher.id, "title": "A", "description": "",
+                              "starter_code": "", "tests_path": None, "mark_scheme": OLD_SCHEME})
+        db.session.commit()
+        remember("def f(): return 1", OLD_SCHEME, ([{"status": "passed"}], 1.0, 1.0, True))
+
+    r = login(app, "t").post(f"/assignment/{aid}/edit", data={
+        "title": "A", "description": "", "starter_code": "",
+        "mark_scheme_json": '{"cases": [{"name": "two", "call": "f()", "expected": 2, "points": 1}]}'})
+    assert r.status_code == 302
+
+    with app.app_context():
+        assert load_assignment(aid)["mark_scheme"] == NEW_SCHEME
+        assert GradeCacheEntry.query.filter_by(scheme_hash=scheme_hash(OLD_SCHEME)).count() == 0
+
+
+def test_remember_inside_write_transaction_stores_after_commit(app):
+    from app import db
+    from app.models import GradeCacheEntry
+    from app.grade_cache import remember
+
+    with app.app_context():
+        add_user(db, "s", Role.STUDENT)  # the session now holds SQLite's write lock
+        remember("def f(): return 1", OLD_SCHEME, ([{"status": "passed"}], 1.0, 1.0, True))
+        db.session.commit()
+        assert GradeCacheEntry.query.count() == 1
@@ -0,0 +1,46 @@
+"""Class login slips reset every student's password to the one printed on the slip."""
+from werkzeug.security import check_password_hash
+
+from app.models import Role
+
+from conftest import add_user
+
+
+def test_credentials_job_hashes_in_parallel(app, monkeypatch):
+    from app import db, credentials
+    from app.models import Class, Enrollment, CredentialsJob, User
+
+    issued = iter(f"temp-{i}" for i in range(100))
+    monkeypatch.setattr(credentials.secrets, "token_urlsafe", lambda n: next(issued))
+    calls = []
+    real_hash_passwords = credentials.hash_passwords
+
+    def spy(passwords, **kwargs):
+        calls.append(kwargs)
+        return real_hash_passwords(passwords, **kwargs)
+
+    monkeypatch.setattr(credentials, "hash_passwords", spy)
+    app.config["PASSWORD_HASH_WORKERS"] = 2
+
+    with app.app_context():
+        teacher = add_user(db, "t", Role.TEACHER)
+        klass = Class(name="7B", code="7b", teacher_id=teacher.id)
+        db.session.add(klass)
+        db.session.flush()
+        for i in range(6):
+            db.session.add(Enrollment(class_id=klass.id, student_id=add_user(db, f"s{i}", Role.STUDENT).id))
+        job = CredentialsJob(class_id=klass.id, requested_by=teacher.id, status=CredentialsJob.PENDING)
+        db.session.add(job)
+        db.session.commit()
+
+        credentials.run_credentials_job(job.id)
+
+        db.session.refresh(job)
+        assert job.status == CredentialsJob.DONE
+        assert job.student_count == 6
+        assert calls and calls[0].get("workers", 0) != 1
+        students = User.query.filter(User.role == Role.STUDENT).order_by(User.id).all()
+        passwords = {f"temp-{i}" for i in range(6)}
+        matched = {p for u in students for p in passwords if check_password_hash(u.password_hash, p)}
+        assert matched == passwords
+        assert all(sum(check_password_hash(u.password_hash, p) for p in passwords) == 1 for u in students)
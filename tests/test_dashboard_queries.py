@@ -0,0 +1,63 @@
+"""The student dashboard costs the same number of queries however many classes a student is in."""
+from sqlalchemy import event
+
+from conftest import PASSWORD, login
+
+
+def seed_student(db, username: str, n_classes: int, per_class: int = 3) -> None:
+    from app.models import User, Role, Class, Enrollment, Assignment, ClassAssignment, Submission
+    from app.assignment_store import save_assignment
+
+    teacher = User(email=f"{username}-t@x", name="Teacher", username=f"{username}-t", role=Role.TEACHER)
+    student = User(email=f"{username}@x", name="Student", username=username, role=Role.STUDENT)
+    teacher.set_password(PASSWORD)
+    student.set_password(PASSWORD)
+    db.session.add_all([teacher, student])
+    db.session.flush()
+    for c in range(n_classes):
+        klass = Class(name=f"{username} class {c}", code=f"{username}{c}", teacher_id=teacher.id)
+        db.session.add(klass)
+        db.session.flush()
+        db.session.add(Enrollment(class_id=klass.id, student_id=student.id))
+        for _ in range(per_class):
+            a = Assignment(owner_id=teacher.id)
+            db.session.add(a)
+            db.session.flush()
+            save_assignment(a.id, {"id": a.id, "owner_id": teacher.id, "title": f"A{a.id}", "description": "",
+                                   "starter_code": "", "tests_path": None, "mark_scheme": {"cases": []}})
+            db.session.add(ClassAssignment(class_id=klass.id, assignment_id=a.id))
+            db.session.add(Submission(assignment_id=a.id, student_id=student.id, code="x = 1", is_draft=False))
+    db.session.commit()
+
+
+def dashboard_queries(app, username: str) -> int:
+    from app import db
+    with app.app_context():
+        engine = db.engine
+    client = login(app, username)
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", count)
+    try:
+        r = client.get("/student/dashboard")
+    finally:
+        event.remove(engine, "before_cursor_execute", count)
+    assert r.status_code == 200
+    return len(statements)
+
+
+def test_student_dashboard_query_count_is_constant(app):
+    from app import db
+    with app.app_context():
+        seed_student(db, "one", n_classes=1)
+        seed_student(db, "many", n_classes=6)
+
+    one = dashboard_queries(app, "one")
+    many = dashboard_queries(app, "many")
+    assert one == many
+    assert dashboard_queries(app, "many") == many
+    # load_user, the joined enrollment/class/class-assignment query, latest submissions
+    assert many == 3
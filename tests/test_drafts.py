@@ -0,0 +1,26 @@
+"""Autosaved drafts are written at most once per DRAFT_MIN_INTERVAL."""
+from app.models import Role
+
+from conftest import add_user
+
+
+def test_autosaves_within_the_interval_are_coalesced(app):
+    from app import db
+    from app.drafts import save_draft_code, load_draft
+
+    app.config["DRAFT_MIN_INTERVAL"] = 60
+    with app.app_context():
+        sid = add_user(db, "s", Role.STUDENT).id
+        db.session.commit()
+
+        first, _ = save_draft_code(sid, 1, "x = 1")
+        assert first is not None
+        assert save_draft_code(sid, 1, "x = 1") == (first, 0.0)  # unchanged: nothing to write
+
+        saved_at, retry_after = save_draft_code(sid, 1, "x = 12")
+        assert saved_at is None and 0 < retry_after <= 60
+        assert load_draft(sid, 1)[0] == "x = 1"
+
+        saved_at, _ = save_draft_code(sid, 1, "x = 123", force=True)
+        assert saved_at is not None
+        assert load_draft(sid, 1)[0] == "x = 123"
@@ -0,0 +1,12 @@
+"""Mark-scheme grading in a child process."""
+from app.grading import grade_submission_detailed
+
+SCHEME = {"cases": [{"function": "f", "args": [], "expected": 1, "marks": 1}]}
+LIMITS = {"case_timeout": 2.0, "import_timeout": 1.0, "memory_mb": 256}
+
+
+def test_slow_import_is_reported_as_an_import_timeout():
+    rows, total, _, passed = grade_submission_detailed("import time\ntime.sleep(30)\n", SCHEME, LIMITS)
+    assert rows[0]["status"] == "timed out"
+    assert "timed out after 1s" in rows[0]["error"]
+    assert total == 0.0 and not passed
@@ -0,0 +1,66 @@
+"""Assignments graded by a pytest suite (tests_path)."""
+import threading
+
+from app.models import Role
+
+from conftest import add_user, login
+
+TESTS = "from student import add\n\n\ndef test_small():\n    assert add(1, 2) == 3\n\n\ndef test_big():\n    assert add(10, 20) == 30\n"
+
+
+def test_grade_batch_runs_pytest_suites_in_parallel(app, tmp_path, monkeypatch):
+    from app import grading, pytest_grading
+    from app.grading import grade_batch
+
+    (tmp_path / "test_add.py").write_text(TESTS)
+    codes = ["def add(a, b):\n    return a + b\n", "def add(a, b):\n    return 3\n", "def add(a, b):\n    return 0\n"]
+    app.config.update(GRADING_TESTS_ROOT=str(tmp_path), GRADING_PYTEST_WORKERS=3)
+    monkeypatch.setattr(grading, "_pytest_pool", None)
+    real_grade_pytest = pytest_grading.grade_pytest
+    together = threading.Barrier(len(codes), timeout=30)
+
+    def grade_pytest(code, spec, limits):
+        together.wait()  # breaks (and raises) unless all three run at once
+        return real_grade_pytest(code, spec, limits)
+
+    monkeypatch.setattr(pytest_grading, "grade_pytest", grade_pytest)
+    with app.app_context():
+        spec = {"pytest": pytest_grading.pytest_spec("test_add.py", None)["pytest"]}
+        results = grade_batch(codes, spec)
+    assert [(total, max_total) for _, total, max_total, _ in results] == [(2.0, 2.0), (1.0, 2.0), (0.0, 2.0)]
+
+
+def test_binary_tests_path_is_a_grading_error(app, tmp_path):
+    from app.grading import grade_submission_detailed, assignment_scheme
+
+    (tmp_path / "test_blob.py").write_bytes(b"\xff\xfe\x00binary")
+    app.config["GRADING_TESTS_ROOT"] = str(tmp_path)
+    with app.app_context():
+        scheme = assignment_scheme({"tests_path": "test_blob.py", "mark_scheme": None})
+        rows, total, max_total, passed = grade_submission_detailed("x = 1", scheme)
+    assert rows[0]["status"] == "error" and "not a valid Python test file" in rows[0]["error"]
+    assert not passed
+
+
+def test_saving_an_invalid_tests_path_is_rejected(app, tmp_path):
+    from app import db
+    from app.models import Assignment
+    from app.assignment_store import save_assignment, load_assignment
+
+    (tmp_path / "test_blob.py").write_bytes(b"\xff\xfe\x00binary")
+    app.config["GRADING_TESTS_ROOT"] = str(tmp_path)
+    with app.app_context():
+        teacher = add_user(db, "t", Role.TEACHER)
+        a = Assignment(owner_id=teacher.id)
+        db.session.add(a)
+        db.session.flush()
+        aid = a.id
+        save_assignment(aid, {"id": aid, "owner_id": teacher.id, "title": "A", "description": "",
+                              "starter_code": "", "tests_path": None, "mark_scheme": None})
+        db.session.commit()
+
+    r = login(app, "t").post(f"/assignment/{aid}/edit", data={"title": "A", "tests_path": "test_blob.py"})
+    assert r.status_code == 200
+    assert b"not a valid Python test file" in r.data
+    with app.app_context():
+        assert load_assignment(aid)["tests_path"] is None
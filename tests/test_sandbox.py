@@ -0,0 +1,48 @@
+"""Runs are killed at their deadline even when the code closes its output."""
+import time
+
+CLOSES_OUTPUT = "import os\nos.closerange(0, 1024)\nwhile True:\n    pass\n"
+
+
+def test_subprocess_run_times_out_after_closing_fds():
+    from app.sandbox import run_subprocess
+    t0 = time.monotonic()
+    result = run_subprocess(CLOSES_OUTPUT, timeout=1.0)
+    assert time.monotonic() - t0 < 5
+    assert result["timed_out"]
+
+
+def test_pool_run_times_out_after_closing_fds():
+    from app.sandbox import SandboxPool
+    pool = SandboxPool(1, 100)
+    try:
+        t0 = time.monotonic()
+        result = pool.run(CLOSES_OUTPUT, timeout=1.0)
+        assert time.monotonic() - t0 < 3  # the worker answered, rather than the web side giving up
+        assert result["timed_out"]
+        assert pool.run("print('next')", timeout=5.0)["stdout"] == "next\n"
+    finally:
+        pool.close()
+
+
+def test_closing_a_worker_kills_its_job():
+    from app.sandbox import SandboxWorker
+    w = SandboxWorker()
+    try:
+        events = w.stream("import os\nprint(os.getpid())\nwhile True:\n    pass\n", timeout=30.0)
+        first = next(ev for ev in events if ev["event"] == "output")
+        pid = int(first["data"])
+    finally:
+        w.close()
+    deadline = time.monotonic() + 5
+    while _running(pid) and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert not _running(pid)
+
+
+def _running(pid: int) -> bool:
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            return f.read().rsplit(")", 1)[1].split()[0] != "Z"
+    except FileNotFoundError:
+        return False